@@ -0,0 +1 @@
+"""Benchmarks for the APEC crawler and storage paths."""
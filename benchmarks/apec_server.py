@@ -0,0 +1,465 @@
+"""
+Local stand-in for the APEC search API, for throughput benchmarks.
+
+Serves ``POST .../rechercheOffre`` over a synthetic corpus so the crawler
+(``fetch_page``, ``crawl_all_ads``) and ``ApecClient.post("/rechercheOffre")``
+can be exercised without touching apec.fr:
+
+- ``pagination.startIndex`` / ``range`` (capped like the real API) and a
+  ``{"totalCount", "resultats"}`` body
+- the filter fields of ``build_search_payload`` / ``REQUEST_TEMPLATE``:
+  lieux, fonctions, statutPoste, typesContrat, typesConvention,
+  niveauxExperience, secteursActivite, typesTeletravail and
+  anciennetePublication (the other fields are accepted and ignored)
+- results sorted newest first, like ``sorts: DATE DESCENDING``
+- an injectable latency distribution, body bandwidth, random 429 (with
+  Retry-After) and 5xx rates, and a server-side requests-per-second limit
+- drifting pagination: ads published (prepended) and expiring (dropped from
+  the end) while a crawl is running, shifting every page boundary
+
+Offers are generated deterministically from the seed and their position,
+and their JSON is cached, so the server stays far cheaper than the crawler.
+``GET /stats`` returns request counters and ``POST /reset`` clears them and
+restarts the drift clock.
+
+Usage:
+    python -m benchmarks.apec_server --ads 85000 --port 8765
+    python -m benchmarks.apec_server --latency lognormal:0.15,0.6 --rate-429 0.02 --rate-5xx 0.01
+    python -m benchmarks.apec_server --drift-new 2 --drift-expire 1
+    APEC_BASE_URL=http://127.0.0.1:8765 python -m extraction.crawl_all_apec_ads --concurrency 8
+"""
+
+import argparse
+import bisect
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .synthetic import CONTRATS, LIEUX, SECTEURS, make_offer
+
+# Largest page the real API serves
+MAX_RANGE = 100
+
+# Location codes of the synthetic cities (799 = all of France)
+LIEU_CODES = {
+    "Paris - 75": "711",
+    "Lyon - 69": "702",
+    "Nantes - 44": "705",
+    "Lille - 59": "706",
+    "Toulouse - 31": "708",
+    "Bordeaux - 33": "709",
+}
+LIEU_FRANCE = "799"
+
+# Codes drawn for the filter fields the synthetic offers do not carry
+STATUTS = ["143688", "143689", "143690"]
+CONVENTIONS = ["143684", "143685", "143686", "143687", "143706", "143707"]
+FONCTIONS = ["101828", "101830", "101832", "101834", "101836"]
+NIVEAUX = ["101839", "101840", "101841"]
+TELETRAVAIL = [None, 20765, 20766]
+
+# anciennetePublication codes and their maximum age in seconds
+ANCIENNETE_SECONDS = {"101850": 24 * 3600, "101851": 7 * 24 * 3600}
+
+# Payload list field -> attribute it filters on (in SyntheticCorpus.attributes order)
+LIST_FILTERS = {
+    "lieux": "lieu",
+    "fonctions": "fonction",
+    "statutPoste": "statut",
+    "typesContrat": "contrat",
+    "typesConvention": "convention",
+    "niveauxExperience": "niveau",
+    "secteursActivite": "secteur",
+    "typesTeletravail": "teletravail",
+}
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Build a latency sampler from a ``kind:params`` spec.
+
+    Kinds: ``none``, ``fixed:S``, ``uniform:LOW,HIGH``,
+    ``lognormal:MEDIAN,SIGMA`` and ``exponential:MEAN`` (seconds).
+
+    Args:
+        spec: Distribution spec
+
+    Returns:
+        Function drawing one latency in seconds from a random generator
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value.strip()]
+    if kind == "none":
+        return lambda rng: 0.0
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exponential" and len(values) == 1:
+        return lambda rng: rng.expovariate(1.0 / values[0])
+    raise ValueError(f"Invalid latency spec: {spec!r}")
+
+
+@dataclass
+class StandInConfig:
+    """Behaviour of the stand-in server."""
+
+    ads: int = 85_000  # corpus size at startup
+    seed: int = 42
+    span_days: float = 60.0  # publication dates spread over this many days
+    latency: str = "none"  # see parse_latency
+    bandwidth: Optional[float] = None  # body bytes per second (None = unthrottled)
+    rate_429: float = 0.0  # probability of a 429 per request
+    rate_5xx: float = 0.0  # probability of a 500/502/503 per request
+    retry_after: int = 1  # Retry-After of 429 responses, in seconds
+    max_rps: Optional[float] = None  # 429 beyond this many requests per second
+    drift_new: float = 0.0  # ads published per second (prepended)
+    drift_expire: float = 0.0  # ads expiring per second (dropped from the end)
+    max_range: int = MAX_RANGE
+    ignore_filters: bool = False  # serve the whole corpus whatever the payload
+
+
+class SyntheticCorpus:
+    """Drifting corpus of synthetic offers, addressed by position.
+
+    Position 0 is the newest ad at startup and ``ads - 1`` the oldest. Ads
+    published later get negative positions (-1 first), so the visible list at
+    any time is ``[-published, ads - expired)`` in newest-first order.
+    """
+
+    def __init__(self, config: StandInConfig):
+        self.config = config
+        self.started_wall = datetime.now(timezone.utc)
+        self.started = time.monotonic()
+        self._spacing = config.span_days * 86400 / max(config.ads, 1)
+        self._lock = threading.Lock()
+        self._attributes = [self._draw_attributes(position) for position in range(config.ads)]
+        self._new_attributes: List[Tuple] = []  # position -1, -2, ...
+        # Filter key -> [matching startup positions, matching published positions
+        # (-1 first), published ads checked so far]
+        self._matches: Dict[Tuple, list] = {}
+        self._offer_json = lru_cache(maxsize=200_000)(self._render_offer)
+
+    def reset(self) -> None:
+        """Restart the drift clock (published/expired ads go back to zero)."""
+        with self._lock:
+            self.started_wall = datetime.now(timezone.utc)
+            self.started = time.monotonic()
+            self._matches.clear()
+        self._offer_json.cache_clear()
+
+    def drift(self) -> Tuple[int, int]:
+        """Ads (published, expired) since startup or the last reset."""
+        elapsed = time.monotonic() - self.started
+        expired = min(int(elapsed * self.config.drift_expire), self.config.ads)
+        return int(elapsed * self.config.drift_new), expired
+
+    def _draw_attributes(self, position: int) -> Tuple:
+        rng = random.Random(self.config.seed * 1_000_003 + position)
+        return (
+            LIEU_CODES[rng.choice(LIEUX)],
+            rng.choice(FONCTIONS),
+            rng.choice(STATUTS),
+            str(rng.choice(CONTRATS)),
+            rng.choice(CONVENTIONS),
+            rng.choice(NIVEAUX),
+            str(rng.choice(SECTEURS)),
+            rng.choice(TELETRAVAIL),
+        )
+
+    def attributes(self, position: int) -> Tuple:
+        """Filterable attributes of the ad at a position (see LIST_FILTERS)."""
+        if position >= 0:
+            return self._attributes[position]
+        while len(self._new_attributes) < -position:
+            self._new_attributes.append(self._draw_attributes(-len(self._new_attributes) - 1))
+        return self._new_attributes[-position - 1]
+
+    def published_at(self, position: int) -> datetime:
+        """Publication time of the ad at a position."""
+        if position >= 0:
+            return self.started_wall - timedelta(seconds=position * self._spacing)
+        return self.started_wall + timedelta(seconds=-position / self.config.drift_new)
+
+    def offer_id(self, position: int) -> int:
+        """Corpus index used for the APEC id (new ads come after the startup corpus)."""
+        return position if position >= 0 else self.config.ads - 1 - position
+
+    def _render_offer(self, position: int) -> bytes:
+        index = self.offer_id(position)
+        offer = make_offer(index, random.Random(self.config.seed * 7_919 + index))
+        lieu, _, _, contrat, _, _, secteur, teletravail = self.attributes(position)
+        offer["lieuTexte"] = next(name for name, code in LIEU_CODES.items() if code == lieu)
+        offer["typeContrat"] = int(contrat)
+        offer["secteurActivite"] = int(secteur)
+        offer["idNomTeletravail"] = teletravail
+        offer["datePublication"] = self.published_at(position).strftime("%Y-%m-%dT%H:%M:%S.000+0000")
+        return json.dumps(offer, ensure_ascii=False).encode("utf-8")
+
+    def offer_json(self, position: int) -> bytes:
+        """Encoded offer at a position (cached)."""
+        return self._offer_json(position)
+
+    def _filter_key(self, payload: Dict[str, Any]) -> Tuple:
+        if self.config.ignore_filters:
+            return (frozenset(),) * len(LIST_FILTERS) + (None,)
+        key = []
+        for field, attribute in LIST_FILTERS.items():
+            values = payload.get(field) or []
+            # REQUEST_TEMPLATE nests secteursActivite one level deeper
+            flat = {str(value) for item in values for value in (item if isinstance(item, list) else [item])}
+            if field == "lieux" and LIEU_FRANCE in flat:
+                flat = set()
+            key.append(frozenset(flat))
+        key.append(ANCIENNETE_SECONDS.get(str(payload.get("anciennetePublication"))))
+        return tuple(key)
+
+    @staticmethod
+    def _matches_key(attributes: Tuple, key: Tuple) -> bool:
+        for value, wanted in zip(attributes, key):
+            if wanted and str(value) not in wanted:
+                return False
+        return True
+
+    def page(self, payload: Dict[str, Any], start_index: int, size: int) -> Tuple[int, List[bytes]]:
+        """Resolve a search: total matching ads and the encoded offers of one page."""
+        key = self._filter_key(payload)
+        published, expired = self.drift()
+        with self._lock:
+            entry = self._matches.get(key)
+            if entry is None:
+                base = [p for p in range(self.config.ads) if self._matches_key(self._attributes[p], key)]
+                entry = self._matches[key] = [base, [], 0]
+            base, new, checked = entry
+            # Check the ads published since the last search with this filter
+            for position in range(-checked - 1, -published - 1, -1):
+                if self._matches_key(self.attributes(position), key):
+                    new.append(position)
+            entry[2] = max(checked, published)
+            positions = new[::-1] + base[:bisect.bisect_left(base, self.config.ads - expired)]
+
+        max_age = key[-1]
+        if max_age is not None:
+            now = datetime.now(timezone.utc)
+            cutoff = now - timedelta(seconds=max_age)
+            # Newest first: the matching ads are a prefix
+            low, high = 0, len(positions)
+            while low < high:
+                middle = (low + high) // 2
+                if self.published_at(positions[middle]) >= cutoff:
+                    low = middle + 1
+                else:
+                    high = middle
+            positions = positions[:low]
+        window = positions[start_index:start_index + size]
+        return len(positions), [self.offer_json(position) for position in window]
+
+
+class StandInStats:
+    """Request counters of the stand-in, safe to update from handler threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.by_status: Dict[int, int] = {}
+            self.bytes_out = 0
+            self.offers_out = 0
+            self.started = time.monotonic()
+
+    def add(self, status: int, body_bytes: int, offers: int = 0) -> None:
+        with self._lock:
+            self.requests += 1
+            self.by_status[status] = self.by_status.get(status, 0) + 1
+            self.bytes_out += body_bytes
+            self.offers_out += offers
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            return {
+                "requests": self.requests,
+                "by_status": {str(status): count for status, count in sorted(self.by_status.items())},
+                "bytes_out": self.bytes_out,
+                "offers_out": self.offers_out,
+                "elapsed_seconds": round(elapsed, 3),
+                "requests_per_second": round(self.requests / elapsed, 2) if elapsed else 0.0,
+            }
+
+
+class StandInServer(ThreadingHTTPServer):
+    """HTTP server holding the corpus, the fault injection and the counters."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: StandInConfig):
+        super().__init__(address, StandInHandler)
+        self.config = config
+        self.corpus = SyntheticCorpus(config)
+        self.stats = StandInStats()
+        self.sample_latency = parse_latency(config.latency)
+        self._rng = random.Random(config.seed)
+        self._rng_lock = threading.Lock()
+        self._rps_lock = threading.Lock()
+        self._tokens = config.max_rps or 0.0
+        self._refilled = time.monotonic()
+
+    def draw(self) -> Tuple[float, float]:
+        """One (uniform, latency) pair from the shared generator."""
+        with self._rng_lock:
+            return self._rng.random(), self.sample_latency(self._rng)
+
+    def over_limit(self) -> bool:
+        """Take a token from the server-side rate limit; True when none is left."""
+        if not self.config.max_rps:
+            return False
+        with self._rps_lock:
+            now = time.monotonic()
+            self._tokens = min(self._tokens + (now - self._refilled) * self.config.max_rps, self.config.max_rps)
+            self._refilled = now
+            if self._tokens < 1.0:
+                return True
+            self._tokens -= 1.0
+            return False
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Request handler of the stand-in (keep-alive, like the real API)."""
+
+    protocol_version = "HTTP/1.1"
+    server: StandInServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None, offers: int = 0):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        bandwidth = self.server.config.bandwidth
+        if bandwidth and body:
+            chunk_size = 16 * 1024
+            for start in range(0, len(body), chunk_size):
+                self.wfile.write(body[start:start + chunk_size])
+                self.wfile.flush()
+                time.sleep(min(chunk_size, len(body) - start) / bandwidth)
+        else:
+            self.wfile.write(body)
+        self.server.stats.add(status, len(body), offers)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send(200, json.dumps(self.server.stats.snapshot()).encode())
+        else:
+            self._send(404, b'{"error": "not found"}')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.rstrip("/").endswith("/reset"):
+            self.server.stats.reset()
+            self.server.corpus.reset()
+            self._send(200, b"{}")
+            return
+        if not self.path.split("?", 1)[0].rstrip("/").endswith("/rechercheOffre"):
+            self._send(404, b'{"error": "not found"}')
+            return
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self._send(400, b'{"error": "invalid JSON"}')
+            return
+
+        config = self.server.config
+        roll, latency = self.server.draw()
+        if latency > 0:
+            time.sleep(latency)
+        if self.server.over_limit() or roll < config.rate_429:
+            self._send(429, b'{"error": "too many requests"}', {"Retry-After": str(config.retry_after)})
+            return
+        if roll < config.rate_429 + config.rate_5xx:
+            self._send(random.choice((500, 502, 503)), b'{"error": "server error"}')
+            return
+
+        pagination = payload.get("pagination") or {}
+        start_index = max(int(pagination.get("startIndex", 0)), 0)
+        size = min(max(int(pagination.get("range", 20)), 0), config.max_range)
+        total, offers = self.server.corpus.page(payload, start_index, size)
+        page = b'{"totalCount":%d,"resultats":[%s]}' % (total, b",".join(offers))
+        self._send(200, page, offers=len(offers))
+
+
+def start_server(config: StandInConfig, host: str = "127.0.0.1", port: int = 0) -> StandInServer:
+    """Start the stand-in in a background thread.
+
+    Args:
+        config: Server behaviour
+        host: Interface to bind
+        port: Port to bind (0 = any free port, see ``server.server_port``)
+
+    Returns:
+        The running server (call ``shutdown()`` to stop it)
+    """
+    server = StandInServer((host, port), config)
+    threading.Thread(target=server.serve_forever, name="apec-stand-in", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a synthetic APEC /rechercheOffre endpoint.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port (default: 8765)")
+    parser.add_argument("--ads", type=int, default=85_000, help="Corpus size (default: 85000)")
+    parser.add_argument("--seed", type=int, default=42, help="Corpus seed (default: 42)")
+    parser.add_argument("--latency", default="none", help="none, fixed:S, uniform:LO,HI, lognormal:MEDIAN,SIGMA, exponential:MEAN")
+    parser.add_argument("--bandwidth", type=float, default=None, help="Body bytes per second per response")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Probability of a 429 (default: 0)")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Probability of a 5xx (default: 0)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After of 429 responses (default: 1)")
+    parser.add_argument("--max-rps", type=float, default=None, help="429 above this many requests per second")
+    parser.add_argument("--drift-new", type=float, default=0.0, help="Ads published per second (default: 0)")
+    parser.add_argument("--drift-expire", type=float, default=0.0, help="Ads expiring per second (default: 0)")
+    parser.add_argument("--ignore-filters", action="store_true", help="Serve the whole corpus for every search")
+    args = parser.parse_args()
+
+    config = StandInConfig(
+        ads=args.ads,
+        seed=args.seed,
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        retry_after=args.retry_after,
+        max_rps=args.max_rps,
+        drift_new=args.drift_new,
+        drift_expire=args.drift_expire,
+        ignore_filters=args.ignore_filters,
+    )
+    parse_latency(config.latency)
+    started = time.perf_counter()
+    server = StandInServer((args.host, args.port), config)
+    print(f"Corpus: {config.ads:,} ads ready in {time.perf_counter() - started:.1f}s")
+    print(f"Serving http://{args.host}:{server.server_port}/rechercheOffre (GET /stats, POST /reset)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+"""
+End-to-end benchmark: crawler and metric ingestion against the local stand-in.
+
+For every cell of a matrix (scenario, engine, page size, concurrency, SQLite
+settings, corpus size) a fresh process crawls a benchmarks.apec_server
+instance (serving its whole corpus, search filters ignored) into a temporary
+database and reports:
+
+- ads/s and requests/s over the whole run
+- p50 / p95 / p99 latency of successful page requests (client side)
+- peak RSS of the crawling process
+- bytes written by the process (``wchar`` of /proc/self/io, falling back to
+  the final database size) and the final database size
+
+The ``crawl`` scenario starts the adaptive rate at the cap, so it measures
+the crawler rather than the ramp-up; the ``ramp`` scenario runs the same
+crawl from the crawler's own initial rate (1 / REQUEST_DELAY_SECONDS) and
+shows how quickly the rate controller reaches the cap.
+
+The ``ingestion`` scenario runs ingestion.main.run_ingestion over every
+SEARCH_CONFIGS entry for a number of rounds and saves the metrics with
+ingestion.storage.Database, like ``python -m ingestion.main``.
+
+Results are appended to a local SQLite database keyed by git commit;
+``compare`` takes the median of each cell on two commits and flags the
+metrics that got worse by more than a threshold (exit status 1).
+
+Usage:
+    python -m benchmarks.bench_crawl run
+    python -m benchmarks.bench_crawl run --ads 5000,20000 --concurrency 1,4,8 --page-sizes 50,100
+    python -m benchmarks.bench_crawl run --sqlite safe,bulk --latency lognormal:0.05,0.5 --repeat 3
+    python -m benchmarks.bench_crawl run --scenarios ramp --max-rps 20 --concurrency 1,4
+    python -m benchmarks.bench_crawl compare                  # HEAD vs previous benchmarked commit
+    python -m benchmarks.bench_crawl compare --base 1a2b3c --threshold 0.05
+    python -m benchmarks.bench_crawl list
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from ingestion.config import SQLITE_PROFILES
+
+RESULTS_DB = "data/bench_results.sqlite"
+
+# Fields identifying a matrix cell
+CELL_FIELDS = ("scenario", "engine", "page_size", "concurrency", "sqlite_profile", "corpus_ads", "server")
+
+# Compared metrics and their direction (+1 = higher is better)
+METRICS = {
+    "ads_per_second": +1,
+    "requests_per_second": +1,
+    "latency_p50": -1,
+    "latency_p95": -1,
+    "latency_p99": -1,
+    "peak_rss_bytes": -1,
+    "db_bytes_written": -1,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    git_commit TEXT NOT NULL,
+    git_dirty INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    scenario TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    page_size INTEGER NOT NULL,
+    concurrency INTEGER NOT NULL,
+    sqlite_profile TEXT NOT NULL,
+    corpus_ads INTEGER NOT NULL,
+    server TEXT NOT NULL,
+    wall_seconds REAL,
+    ads INTEGER,
+    requests INTEGER,
+    ads_per_second REAL,
+    requests_per_second REAL,
+    latency_p50 REAL,
+    latency_p95 REAL,
+    latency_p99 REAL,
+    peak_rss_bytes INTEGER,
+    db_bytes_written INTEGER,
+    db_file_bytes INTEGER
+);
+CREATE INDEX IF NOT EXISTS results_commit ON results (git_commit);
+"""
+
+
+# ============================================================================
+# ONE CELL (runs in its own process)
+# ============================================================================
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile (None for an empty list)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def _written_bytes() -> Optional[int]:
+    """Bytes written by this process so far, if the platform reports it."""
+    try:
+        with open("/proc/self/io") as io_file:
+            for line in io_file:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _time_requests(latencies: List[float]) -> None:
+    """Record the duration of every successful HTTP request of this process."""
+    send = requests.Session.send
+    lock = threading.Lock()
+
+    def timed_send(self, request, **kwargs):
+        started = time.perf_counter()
+        response = send(self, request, **kwargs)
+        if response.status_code == 200:
+            with lock:
+                latencies.append(time.perf_counter() - started)
+        return response
+
+    requests.Session.send = timed_send
+
+
+def run_cell(cell: Dict[str, Any], base_url: str, max_rps: float, rounds: int) -> Dict[str, Any]:
+    """Run one benchmark cell in this process (environment set by the caller)."""
+    from extraction import crawl_all_apec_ads as crawler
+
+    # Start at the cap: the benchmark measures the crawler, not the ramp-up
+    # (unless that is what the ramp scenario measures)
+    if cell["scenario"] != "ramp":
+        crawler.REQUEST_DELAY_SECONDS = 1.0 / max_rps
+    latencies: List[float] = []
+    _time_requests(latencies)
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        db_path = Path(tmp) / "bench.sqlite"
+        written_before = _written_bytes()
+        started = time.perf_counter()
+        ads = None
+        with contextlib.redirect_stdout(devnull):
+            if cell["scenario"] == "ingestion":
+                from ingestion.client import ApecClient
+                from ingestion.config import SEARCH_CONFIGS
+                from ingestion.main import run_ingestion
+                from ingestion.rate_control import AdaptiveRateController
+                from ingestion.storage import Database
+
+                client = ApecClient(rate_controller=AdaptiveRateController(initial_rate=max_rps, max_rate=max_rps))
+                client.base_url = base_url
+                database = Database(db_path, profile=cell["sqlite_profile"])
+                for _ in range(rounds):
+                    results = {}
+                    for config_name in SEARCH_CONFIGS:
+                        extracted = run_ingestion(config_name, client)
+                        results[config_name] = {"value": extracted["value"], "retrieved_at": extracted["retrieved_at"]}
+                    database.save_metrics(results)
+                database.engine.dispose()
+            else:
+                session_maker = crawler.init_database(str(db_path), profile=cell["sqlite_profile"])
+                http_session = requests.Session()
+                http_session.headers.update(crawler.HEADERS)
+                if cell["engine"] == "pipeline":
+                    from extraction.pipeline import crawl_all_ads_pipeline
+
+                    _, ads, _ = crawl_all_ads_pipeline(
+                        session_maker, http_session, None, fetchers=cell["concurrency"], max_rps=max_rps
+                    )
+                else:
+                    _, ads, _ = crawler.crawl_all_ads(
+                        session_maker, http_session, None, concurrency=cell["concurrency"], max_rps=max_rps
+                    )
+                session_maker.kw["bind"].dispose()
+        wall = time.perf_counter() - started
+        written_after = _written_bytes()
+        db_file_bytes = sum(path.stat().st_size for path in Path(tmp).iterdir())
+
+    requests_done = len(latencies)
+    return {
+        "wall_seconds": wall,
+        "ads": ads,
+        "requests": requests_done,
+        "ads_per_second": ads / wall if ads is not None else None,
+        "requests_per_second": requests_done / wall,
+        "latency_p50": percentile(latencies, 0.50),
+        "latency_p95": percentile(latencies, 0.95),
+        "latency_p99": percentile(latencies, 0.99),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "db_bytes_written": written_after - written_before if written_before is not None else db_file_bytes,
+        "db_file_bytes": db_file_bytes,
+    }
+
+
+# ============================================================================
+# RESULTS DATABASE
+# ============================================================================
+
+def open_results(path: str = RESULTS_DB) -> sqlite3.Connection:
+    """Open (and create if needed) the results database."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def git_commit() -> Tuple[str, bool]:
+    """Current commit and whether tracked files have uncommitted changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, bool(dirty)
+
+
+def resolve_commit(conn: sqlite3.Connection, rev: str) -> Optional[str]:
+    """Benchmarked commit matching a git revision or a commit prefix."""
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--verify", f"{rev}^{{commit}}"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    row = conn.execute(
+        "SELECT git_commit FROM results WHERE git_commit LIKE ? ORDER BY created_at DESC LIMIT 1", (f"{rev}%",)
+    ).fetchone()
+    return row["git_commit"] if row else None
+
+
+def cell_medians(conn: sqlite3.Connection, commit: str) -> Dict[Tuple, Dict[str, float]]:
+    """Median of every metric per cell for one commit."""
+    runs: Dict[Tuple, List[sqlite3.Row]] = {}
+    for row in conn.execute("SELECT * FROM results WHERE git_commit = ?", (commit,)):
+        runs.setdefault(tuple(row[field] for field in CELL_FIELDS), []).append(row)
+    medians = {}
+    for key, rows in runs.items():
+        medians[key] = {}
+        for metric in METRICS:
+            values = [row[metric] for row in rows if row[metric] is not None]
+            if values:
+                medians[key][metric] = statistics.median(values)
+    return medians
+
+
+# ============================================================================
+# COMMANDS
+# ============================================================================
+
+def _start_server(ads: int, server_args: List[str]) -> Tuple[subprocess.Popen, str]:
+    """Start a stand-in server process and return it with its base URL."""
+    process = subprocess.Popen(
+        [sys.executable, "-u", "-m", "benchmarks.apec_server", "--port", "0", "--ads", str(ads), *server_args],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    for line in process.stdout:
+        if line.startswith("Serving "):
+            return process, line.split()[1].rsplit("/", 1)[0]
+    raise RuntimeError("The stand-in server did not start")
+
+
+def command_run(args: argparse.Namespace) -> None:
+    """Run the whole matrix and store the results."""
+    commit, dirty = git_commit()
+    server_args = ["--ignore-filters", "--latency", args.latency, "--rate-429", str(args.rate_429), "--rate-5xx", str(args.rate_5xx)]
+    server = f"latency={args.latency} 429={args.rate_429} 5xx={args.rate_5xx}"
+    conn = open_results(args.results)
+    print(f"Commit {commit[:12]}{' (dirty)' if dirty else ''} → {args.results}")
+    print(f"{'scenario':<10} {'engine':<9} {'page':>5} {'conc':>5} {'sqlite':<8} {'ads':>7} "
+          f"{'ads/s':>8} {'req/s':>7} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'RSS MB':>7} {'written MB':>10}")
+
+    for corpus_ads in args.ads:
+        process, base_url = _start_server(corpus_ads, server_args)
+        try:
+            cells = [
+                {"scenario": scenario, "engine": engine, "page_size": page_size, "concurrency": concurrency}
+                for scenario in ("crawl", "ramp") if scenario in args.scenarios
+                for engine, page_size, concurrency in itertools.product(args.engines, args.page_sizes, args.concurrency)
+            ]
+            if "ingestion" in args.scenarios:
+                cells.append({"scenario": "ingestion", "engine": "client", "page_size": 1, "concurrency": 1})
+            for cell, profile, _ in itertools.product(cells, args.sqlite, range(args.repeat)):
+                cell = {**cell, "sqlite_profile": profile, "corpus_ads": corpus_ads, "server": server}
+                requests.post(f"{base_url}/reset", timeout=10)
+                env = {
+                    **os.environ,
+                    "APEC_BASE_URL": base_url,
+                    "APEC_PAGE_SIZE": str(cell["page_size"]),
+                    "APEC_REQUEST_BUDGET": "",
+                }
+                completed = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_crawl", "cell", json.dumps(cell),
+                     "--base-url", base_url, "--max-rps", str(args.max_rps), "--rounds", str(args.rounds)],
+                    env=env, capture_output=True, text=True,
+                )
+                if completed.returncode != 0:
+                    print(f"❌ Cell {cell} failed:\n{completed.stderr}")
+                    continue
+                result = json.loads(completed.stdout.strip().splitlines()[-1])
+                row = {**cell, **result}
+                conn.execute(
+                    f"INSERT INTO results (git_commit, git_dirty, created_at, {', '.join(row)}) "
+                    f"VALUES (?, ?, ?, {', '.join('?' for _ in row)})",
+                    (commit, int(dirty), datetime.now(timezone.utc).isoformat(), *row.values()),
+                )
+                conn.commit()
+                print(_format_row(row))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def _format_row(row: Dict[str, Any]) -> str:
+    def ms(value):
+        return f"{value * 1000:>7.1f}" if value is not None else f"{'-':>7}"
+
+    ads_per_second = f"{row['ads_per_second']:>8.0f}" if row["ads_per_second"] is not None else f"{'-':>8}"
+    return (
+        f"{row['scenario']:<10} {row['engine']:<9} {row['page_size']:>5} {row['concurrency']:>5} "
+        f"{row['sqlite_profile']:<8} {row['corpus_ads']:>7} {ads_per_second} {row['requests_per_second']:>7.1f} "
+        f"{ms(row['latency_p50'])} {ms(row['latency_p95'])} {ms(row['latency_p99'])} "
+        f"{row['peak_rss_bytes'] / 2**20:>7.0f} {row['db_bytes_written'] / 2**20:>10.1f}"
+    )
+
+
+def command_compare(args: argparse.Namespace) -> int:
+    """Compare two commits cell by cell; returns the number of regressions."""
+    conn = open_results(args.results)
+    head = resolve_commit(conn, args.head)
+    if head is None:
+        raise SystemExit(f"No results for {args.head}; run the benchmark first")
+    if args.base:
+        base = resolve_commit(conn, args.base)
+    else:
+        row = conn.execute(
+            "SELECT git_commit FROM results WHERE git_commit != ? ORDER BY created_at DESC LIMIT 1", (head,)
+        ).fetchone()
+        base = row["git_commit"] if row else None
+    if base is None:
+        raise SystemExit("No base commit with results to compare against")
+
+    base_cells, head_cells = cell_medians(conn, base), cell_medians(conn, head)
+    print(f"Base {base[:12]} vs head {head[:12]} (threshold {args.threshold:.0%})")
+    regressions = 0
+    for key in sorted(set(base_cells) & set(head_cells), key=str):
+        cell = dict(zip(CELL_FIELDS, key))
+        label = (f"{cell['scenario']}/{cell['engine']} page={cell['page_size']} conc={cell['concurrency']} "
+                 f"sqlite={cell['sqlite_profile']} ads={cell['corpus_ads']}")
+        lines = []
+        for metric, direction in METRICS.items():
+            before, after = base_cells[key].get(metric), head_cells[key].get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = -change * direction > args.threshold
+            regressions += worse
+            lines.append(f"   {'❌' if worse else '  '} {metric:<20} {before:>14.4g} → {after:<14.4g} {change:+.1%}")
+        print(label)
+        print("\n".join(lines))
+    missing = len(set(base_cells) ^ set(head_cells))
+    if missing:
+        print(f"({missing} cells only benchmarked on one of the commits)")
+    print(f"\n{regressions} regression(s)")
+    return regressions
+
+
+def command_list(args: argparse.Namespace) -> None:
+    """List the benchmarked commits."""
+    conn = open_results(args.results)
+    for row in conn.execute(
+        "SELECT git_commit, MAX(git_dirty) AS dirty, COUNT(*) AS runs, MAX(created_at) AS last "
+        "FROM results GROUP BY git_commit ORDER BY last DESC"
+    ):
+        print(f"{row['git_commit'][:12]}{'+' if row['dirty'] else ' '} {row['runs']:>5} runs, last {row['last']}")
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(value) for value in text.split(",") if value.strip()]
+
+
+def _str_list(text: str) -> List[str]:
+    return [value.strip() for value in text.split(",") if value.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end crawl benchmark against the local APEC stand-in.")
+    parser.add_argument("--results", default=RESULTS_DB, help=f"Results database (default: {RESULTS_DB})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run the benchmark matrix")
+    run.add_argument("--scenarios", type=_str_list, default=["crawl", "ingestion"], help="crawl,ramp,ingestion")
+    run.add_argument("--engines", type=_str_list, default=["requests"], help="requests,pipeline")
+    run.add_argument("--page-sizes", type=_int_list, default=[50, 100], help="Comma-separated (default: 50,100)")
+    run.add_argument("--concurrency", type=_int_list, default=[1, 4], help="Comma-separated (default: 1,4)")
+    run.add_argument("--sqlite", type=_str_list, default=list(SQLITE_PROFILES), help="SQLite profiles")
+    run.add_argument("--ads", type=_int_list, default=[5_000], help="Corpus sizes (default: 5000)")
+    run.add_argument("--latency", default="lognormal:0.02,0.5", help="Stand-in latency distribution")
+    run.add_argument("--rate-429", type=float, default=0.0, help="Stand-in 429 probability")
+    run.add_argument("--rate-5xx", type=float, default=0.0, help="Stand-in 5xx probability")
+    run.add_argument("--max-rps", type=float, default=200.0, help="Crawler request cap (default: 200)")
+    run.add_argument("--rounds", type=int, default=10, help="Ingestion rounds over SEARCH_CONFIGS (default: 10)")
+    run.add_argument("--repeat", type=int, default=1, help="Runs per cell (compare uses the median)")
+
+    compare = commands.add_parser("compare", help="Flag regressions between two benchmarked commits")
+    compare.add_argument("--base", default=None, help="Base revision (default: previous benchmarked commit)")
+    compare.add_argument("--head", default="HEAD", help="Head revision (default: HEAD)")
+    compare.add_argument("--threshold", type=float, default=0.10, help="Relative change flagged (default: 0.10)")
+
+    commands.add_parser("list", help="List benchmarked commits")
+
+    cell = commands.add_parser("cell", help=argparse.SUPPRESS)
+    cell.add_argument("cell")
+    cell.add_argument("--base-url", required=True)
+    cell.add_argument("--max-rps", type=float, required=True)
+    cell.add_argument("--rounds", type=int, required=True)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        unknown = set(args.sqlite) - set(SQLITE_PROFILES)
+        if unknown:
+            parser.error(f"Unknown SQLite profiles: {', '.join(sorted(unknown))}")
+        command_run(args)
+    elif args.command == "compare":
+        sys.exit(1 if command_compare(args) else 0)
+    elif args.command == "list":
+        command_list(args)
+    else:
+        print(json.dumps(run_cell(json.loads(args.cell), args.base_url, args.max_rps, args.rounds)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark: commit throughput of the SQLite connection profiles.
+
+Writes a synthetic corpus with upsert_ads_bulk, one transaction per page,
+into a fresh database per profile (see SQLITE_PROFILES in
+ingestion/config.py), first as inserts and then as an identical re-crawl,
+and reports commits and rows per second.
+
+Pages default to a single ad so the per-commit cost (journal writes and
+fsyncs in the safe profile) dominates; ``--page-size 100`` matches the
+crawler's transactions.
+
+Usage:
+    python -m benchmarks.bench_sqlite_profiles
+    python -m benchmarks.bench_sqlite_profiles --ads 20000 --page-size 100
+    python -m benchmarks.bench_sqlite_profiles --profiles bulk
+"""
+
+import argparse
+import tempfile
+from pathlib import Path
+
+from extraction.crawl_all_apec_ads import init_database
+from ingestion.config import SQLITE_PROFILES
+
+from .bench_upsert import bulk, run_pass
+from .synthetic import iter_offers
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ads", type=int, default=5_000, help="Synthetic corpus size")
+    parser.add_argument("--page-size", type=int, default=1, help="Offers per transaction")
+    parser.add_argument(
+        "--profiles",
+        default=",".join(SQLITE_PROFILES),
+        help=f"Comma-separated profiles (default: {','.join(SQLITE_PROFILES)})",
+    )
+    args = parser.parse_args()
+    profiles = [profile for profile in args.profiles.split(",") if profile]
+    unknown = set(profiles) - set(SQLITE_PROFILES)
+    if unknown:
+        parser.error(f"Unknown SQLite profiles: {', '.join(sorted(unknown))}")
+
+    offers = list(iter_offers(args.ads))
+    pages = [offers[i:i + args.page_size] for i in range(0, len(offers), args.page_size)]
+
+    print(f"Corpus: {len(offers):,} ads in {len(pages):,} pages of {args.page_size}")
+    print(f"{'profile':<10} {'pass':<8} {'seconds':>9} {'commits/s':>10} {'rows/s':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in profiles:
+            session_maker = init_database(str(Path(tmp) / f"{profile}.sqlite"), profile=profile)
+            for label in ("insert", "recrawl"):
+                elapsed = run_pass(session_maker, pages, bulk)
+                print(f"{profile:<10} {label:<8} {elapsed:>9.2f} {len(pages) / elapsed:>10,.0f} "
+                      f"{len(offers) / elapsed:>11,.0f}")
+            session_maker.kw["bind"].dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark: per-row upsert_ad vs set-based upsert_ads_bulk.
+
+Loads a synthetic corpus (85k ads by default) page by page into a fresh
+SQLite database with each path, first as inserts and then as a second
+identical "re-crawl" pass, and reports rows per second. On the re-crawl the
+bulk path only bumps last_seen_at since every content hash matches.
+
+Usage:
+    python -m benchmarks.bench_upsert
+    python -m benchmarks.bench_upsert --ads 20000 --page-size 100
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy.orm import sessionmaker
+
+from extraction.crawl_all_apec_ads import init_database, upsert_ad, upsert_ads_bulk
+
+from .synthetic import iter_offers
+
+
+def per_row(session, offers: List[Dict[str, Any]], now_iso: str) -> None:
+    for offer in offers:
+        upsert_ad(session, offer, now_iso)
+
+
+def bulk(session, offers: List[Dict[str, Any]], now_iso: str) -> None:
+    upsert_ads_bulk(session, offers, now_iso)
+
+
+def run_pass(session_maker: sessionmaker, pages: List[List[Dict[str, Any]]], write_page: Callable) -> float:
+    """Write every page in its own transaction and return elapsed seconds."""
+    start = time.perf_counter()
+    for offers in pages:
+        now_iso = datetime.now(timezone.utc).isoformat()
+        with session_maker() as session:
+            write_page(session, offers, now_iso)
+            session.commit()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ads", type=int, default=85_000, help="Synthetic corpus size")
+    parser.add_argument("--page-size", type=int, default=100, help="Offers per transaction")
+    args = parser.parse_args()
+
+    offers = list(iter_offers(args.ads))
+    pages = [offers[i:i + args.page_size] for i in range(0, len(offers), args.page_size)]
+
+    print(f"Corpus: {len(offers):,} ads in {len(pages):,} pages of {args.page_size}")
+    print(f"{'path':<10} {'pass':<8} {'seconds':>9} {'rows/s':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, write_page in (("per-row", per_row), ("bulk", bulk)):
+            session_maker = init_database(str(Path(tmp) / f"{name}.sqlite"))
+            for label in ("insert", "recrawl"):
+                elapsed = run_pass(session_maker, pages, write_page)
+                print(f"{name:<10} {label:<8} {elapsed:>9.2f} {len(offers) / elapsed:>11,.0f}")
+            session_maker.kw["bind"].dispose()
+
+
+if __name__ == "__main__":
+    main()
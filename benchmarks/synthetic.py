@@ -0,0 +1,68 @@
+"""Synthetic APEC offers shaped like ``/rechercheOffre`` results."""
+
+import random
+from typing import Any, Dict, Iterator
+
+LIEUX = ["Paris - 75", "Lyon - 69", "Nantes - 44", "Lille - 59", "Toulouse - 31", "Bordeaux - 33"]
+SECTEURS = [101753, 101762, 101772, 101773, 101756, 101774]
+CONTRATS = [101888, 101887, 101889]
+WORDS = (
+    "poste mission équipe client projet développement gestion analyse "
+    "données ingénieur responsable expérience compétences"
+).split()
+
+
+def make_offer(index: int, rng: random.Random, id_offset: int = 170_000_000) -> Dict[str, Any]:
+    """Build one synthetic offer.
+
+    Args:
+        index: Position of the offer in the corpus (drives the id)
+        rng: Random generator, seeded by the caller for reproducible corpora
+        id_offset: First synthetic APEC id
+
+    Returns:
+        Offer dictionary using the API's camelCase keys
+    """
+    lieu = rng.choice(LIEUX)
+    return {
+        "id": id_offset + index,
+        "numeroOffre": f"{id_offset + index}W",
+        "intitule": f"Ingénieur {rng.choice(WORDS)} H/F",
+        "intituleSurbrillance": f"Ingénieur {rng.choice(WORDS)} H/F",
+        "nomCommercial": f"Entreprise {rng.randint(1, 5000)}",
+        "urlLogo": None,
+        "clientReel": rng.random() < 0.8,
+        "offreConfidentielle": rng.random() < 0.1,
+        "lieuTexte": lieu,
+        "latitude": round(rng.uniform(43.0, 50.5), 6),
+        "longitude": round(rng.uniform(-1.5, 7.5), 6),
+        "localisable": True,
+        "texteOffre": " ".join(rng.choice(WORDS) for _ in range(rng.randint(150, 450))),
+        "salaireTexte": f"{rng.randint(35, 80)} - {rng.randint(81, 120)} k€ brut annuel",
+        "typeContrat": rng.choice(CONTRATS),
+        "contractDuration": None,
+        "secteurActivite": rng.choice(SECTEURS),
+        "secteurActiviteParent": 101750,
+        "origineCode": 101855,
+        "datePublication": f"2026-{rng.randint(1, 9):02d}-{rng.randint(1, 28):02d}T08:00:00.000+0000",
+        "dateValidation": None,
+        "idNomTeletravail": rng.choice([None, 20765, 20766]),
+        "indicateurOqa": False,
+        "indicateurFaibleCandidature": rng.random() < 0.2,
+        "score": round(rng.random() * 100, 4),
+    }
+
+
+def iter_offers(count: int, seed: int = 42) -> Iterator[Dict[str, Any]]:
+    """Yield a reproducible corpus of synthetic offers.
+
+    Args:
+        count: Number of offers
+        seed: Random seed
+
+    Yields:
+        Offer dictionaries
+    """
+    rng = random.Random(seed)
+    for index in range(count):
+        yield make_offer(index, rng)
@@ -0,0 +1,379 @@
+"""
+Append-only archive of the raw result pages fetched by the crawler.
+
+Every page is appended to a segment file as one gzip member holding one
+JSON line ``{"run_id", "start_index", "fetched_at", "page"}``. A segment is
+therefore a valid ``.jsonl.gz`` file (``zcat segment-000001.jsonl.gz``)
+while each page can still be decompressed on its own. Segments are never
+rewritten; each writer appends to segments of its own and starts a new one
+past SEGMENT_MAX_BYTES, so several processes can archive at once.
+
+A small SQLite index next to the segments maps (run_id, startIndex) to the
+byte range of the page, and every ad id to the pages it appeared on with
+its position in ``resultats``. Reads go through memory-mapped segments:
+fetching any historical page, or any version of an ad, is one index lookup
+plus one page decompression, without touching the ``ads`` table.
+
+Windows of different shards of a sharded run share startIndex values, so
+their pages are indexed under ``<run_id>/<shard key>`` (see shard_run_key);
+selecting a run by its run_id also selects the pages of all its shards.
+
+Usage:
+    python -m extraction.archive stats
+    python -m extraction.archive page <run_id> <start_index>
+    python -m extraction.archive ad <ad_id> [--run <run_id>]
+    python -m extraction.archive versions <ad_id>
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Default archive location, next to the database
+ARCHIVE_DIR = "data/archive"
+
+# Size past which a writer starts a new segment
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+
+ARCHIVE_LEVEL = 6
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+INDEX_FILE = "index.sqlite"
+
+# Pages of the shards of a run are indexed under run_id + SHARD_SEPARATOR + key
+SHARD_SEPARATOR = "/"
+
+
+def segment_name(segment: int) -> str:
+    """File name of a segment."""
+    return f"segment-{segment:06d}.jsonl.gz"
+
+
+def shard_run_key(run_id: str, shard_filters: Dict[str, Any]) -> str:
+    """Index key of the pages of one shard of a sharded run.
+
+    Args:
+        run_id: Sharded run
+        shard_filters: Search filters of the shard
+
+    Returns:
+        ``<run_id>/<hash of the filters>``
+    """
+    canonical = json.dumps(shard_filters, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return f"{run_id}{SHARD_SEPARATOR}{hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _run_condition(column: str, run_id: str) -> Tuple[str, Tuple[str, str]]:
+    """SQL condition selecting the pages of a run, shards included."""
+    return f"({column} = ? OR {column} LIKE ?)", (run_id, f"{run_id}{SHARD_SEPARATOR}%")
+
+
+def decode_record(data: bytes) -> Dict[str, Any]:
+    """Decompress and decode one archived record (one gzip member)."""
+    return json.loads(zlib.decompress(data, _GZIP_WBITS))
+
+
+class PageRecord:
+    """One archived page, compressed as it is written.
+
+    The page body can be fed in chunks (e.g. while a streamed response is
+    being decoded); newlines are blanked so the record stays on one line,
+    which is safe because JSON only allows them as whitespace.
+    """
+
+    def __init__(self, run_id: str, start_index: int, fetched_at: Optional[str] = None):
+        self.run_id = run_id
+        self.start_index = start_index
+        self.fetched_at = fetched_at or datetime.now(timezone.utc).isoformat()
+        self._compressor = zlib.compressobj(ARCHIVE_LEVEL, zlib.DEFLATED, _GZIP_WBITS)
+        self._parts: List[bytes] = []
+        header = json.dumps({"run_id": run_id, "start_index": start_index, "fetched_at": self.fetched_at})
+        self._parts.append(self._compressor.compress(header[:-1].encode("utf-8") + b', "page": '))
+
+    def write(self, chunk: bytes) -> None:
+        """Append part of the raw page body."""
+        self._parts.append(self._compressor.compress(chunk.replace(b"\n", b" ").replace(b"\r", b" ")))
+
+    def finish(self) -> bytes:
+        """Close the record and return the compressed gzip member."""
+        self._parts.append(self._compressor.compress(b"}\n") + self._compressor.flush())
+        return b"".join(self._parts)
+
+
+class PageArchive:
+    """Segment files plus their offset index; safe to share between threads."""
+
+    def __init__(self, directory: Path | str = ARCHIVE_DIR, segment_max_bytes: int = SEGMENT_MAX_BYTES):
+        """Open (and create if needed) an archive directory.
+
+        Args:
+            directory: Directory holding the segments and index.sqlite
+            segment_max_bytes: Size past which a new segment is started
+        """
+        self.directory = Path(directory)
+        self.segment_max_bytes = segment_max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.directory / INDEX_FILE, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS segments ("
+            "segment INTEGER PRIMARY KEY, created_at TEXT NOT NULL, pid INTEGER);"
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "page_id INTEGER PRIMARY KEY, run_id TEXT NOT NULL, start_index INTEGER NOT NULL, "
+            "segment INTEGER NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL, "
+            "ads_count INTEGER NOT NULL, fetched_at TEXT NOT NULL, UNIQUE (run_id, start_index));"
+            "CREATE TABLE IF NOT EXISTS ad_pages ("
+            "ad_id INTEGER NOT NULL, page_id INTEGER NOT NULL, position INTEGER NOT NULL, "
+            "PRIMARY KEY (ad_id, page_id)) WITHOUT ROWID;"
+        )
+
+        # Segment this writer appends to (opened on the first append)
+        self._segment: Optional[int] = None
+        self._file = None
+        # Read-only maps by segment, remapped when a segment has grown
+        self._maps: Dict[int, mmap.mmap] = {}
+
+    def record(self, run_id: str, start_index: int) -> PageRecord:
+        """Start a record for a page whose body will be written in chunks."""
+        return PageRecord(run_id, start_index)
+
+    def append_page(self, run_id: str, start_index: int, page: Dict[str, Any], ad_ids: List[Optional[int]]) -> None:
+        """Archive an already decoded page.
+
+        Args:
+            run_id: Run the page was fetched by
+            start_index: startIndex of the page
+            page: Decoded response body
+            ad_ids: Id of each offer of ``resultats``, in order (None if invalid)
+        """
+        record = self.record(run_id, start_index)
+        record.write(json.dumps(page, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        self.append(record, ad_ids)
+
+    def append(self, record: PageRecord, ad_ids: List[Optional[int]]) -> None:
+        """Append a finished record to the current segment and index it.
+
+        The bytes are written before the index rows, so the index never
+        points past the end of a segment. Archiving a page of a run again
+        (a deferred retry) replaces its index entry.
+
+        Args:
+            record: Record holding the complete page body
+            ad_ids: Id of each offer of ``resultats``, in order (None if invalid)
+        """
+        data = record.finish()
+        with self._lock:
+            if self._file is None or (self._file.tell() and self._file.tell() + len(data) > self.segment_max_bytes):
+                self._open_segment()
+            offset = self._file.tell()
+            self._file.write(data)
+            self._file.flush()
+
+            conn = self._conn
+            with conn:
+                page_id = conn.execute(
+                    "INSERT INTO pages (run_id, start_index, segment, offset, length, ads_count, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (run_id, start_index) DO UPDATE SET segment = excluded.segment, "
+                    "offset = excluded.offset, length = excluded.length, "
+                    "ads_count = excluded.ads_count, fetched_at = excluded.fetched_at "
+                    "RETURNING page_id",
+                    (record.run_id, record.start_index, self._segment, offset, len(data),
+                     len(ad_ids), record.fetched_at),
+                ).fetchone()[0]
+                conn.execute("DELETE FROM ad_pages WHERE page_id = ?", (page_id,))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO ad_pages (ad_id, page_id, position) VALUES (?, ?, ?)",
+                    [(ad_id, page_id, position) for position, ad_id in enumerate(ad_ids) if ad_id is not None],
+                )
+
+    def _open_segment(self) -> None:
+        """Start a new segment owned by this writer."""
+        if self._file is not None:
+            self._file.close()
+        with self._conn:
+            self._segment = self._conn.execute(
+                "INSERT INTO segments (created_at, pid) VALUES (?, ?)",
+                (datetime.now(timezone.utc).isoformat(), os.getpid()),
+            ).lastrowid
+        self._file = open(self.directory / segment_name(self._segment), "ab")
+
+    def _read(self, segment: int, offset: int, length: int) -> Dict[str, Any]:
+        """Decompress and decode the record stored at a byte range."""
+        with self._lock:
+            mapped = self._maps.get(segment)
+            if mapped is None or offset + length > len(mapped):
+                if mapped is not None:
+                    mapped.close()
+                with open(self.directory / segment_name(segment), "rb") as segment_file:
+                    mapped = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[segment] = mapped
+            data = mapped[offset:offset + length]
+        return decode_record(data)
+
+    def read_page(self, run_id: str, start_index: int) -> Optional[Dict[str, Any]]:
+        """Archived record of one page of a run.
+
+        Returns:
+            ``{"run_id", "start_index", "fetched_at", "page"}``, or None if the
+            page was not archived
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT segment, offset, length FROM pages WHERE run_id = ? AND start_index = ?",
+                (run_id, start_index),
+            ).fetchone()
+        return self._read(*row) if row else None
+
+    def read_ad(self, ad_id: int, run_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Offer as archived, latest version or the one seen by a given run.
+
+        Returns:
+            The raw offer, or None if it was never archived (for that run)
+        """
+        query = (
+            "SELECT p.segment, p.offset, p.length, a.position FROM ad_pages a "
+            "JOIN pages p ON p.page_id = a.page_id WHERE a.ad_id = ?"
+        )
+        params: Tuple = (ad_id,)
+        if run_id is not None:
+            condition, run_params = _run_condition("p.run_id", run_id)
+            query += f" AND {condition}"
+            params += run_params
+        with self._lock:
+            row = self._conn.execute(query + " ORDER BY p.fetched_at DESC LIMIT 1", params).fetchone()
+        if row is None:
+            return None
+        return self._read(*row[:3])["page"]["resultats"][row[3]]
+
+    def ad_versions(self, ad_id: int) -> List[Tuple[str, str, int]]:
+        """Every archived sighting of an ad, oldest first.
+
+        Returns:
+            List of (fetched_at, run_id, start_index)
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT p.fetched_at, p.run_id, p.start_index FROM ad_pages a "
+                "JOIN pages p ON p.page_id = a.page_id WHERE a.ad_id = ? ORDER BY p.fetched_at",
+                (ad_id,),
+            ).fetchall()
+
+    def pages(self, run_id: Optional[str] = None) -> Iterator[Tuple[str, int, str]]:
+        """Index entries in archive order, optionally for one run.
+
+        Yields:
+            (run_id, start_index, fetched_at)
+        """
+        query = "SELECT run_id, start_index, fetched_at FROM pages"
+        params: Tuple = ()
+        if run_id is not None:
+            condition, params = _run_condition("run_id", run_id)
+            query += f" WHERE {condition}"
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY page_id", params).fetchall()
+        yield from rows
+
+    def page_locations(self, run_id: Optional[str] = None) -> List[Tuple[int, int, int, str]]:
+        """Byte ranges of the indexed pages, by segment and offset.
+
+        Returns:
+            List of (segment, offset, length, fetched_at)
+        """
+        query = "SELECT segment, offset, length, fetched_at FROM pages"
+        params: Tuple = ()
+        if run_id is not None:
+            condition, params = _run_condition("run_id", run_id)
+            query += f" WHERE {condition}"
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY segment, offset", params).fetchall()
+
+    def stats(self) -> Dict[str, int]:
+        """Counts and on-disk size of the archive."""
+        with self._lock:
+            pages, runs, stored = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT CASE WHEN instr(run_id, ?) THEN substr(run_id, 1, instr(run_id, ?) - 1) "
+                "ELSE run_id END), COALESCE(SUM(length), 0) FROM pages",
+                (SHARD_SEPARATOR, SHARD_SEPARATOR),
+            ).fetchone()
+            ads = self._conn.execute("SELECT COUNT(DISTINCT ad_id) FROM ad_pages").fetchone()[0]
+            segments = [row[0] for row in self._conn.execute("SELECT segment FROM segments")]
+        segment_bytes = sum(
+            (self.directory / segment_name(segment)).stat().st_size
+            for segment in segments
+            if (self.directory / segment_name(segment)).exists()
+        )
+        return {
+            "runs": runs,
+            "pages": pages,
+            "ads": ads,
+            "segments": len(segments),
+            "segment_bytes": segment_bytes,
+            "indexed_bytes": stored,
+            "index_bytes": (self.directory / INDEX_FILE).stat().st_size,
+        }
+
+    def close(self) -> None:
+        """Close the current segment, the maps and the index."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+            self._conn.close()
+
+
+def main() -> None:
+    """Inspect the archive: summary, one page, or one ad."""
+    parser = argparse.ArgumentParser(description="Read archived APEC result pages.")
+    parser.add_argument("--dir", default=ARCHIVE_DIR, help=f"Archive directory (default: {ARCHIVE_DIR})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Archive summary")
+    page_parser = commands.add_parser("page", help="Print one archived page")
+    page_parser.add_argument("run_id")
+    page_parser.add_argument("start_index", type=int)
+    ad_parser = commands.add_parser("ad", help="Print the archived payload of an ad")
+    ad_parser.add_argument("ad_id", type=int)
+    ad_parser.add_argument("--run", default=None, help="Version seen by this run (default: latest)")
+    versions_parser = commands.add_parser("versions", help="List the archived sightings of an ad")
+    versions_parser.add_argument("ad_id", type=int)
+    args = parser.parse_args()
+
+    if not (Path(args.dir) / INDEX_FILE).exists():
+        parser.error(f"No archive in {args.dir}")
+    archive = PageArchive(args.dir)
+    try:
+        if args.command == "stats":
+            for key, value in archive.stats().items():
+                print(f"{key:<14} {value:>14,}")
+        elif args.command == "page":
+            record = archive.read_page(args.run_id, args.start_index)
+            if record is None:
+                raise SystemExit(f"Page {args.start_index} of run {args.run_id} is not archived")
+            print(json.dumps(record, ensure_ascii=False, indent=2))
+        elif args.command == "ad":
+            offer = archive.read_ad(args.ad_id, args.run)
+            if offer is None:
+                raise SystemExit(f"Ad {args.ad_id} is not archived")
+            print(json.dumps(offer, ensure_ascii=False, indent=2))
+        else:
+            for fetched_at, run_id, start_index in archive.ad_versions(args.ad_id):
+                print(f"{fetched_at}  run {run_id}  index {start_index}")
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Asyncio crawl engine for APEC job ads.
+
+Alternative to the requests-based loop in crawl_all_apec_ads: many HTTP
+requests stay in flight on a single event loop, while all SQLite writes are
+handed to one dedicated writer thread so the loop never blocks on a commit.
+
+Retry semantics match fetch_page: 401/403 aborts the crawl, 429 and 5xx back
+off exponentially, timeouts and connection errors are retried, and requests
+are paced by the same adaptive rate controller (which honours Retry-After).
+Pages are checkpointed like in the requests engine, and pages failing after
+MAX_RETRIES are deferred and retried at the end of the run.
+
+Requires the optional ``aiohttp`` dependency (``pip install aiohttp``).
+
+Usage:
+    python -m extraction.crawl_all_apec_ads --engine asyncio --concurrency 16
+"""
+
+import asyncio
+import json
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import sessionmaker
+
+from ingestion import metrics
+from ingestion.rate_control import AdaptiveRateController
+
+from .crawl_all_apec_ads import (
+    BASE_URL,
+    DEFERRED_RETRY_ROUNDS,
+    ENDPOINT_PATH,
+    HEADERS,
+    MAX_PAGES,
+    MAX_RETRIES,
+    PAGE_SIZE,
+    REQUEST_TIMEOUT,
+    CrawlStats,
+    archive_page,
+    build_page_payload,
+    finish_run,
+    format_page_counts,
+    make_rate_controller,
+    print_rate_summary,
+    mark_page_failed,
+    record_total_available,
+    save_page,
+    start_run,
+)
+from .archive import PageArchive
+from .proxy_pool import ProxyPool
+
+try:
+    import aiohttp
+except ImportError:  # optional dependency
+    aiohttp = None
+
+
+class AsyncFetchError(Exception):
+    """Raised when a page cannot be fetched after all retries."""
+
+
+class AsyncAuthError(Exception):
+    """Raised when the API rejects the request credentials (the crawl stops)."""
+
+
+class PageWriter:
+    """Dedicated SQLite writer thread fed through a bounded queue.
+
+    The event loop hands pages over with ``submit`` (and failed pages with
+    ``submit_failure``); the writer persists and checkpoints them, appends
+    them to the raw page archive (if any) once committed, and keeps the run
+    statistics.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        session_maker: sessionmaker,
+        run_id: str,
+        max_pending: int = 32,
+        archive: Optional[PageArchive] = None,
+    ):
+        """Initialize the writer.
+
+        Args:
+            session_maker: SQLAlchemy session factory
+            run_id: Run the pages are checkpointed against
+            max_pending: Pages that may wait for the writer before submit blocks
+            archive: Optional raw page archive
+        """
+        self.session_maker = session_maker
+        self.run_id = run_id
+        self.archive = archive
+        self.queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.stats = CrawlStats()
+        self.error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="page-writer", daemon=True)
+
+    def start(self) -> None:
+        """Start the writer thread."""
+        self._thread.start()
+
+    async def submit(self, start_index: int, page: Dict[str, Any]) -> None:
+        """Queue one non-empty page for persistence without blocking the event loop.
+
+        Args:
+            start_index: startIndex of the page
+            page: Decoded response body
+        """
+        await self._put((start_index, page))
+
+    async def submit_failure(self, start_index: int, error: Exception) -> None:
+        """Queue a failed-page checkpoint.
+
+        Args:
+            start_index: startIndex of the page
+            error: Last error raised for the page
+        """
+        await self._put((start_index, error))
+
+    async def _put(self, item: tuple) -> None:
+        if self.error:
+            raise self.error
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # Backpressure: wait in a thread so other requests keep flowing
+            await asyncio.to_thread(self.queue.put, item)
+
+    def close(self) -> CrawlStats:
+        """Flush remaining pages and stop the writer.
+
+        Returns:
+            Totals for every page written
+        """
+        self.queue.put(self._STOP)
+        self._thread.join()
+        if self.error:
+            raise self.error
+        return self.stats
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is self._STOP:
+                return
+            if self.error:
+                continue  # drain so producers never block forever
+            start_index, payload = item
+            try:
+                if isinstance(payload, Exception):
+                    mark_page_failed(self.session_maker, self.run_id, start_index, payload)
+                    continue
+                offers = payload.get("resultats", [])
+                counts = save_page(self.session_maker, offers, self.run_id, start_index)
+                archive_page(self.archive, self.run_id, start_index, payload)
+            except Exception as e:
+                self.error = e
+                continue
+            self.stats.add_page(*counts)
+            print(f"📄 Index {start_index}: stored {len(offers)} offers {format_page_counts(*counts)}")
+
+
+async def fetch_page_async(
+    session: "aiohttp.ClientSession",
+    start_index: int,
+    proxy: Optional[str | ProxyPool] = None,
+    rate_controller: Optional[AdaptiveRateController] = None,
+) -> Dict[str, Any]:
+    """Fetch one page of job offers with retry logic.
+
+    Args:
+        session: aiohttp session with headers
+        start_index: Starting index for pagination
+        proxy: Optional proxy URL, or a ProxyPool picking one per attempt
+        rate_controller: Optional shared controller pacing every attempt
+            (with a ProxyPool each proxy's own controller is used instead)
+
+    Returns:
+        API response dictionary
+
+    Raises:
+        AsyncFetchError: If request fails after retries
+        AsyncAuthError: If authentication fails (401/403); it propagates out
+            of crawl_all_ads_async (which closes the run as incomplete) and
+            the crawler's main exits with status 1
+    """
+    payload = build_page_payload(start_index)
+    url = f"{BASE_URL}{ENDPOINT_PATH}"
+
+    rate_controller = rate_controller or make_rate_controller(None)
+    for attempt in range(MAX_RETRIES):
+        last_attempt = attempt == MAX_RETRIES - 1
+        if attempt:
+            metrics.RETRIES.labels("crawler").inc()
+        pooled, controller, attempt_proxy = None, rate_controller, proxy
+        if isinstance(proxy, ProxyPool):
+            pooled = await asyncio.to_thread(proxy.acquire)
+            controller, attempt_proxy = pooled.rate_controller, pooled.url
+        delay = controller.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if controller.shared_budget is not None:
+            await asyncio.to_thread(controller.acquire_shared)
+        started = time.monotonic()
+        released = pooled is None
+        try:
+            async with session.post(url, json=payload, proxy=attempt_proxy) as response:
+                metrics.REQUESTS.labels("crawler", str(response.status)).inc()
+                metrics.REQUEST_LATENCY.labels("crawler").observe(time.monotonic() - started)
+                controller.record_response(
+                    response.status,
+                    time.monotonic() - started,
+                    response.headers.get("Retry-After"),
+                )
+                if pooled is not None:
+                    proxy.release(pooled, response.status)
+                    released = True
+                    if response.status in (401, 403):
+                        print(f"    ⚠️  Proxy {pooled.label} rejected (HTTP {response.status})")
+                        if last_attempt:
+                            raise AsyncFetchError(f"HTTP {response.status} at index {start_index}")
+                        continue
+
+                # Handle authentication errors immediately
+                if response.status in (401, 403):
+                    print(f"\n❌ Authentication failed (HTTP {response.status})")
+                    print("Check API access or credentials.")
+                    raise AsyncAuthError(f"HTTP {response.status} at index {start_index}")
+
+                # Handle rate limiting and server errors with backoff
+                if response.status == 429 or response.status >= 500:
+                    label = "Rate limited" if response.status == 429 else "Server error"
+                    print(f"    ⚠️  {label} ({response.status})")
+                    if last_attempt:
+                        raise AsyncFetchError(f"HTTP {response.status} at index {start_index}")
+                    delay = controller.retry_delay()
+                    print(f"    ⏳ Backing off for {delay:.2f}s (attempt {attempt + 1})")
+                    await asyncio.sleep(delay)
+                    continue
+
+                if response.status >= 400:
+                    raise AsyncFetchError(f"HTTP {response.status} at index {start_index}")
+
+                body = await response.read()
+                metrics.BYTES_RECEIVED.labels("crawler").inc(len(body))
+                return json.loads(body)
+
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            metrics.REQUESTS.labels("crawler", "error").inc()
+            print(f"    ⚠️  Request error: {e!r}")
+            if not released:
+                proxy.release(pooled, None)
+            controller.record_error()
+            if last_attempt:
+                raise AsyncFetchError(str(e)) from e
+            delay = controller.retry_delay()
+            print(f"    ⏳ Backing off for {delay:.2f}s (attempt {attempt + 1})")
+            await asyncio.sleep(delay)
+
+    raise AsyncFetchError(f"Failed after {MAX_RETRIES} retries")
+
+
+async def _crawl(
+    session_maker: sessionmaker,
+    run_id: str,
+    writer: PageWriter,
+    proxies: Optional[Dict[str, str] | ProxyPool],
+    concurrency: int,
+    max_rps: Optional[float],
+) -> bool:
+    """Event-loop body of crawl_all_ads_async.
+
+    Returns:
+        Whether the sweep is complete (pages are persisted by writer)
+    """
+    if isinstance(proxies, ProxyPool):
+        proxy = proxies
+    else:
+        proxy = (proxies.get("https") or proxies.get("http")) if proxies else None
+    rate_controller = make_rate_controller(max_rps)
+
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=timeout, connector=connector) as session:
+        # First page tells us how many windows there are
+        try:
+            first = await fetch_page_async(session, 0, proxy, rate_controller)
+        except AsyncFetchError as e:
+            print(f"\n❌ Request failed: {e}")
+            return False
+
+        offers = first.get("resultats", [])
+        total_available = first.get("totalCount", 0)
+        await asyncio.to_thread(record_total_available, session_maker, run_id, total_available)
+        if not offers:
+            print("no results (end of pagination)")
+            return True
+        await writer.submit(0, first)
+
+        async def fetch_windows(indexes: List[int]) -> List[int]:
+            """Fetch windows with `concurrency` workers; return failed indexes."""
+            pending = iter(indexes)
+            failed: List[int] = []
+            stop = asyncio.Event()
+
+            async def worker() -> None:
+                for start_index in pending:
+                    if stop.is_set():
+                        return
+                    try:
+                        response = await fetch_page_async(session, start_index, proxy, rate_controller)
+                    except AsyncFetchError as e:
+                        print(f"\n❌ Request failed (index {start_index}), deferred: {e}")
+                        failed.append(start_index)
+                        await writer.submit_failure(start_index, e)
+                        continue
+                    page_offers = response.get("resultats", [])
+                    if not page_offers:
+                        print(f"📄 Index {start_index}: no results (end of pagination)")
+                        stop.set()
+                        return
+                    await writer.submit(start_index, response)
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return sorted(failed)
+
+        indexes = list(range(PAGE_SIZE, total_available, PAGE_SIZE))
+        if MAX_PAGES:
+            indexes = indexes[:max(MAX_PAGES - 1, 0)]
+        failed = await fetch_windows(indexes)
+
+        for retry_round in range(1, DEFERRED_RETRY_ROUNDS + 1):
+            if not failed:
+                break
+            print(f"\n🔁 Retrying {len(failed)} deferred pages (round {retry_round}/{DEFERRED_RETRY_ROUNDS})")
+            failed = await fetch_windows(failed)
+        if failed:
+            print(f"\n⚠️  {len(failed)} pages still failing; resume later with --resume {run_id}")
+
+    print(f"\n✅ Async crawl finished (total available: {total_available})")
+    print_rate_summary(rate_controller, proxies)
+    return not failed
+
+
+def crawl_all_ads_async(
+    session_maker: sessionmaker,
+    proxies: Optional[Dict[str, str] | ProxyPool],
+    concurrency: int = 16,
+    max_rps: Optional[float] = None,
+    archive: Optional[PageArchive] = None,
+) -> tuple[str, int, int]:
+    """Crawl all ads on an asyncio event loop with a dedicated DB writer.
+
+    Args:
+        session_maker: SQLAlchemy session factory
+        proxies: Optional proxy configuration (same shape as get_proxy_config) or ProxyPool
+        concurrency: Maximum number of requests in flight
+        max_rps: Upper bound of the adaptive request rate (None = no cap)
+        archive: Optional raw page archive, appended to by the writer thread
+
+    Returns:
+        Tuple of (run_id, total_ads_fetched, total_pages_fetched)
+    """
+    if aiohttp is None:
+        raise RuntimeError("The asyncio engine requires aiohttp: pip install aiohttp")
+
+    run_id = start_run(session_maker, notes="Full crawl of all APEC job ads (asyncio engine)")
+
+    print(f"🚀 Starting async crawl run: {run_id}")
+    print(f"📊 Page size: {PAGE_SIZE}")
+    print(f"🧵 Requests in flight: {concurrency} (max {max_rps or 'unlimited'} req/s)")
+    print(f"🔄 Max retries: {MAX_RETRIES}")
+    print()
+
+    writer = PageWriter(session_maker, run_id, max_pending=concurrency * 2, archive=archive)
+    writer.start()
+    complete = False
+    try:
+        complete = asyncio.run(_crawl(session_maker, run_id, writer, proxies, concurrency, max_rps))
+    finally:
+        # A crawl or writer failure still closes the run, as incomplete
+        try:
+            writer.close()
+        finally:
+            finish_run(session_maker, run_id, writer.stats, complete=complete and writer.error is None)
+    return run_id, writer.stats.ads_fetched, writer.stats.pages
@@ -0,0 +1,214 @@
+"""
+Compress (or decompress) the large text columns of an existing database.
+
+Rewrites ``ads.payload_json`` and ``ads.texte_offre`` in place, one batch
+of rows per transaction, with the chosen codec and optionally a shared
+dictionary trained on a sample of existing payloads. Rows already stored
+with the target settings are skipped, so an interrupted migration can
+simply be run again. The database is vacuumed at the end to give the freed
+pages back to the filesystem.
+
+Reports the file size and the stored column bytes before and after, and the
+mean latency of reading both columns for a random sample of ads.
+
+New writes stay plain text unless APEC_COMPRESSION is set (see
+extraction/compression.py): export it with the codec used here so the
+crawler keeps the database compressed.
+
+Usage:
+    python -m extraction.compress_db
+    python -m extraction.compress_db --codec zstd --train-dictionary
+    python -m extraction.compress_db --codec none          # back to plain text
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from . import compression
+from .crawl_all_apec_ads import DB_PATH, Ad, CompressionDictionary, init_database
+
+# Columns rewritten by the migration
+COMPRESSED_COLUMNS = ("payload_json", "texte_offre")
+
+
+def stored_bytes(session_maker: sessionmaker) -> int:
+    """Bytes stored in the compressed columns, as SQLite sees them."""
+    lengths = " + ".join(f"COALESCE(SUM(LENGTH(CAST({column} AS BLOB))), 0)" for column in COMPRESSED_COLUMNS)
+    with session_maker() as db_session:
+        return db_session.execute(text(f"SELECT {lengths} FROM ads")).scalar()
+
+
+def file_bytes(session_maker: sessionmaker) -> int:
+    """Size of the database file (pages in use and free pages)."""
+    with session_maker() as db_session:
+        page_count = db_session.execute(text("PRAGMA page_count")).scalar()
+        page_size = db_session.execute(text("PRAGMA page_size")).scalar()
+    return page_count * page_size
+
+
+def read_latency(session_maker: sessionmaker, ids: List[int]) -> float:
+    """Mean seconds to load (and decompress) both columns of one ad."""
+    if not ids:
+        return 0.0
+    started = time.perf_counter()
+    with session_maker() as db_session:
+        for ad_id in ids:
+            db_session.execute(select(Ad.payload_json, Ad.texte_offre).where(Ad.id == ad_id)).one()
+    return (time.perf_counter() - started) / len(ids)
+
+
+def train_and_store_dictionary(session_maker: sessionmaker, codec: str, samples: int) -> int:
+    """Train a dictionary on random payloads and store it.
+
+    Returns:
+        Id of the new dictionary
+    """
+    with session_maker() as db_session:
+        payloads = db_session.execute(
+            select(Ad.payload_json).order_by(func.random()).limit(samples)
+        ).scalars().all()
+    data = compression.train_dictionary(payloads, codec)
+    if not data:
+        raise SystemExit("Not enough repeated content in the sampled payloads to train a dictionary")
+    with session_maker() as db_session:
+        dictionary = CompressionDictionary(
+            codec=codec,
+            data=data,
+            sample_count=len(payloads),
+            created_at=datetime.now(timezone.utc).isoformat(),
+        )
+        db_session.add(dictionary)
+        db_session.commit()
+        dictionary_id = dictionary.id
+    compression.register_dictionary(dictionary_id, codec, data)
+    print(f"📖 Trained {codec} dictionary {dictionary_id}: {len(data):,} bytes from {len(payloads):,} payloads")
+    return dictionary_id
+
+
+def _is_current(value, header: Optional[bytes]) -> bool:
+    """Whether a stored value already uses the target codec and dictionary."""
+    if value is None:
+        return True
+    if header is None:
+        return isinstance(value, str)
+    return isinstance(value, bytes) and value[:len(header)] == header
+
+
+def migrate(session_maker: sessionmaker, batch_size: int) -> int:
+    """Rewrite every row not yet stored with the configured settings.
+
+    Args:
+        session_maker: SQLAlchemy session factory
+        batch_size: Rows per transaction
+
+    Returns:
+        Number of rows rewritten
+    """
+    codec, dictionary_id = compression.write_settings()
+    header = None
+    if codec is not None:
+        header = compression.compress_text("", codec, dictionary_id)[:3]
+
+    rewritten = 0
+    last_id = -1
+    columns = ", ".join(COMPRESSED_COLUMNS)
+    assignments = ", ".join(f"{column} = :{column}" for column in COMPRESSED_COLUMNS)
+    while True:
+        with session_maker() as db_session:
+            # Raw SQL: values come back exactly as stored, without the column type
+            rows = db_session.execute(
+                text(f"SELECT id, {columns} FROM ads WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                {"last_id": last_id, "limit": batch_size},
+            ).all()
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                values = dict(zip(COMPRESSED_COLUMNS, row[1:]))
+                if all(_is_current(value, header) for value in values.values()):
+                    continue
+                update = {"id": row[0]}
+                for column, value in values.items():
+                    plain = compression.decompress_value(value)
+                    update[column] = None if plain is None else compression.compress_text(plain)
+                updates.append(update)
+            if updates:
+                db_session.execute(text(f"UPDATE ads SET {assignments} WHERE id = :id"), updates)
+                db_session.commit()
+            rewritten += len(updates)
+            last_id = rows[-1][0]
+        print(f"   … {rewritten:,} rows rewritten (id > {last_id})", end="\r", flush=True)
+    print()
+    return rewritten
+
+
+def main() -> None:
+    """Migrate a database in place and report the size and latency impact."""
+    parser = argparse.ArgumentParser(description="Compress payload_json / texte_offre of an existing database.")
+    parser.add_argument("--db", default=DB_PATH, help=f"SQLite database (default: {DB_PATH})")
+    parser.add_argument("--codec", choices=["zlib", "zstd", "none"], default="zlib", help="Target codec")
+    parser.add_argument("--train-dictionary", action="store_true", help="Train a shared dictionary first")
+    parser.add_argument("--samples", type=int, default=2000, help="Payloads sampled for the dictionary")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per transaction (default: 500)")
+    parser.add_argument("--latency-sample", type=int, default=500, help="Ads read to measure latency")
+    parser.add_argument("--no-vacuum", action="store_true", help="Skip VACUUM (file size will not shrink)")
+    args = parser.parse_args()
+
+    if not Path(args.db).exists():
+        parser.error(f"No database at {args.db}")
+    session_maker = init_database(args.db)
+
+    with session_maker() as db_session:
+        ids = db_session.execute(select(Ad.id)).scalars().all()
+    sample = random.sample(ids, min(args.latency_sample, len(ids)))
+
+    size_before = file_bytes(session_maker)
+    stored_before = stored_bytes(session_maker)
+    latency_before = read_latency(session_maker, sample)
+    print(f"📁 {args.db}: {len(ids):,} ads")
+
+    codec = None if args.codec == "none" else args.codec
+    dictionary_id = 0
+    if args.train_dictionary and codec is not None:
+        dictionary_id = train_and_store_dictionary(session_maker, codec, args.samples)
+    elif codec is not None:
+        # Keep using the newest stored dictionary of that codec, if any
+        _, current_dictionary = compression.write_settings()
+        if current_dictionary and compression.dictionary_codec(current_dictionary) == codec:
+            dictionary_id = current_dictionary
+    compression.configure(codec, dictionary_id)
+
+    started = time.perf_counter()
+    rewritten = migrate(session_maker, max(args.batch_size, 1))
+    print(f"✅ {rewritten:,} rows rewritten in {time.perf_counter() - started:.1f}s")
+
+    if not args.no_vacuum:
+        with session_maker() as db_session:
+            db_session.connection().exec_driver_sql("VACUUM")
+
+    size_after = file_bytes(session_maker)
+    stored_after = stored_bytes(session_maker)
+    latency_after = read_latency(session_maker, sample)
+
+    print()
+    print(f"{'':<22} {'before':>14} {'after':>14} {'ratio':>7}")
+    print(f"{'file bytes':<22} {size_before:>14,} {size_after:>14,} {size_after / max(size_before, 1):>7.2f}")
+    print(f"{'column bytes':<22} {stored_before:>14,} {stored_after:>14,} {stored_after / max(stored_before, 1):>7.2f}")
+    print(
+        f"{'read latency (µs/ad)':<22} {latency_before * 1e6:>14.1f} {latency_after * 1e6:>14.1f} "
+        f"{latency_after / max(latency_before, 1e-9):>7.2f}"
+    )
+    if codec is not None and os.environ.get("APEC_COMPRESSION") != codec:
+        print(f"ℹ️  Set APEC_COMPRESSION={codec} so new writes are compressed too")
+
+
+if __name__ == "__main__":
+    main()
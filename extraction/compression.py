@@ -0,0 +1,202 @@
+"""
+Transparent compression of the large text columns of ``ads``.
+
+``payload_json`` and ``texte_offre`` use the CompressedText column type:
+values are compressed on write and decompressed when read. Stored values
+start with a 3-byte header (codec, dictionary id) so one column can mix
+codecs, dictionaries and plain text left by older versions; plain text is
+returned unchanged, which lets a database be migrated in place batch by
+batch.
+
+Codecs: zlib (standard library) or zstd (optional ``zstandard``
+dependency). Both can use a shared dictionary trained on existing payloads;
+dictionaries are stored in the database and registered at startup by
+init_database.
+
+Compression is opt-in, because tools reading the SQLite file directly
+expect plain text: APEC_COMPRESSION selects the codec for new writes
+("zlib", "zstd" or "none", the default). Compress an existing database with
+extraction/compress_db.py, then keep APEC_COMPRESSION set to the same codec
+so new writes are compressed too.
+"""
+
+import os
+import struct
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+CODEC_IDS = {"zlib": 1, "zstd": 2}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+
+# Header: codec id (1 byte) + dictionary id (2 bytes, 0 = none)
+_HEADER = struct.Struct(">BH")
+
+# zlib only looks back 32 KiB, a bigger dictionary would be wasted
+ZLIB_DICT_SIZE = 32 * 1024
+ZSTD_DICT_SIZE = 112 * 1024
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+
+# Dictionaries by id, filled by register_dictionary
+_dictionaries: Dict[int, Tuple[str, bytes]] = {}
+
+# Codec and dictionary used for new writes (see configure)
+_write_codec: Optional[str] = None
+_write_dictionary_id = 0
+
+
+def configure(codec: Optional[str], dictionary_id: int = 0) -> None:
+    """Choose how new values are compressed.
+
+    Args:
+        codec: "zlib", "zstd", or None/"none" to store plain text
+        dictionary_id: Registered dictionary to use (0 = none); it must have
+            been trained for the same codec
+    """
+    global _write_codec, _write_dictionary_id
+    codec = None if codec in (None, "", "none") else codec
+    if codec not in (None, *CODEC_IDS):
+        raise ValueError(f"Unknown compression codec: {codec}")
+    if codec == "zstd" and zstandard is None:
+        raise RuntimeError("zstd compression requires zstandard: pip install zstandard")
+    if dictionary_id and dictionary_codec(dictionary_id) != codec:
+        raise ValueError(f"Dictionary {dictionary_id} was not trained for {codec}")
+    _write_codec = codec
+    _write_dictionary_id = dictionary_id
+
+
+def register_dictionary(dictionary_id: int, codec: str, data: bytes) -> None:
+    """Make a stored dictionary available for reading (and writing)."""
+    _dictionaries[dictionary_id] = (codec, data)
+
+
+def registered_dictionaries() -> Dict[int, Tuple[str, bytes]]:
+    """Every registered dictionary by id, as (codec, data)."""
+    return dict(_dictionaries)
+
+
+def dictionary_codec(dictionary_id: int) -> Optional[str]:
+    """Codec a registered dictionary was trained for (None if unknown)."""
+    entry = _dictionaries.get(dictionary_id)
+    return entry[0] if entry else None
+
+
+def write_settings() -> Tuple[Optional[str], int]:
+    """Codec and dictionary id currently used for new writes."""
+    return _write_codec, _write_dictionary_id
+
+
+def compress_text(value: str, codec: Optional[str] = None, dictionary_id: Optional[int] = None) -> bytes | str:
+    """Compress one text value with a header identifying codec and dictionary.
+
+    Args:
+        value: Text to compress
+        codec: Codec override (defaults to the configured one)
+        dictionary_id: Dictionary override (defaults to the configured one)
+
+    Returns:
+        Compressed bytes, or the text itself when compression is disabled
+    """
+    codec = _write_codec if codec is None else codec
+    dictionary_id = _write_dictionary_id if dictionary_id is None else dictionary_id
+    if codec is None:
+        return value
+    data = value.encode("utf-8")
+    dictionary = _dictionaries[dictionary_id][1] if dictionary_id else None
+    if codec == "zlib":
+        compressor = zlib.compressobj(ZLIB_LEVEL, zdict=dictionary) if dictionary else zlib.compressobj(ZLIB_LEVEL)
+        body = compressor.compress(data) + compressor.flush()
+    else:
+        zstd_dict = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        body = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=zstd_dict).compress(data)
+    return _HEADER.pack(CODEC_IDS[codec], dictionary_id) + body
+
+
+def decompress_value(value: bytes | str | None) -> Optional[str]:
+    """Decode a stored value, compressed or plain text."""
+    if value is None or isinstance(value, str):
+        return value
+    codec_id, dictionary_id = _HEADER.unpack_from(value)
+    body = memoryview(value)[_HEADER.size:]
+    dictionary = None
+    if dictionary_id:
+        if dictionary_id not in _dictionaries:
+            raise LookupError(f"Compression dictionary {dictionary_id} is not registered")
+        dictionary = _dictionaries[dictionary_id][1]
+    if CODEC_NAMES.get(codec_id) == "zlib":
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        data = decompressor.decompress(body) + decompressor.flush()
+    elif CODEC_NAMES.get(codec_id) == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading zstd values requires zstandard: pip install zstandard")
+        zstd_dict = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        data = zstandard.ZstdDecompressor(dict_data=zstd_dict).decompress(body)
+    else:
+        raise ValueError(f"Unknown compression codec id: {codec_id}")
+    return data.decode("utf-8")
+
+
+configure(os.environ.get("APEC_COMPRESSION", "none"))
+
+
+def train_dictionary(samples: Iterable[str], codec: str) -> bytes:
+    """Build a shared dictionary from sample values.
+
+    zstd trains a real dictionary; zlib gets a preset dictionary made of the
+    most frequent lines of the samples (JSON keys, boilerplate paragraphs),
+    most frequent last since zlib favours the end of the dictionary.
+
+    Args:
+        samples: Representative values (e.g. a few thousand payloads)
+        codec: "zlib" or "zstd"
+
+    Returns:
+        Dictionary bytes
+    """
+    samples = [sample.encode("utf-8") for sample in samples]
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd dictionaries require zstandard: pip install zstandard")
+        return zstandard.train_dictionary(ZSTD_DICT_SIZE, samples).as_bytes()
+
+    counts: Counter = Counter()
+    for sample in samples:
+        # Split JSON on field boundaries and text on sentences
+        for chunk in sample.replace(b', "', b',\n"').replace(b'","', b'",\n"').replace(b". ", b".\n").splitlines():
+            if len(chunk) >= 8:
+                counts[chunk] += 1
+    dictionary = b""
+    for chunk, count in counts.most_common():
+        if count < 2 or len(dictionary) + len(chunk) > ZLIB_DICT_SIZE:
+            continue
+        dictionary = chunk + dictionary
+    return dictionary
+
+
+class CompressedText(TypeDecorator):
+    """Text column stored compressed, decompressed when the value is loaded.
+
+    The DDL type stays TEXT (SQLite keeps BLOBs in TEXT columns as-is), so
+    existing databases need no schema change.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes):
+            return value
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_value(value)
@@ -9,43 +9,119 @@ Features:
 - SQLAlchemy ORM with SQLite persistence
 - Automatic resume capability (upserts on conflict)
 - Exponential backoff with jitter for rate limiting
-- Request delay for politeness
+- Adaptive (AIMD) request pacing that honours Retry-After
+- Optional concurrent page fetching with a global requests-per-second cap
+- Optional asyncio engine (aiohttp) with a dedicated SQLite writer thread
+- Optional fetch/transform/write pipeline joined by bounded queues
+- Optional filter-space sharding crawled in parallel with cross-shard dedup
+- Incremental mode that stops after a streak of already-known pages
+- Per-page checkpoints with --resume and a deferred retry queue for failed pages
+- Optional streaming decode of pages (--stream) to cap peak memory
+- Append-only archive of the raw pages with an offset index (extraction/archive.py)
+- Per-page phase timings in run_pages, aggregated on the run (extraction/timing.py)
+- Optional Prometheus metrics endpoint or textfile (ingestion/metrics.py)
+- Version history of changed ads as JSON deltas with keyframes (extraction/versions.py)
+- Removed-ad detection (removed_at) at the end of every complete full sweep
+- FTS5 full-text index over titles and descriptions (extraction/search.py)
+- Numeric coordinates with an R*Tree index for radius queries (extraction/geo.py)
+- Incremental Parquet export partitioned by publication month (extraction/export.py)
 - Comprehensive error handling
 - Progress tracking and run statistics
-- Optional HTTP proxy support
+- Optional HTTP proxy support, or a health-scored pool of proxies
 
 Usage:
-    python crawl_all_apec_ads.py
+    python -m extraction.crawl_all_apec_ads
+    python -m extraction.crawl_all_apec_ads --concurrency 8 --max-rps 5
+    python -m extraction.crawl_all_apec_ads --engine asyncio --concurrency 16
+    python -m extraction.crawl_all_apec_ads --engine pipeline --concurrency 8
+    python -m extraction.crawl_all_apec_ads --shard --concurrency 8
+    python -m extraction.crawl_all_apec_ads --incremental --published-within 24h
+    python -m extraction.crawl_all_apec_ads --stream --concurrency 4
+    python -m extraction.crawl_all_apec_ads --no-archive        # skip the raw page archive
+    python -m extraction.crawl_all_apec_ads --sqlite-profile safe  # no bulk PRAGMAs during the sweep
+    python -m extraction.crawl_all_apec_ads --metrics-port 9108   # Prometheus /metrics while crawling
+    python -m extraction.crawl_all_apec_ads --resume            # latest unfinished run
+    python -m extraction.crawl_all_apec_ads --resume <run_id>
 
 Environment Variables (loaded from .env file):
+    APEC_BASE_URL: Override the API base URL (e.g. a local stand-in server)
+    APEC_PAGE_SIZE: Results per page (default: 100, the API maximum)
     HTTP_PROXY / HTTPS_PROXY: Optional proxy URL
     PROXY_USERNAME: Proxy authentication username
     PROXY_PASSWORD: Proxy authentication password
     PROXY_HOST: Proxy host (default: p.webshare.io:80)
+    APEC_PROXY_LIST / APEC_PROXY_FILE: Proxy pool (see extraction/proxy_pool.py)
+    APEC_REQUEST_BUDGET: Bucket file of a request budget shared with other
+        processes (off by default; see ingestion/token_bucket.py)
+    APEC_REQUEST_BUDGET_RATE / APEC_REQUEST_PRIORITY: Its rate and this
+        process's priority
+    APEC_SQLITE_PROFILE: SQLite connection profile outside sweeps (default: safe,
+        see ingestion/sqlite_profiles.py)
+    APEC_COMPRESSION: Codec of payload_json / texte_offre for new writes
+        (default: none, see extraction/compression.py)
+    APEC_METRICS_PORT / APEC_METRICS_TEXTFILE: Default Prometheus endpoint port /
+        node_exporter textfile (see ingestion/metrics.py)
 """
 
+import argparse
+import hashlib
 import json
 import os
 import random
 import sys
+import threading
 import time
 import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from itertools import islice
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
 
 import requests
 from sqlalchemy import (
+    LargeBinary,
     Column,
+    Float,
+    Index,
     Integer,
     String,
     Text,
     create_engine,
     func,
+    inspect,
     select,
+    text,
+    bindparam,
+    update,
 )
-from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import DeclarativeBase, Session, deferred, sessionmaker
+
+from ingestion import metrics
+from ingestion.config import (
+    ANCIENNETE_PUBLICATION,
+    DEFAULT_SQLITE_PROFILE,
+    METRICS_PORT,
+    METRICS_TEXTFILE,
+    PRIORITY_CRAWL,
+    SQLITE_PROFILES,
+)
+from ingestion.rate_control import AdaptiveRateController
+from ingestion.sqlite_profiles import apply_sqlite_profile, use_sqlite_profile
+from ingestion.token_bucket import open_shared_budget
+
+from . import compression
+from .archive import ARCHIVE_DIR, PageArchive
+from .compression import CompressedText
+from .geo import ensure_geo_index, parse_coordinate
+from .proxy_pool import ProxyPool, describe_proxies, load_proxy_pool
+from .search import ensure_search_index, index_rows
+from .streaming import STREAM_CHUNK_SIZE, PageStream, StreamTimings
+from .timing import PHASES, CommitTimes, PageTiming, percentile
+from .versions import version_rows
 
 # Load environment variables from .env file
 load_dotenv()
@@ -55,20 +131,49 @@ load_dotenv()
 # ============================================================================
 
 # API Configuration
-BASE_URL = "https://www.apec.fr/cms/webservices"
+BASE_URL = os.environ.get("APEC_BASE_URL", "https://www.apec.fr/cms/webservices")
 ENDPOINT_PATH = "/rechercheOffre"
 
 # Pagination Configuration
-PAGE_SIZE = 100  # Results per page (max supported by APEC)
+PAGE_SIZE = int(os.environ.get("APEC_PAGE_SIZE", 100))  # Results per page (max supported by APEC)
 MAX_PAGES = None  # Optional safety cap (None = unlimited)
 
 # Rate Limiting & Politeness
-REQUEST_DELAY_SECONDS = 0.8  # Delay between requests
+REQUEST_DELAY_SECONDS = 0.8  # Initial delay between requests (the adaptive rate starts here)
 MAX_RETRIES = 5  # Max retry attempts for transient errors
+DEFERRED_RETRY_ROUNDS = 2  # Extra passes over failed pages at the end of a run
+
+# Concurrency (used once the first page has returned totalCount)
+CONCURRENCY = 1  # Parallel page fetches (1 = sequential crawl)
+MAX_REQUESTS_PER_SECOND = 5.0  # Global request cap across all workers (None = no cap)
+
+# Incremental mode: results are sorted newest first, so once this many
+# consecutive pages contain only already-known ads the rest is known too
+INCREMENTAL_KNOWN_PAGE_STREAK = 2
+
+# Streaming mode: offers are upserted in batches of this size while the
+# page body is still being read
+STREAM_BATCH_SIZE = 20
+
+# Removed ads: a complete full sweep only retires the ads it did not see if
+# it saw at least this fraction of the first page's totalCount
+REMOVAL_MIN_COVERAGE = 0.98
 
 # Database Configuration
 DB_PATH = "data/apec_observer.sqlite"
 
+# Payload keys left out of the content hash: the relevance score depends on
+# the search query, not on the ad itself
+HASH_IGNORED_KEYS = ("score",)
+
+# Prometheus series updated per request / page (see ingestion/metrics.py)
+_REQUEST_LATENCY = metrics.REQUEST_LATENCY.labels("crawler")
+_RETRIES = metrics.RETRIES.labels("crawler")
+_BYTES_RECEIVED = metrics.BYTES_RECEIVED.labels("crawler")
+_ADS_NEW = metrics.ADS.labels("new")
+_ADS_CHANGED = metrics.ADS.labels("changed")
+_ADS_UNCHANGED = metrics.ADS.labels("unchanged")
+
 # Request Configuration
 REQUEST_TIMEOUT = 100  # seconds
 SECTEUR_ALL = ["101753"]  # None = all sectors, or specific ID like "101753" for IT
@@ -137,10 +242,12 @@ class Ad(Base):
     lieu_texte = Column(Text, nullable=True)  # Location text
     latitude = Column(Text, nullable=True)  # GPS latitude
     longitude = Column(Text, nullable=True)  # GPS longitude
+    lat = Column(Float, nullable=True)  # Parsed latitude (indexed in ads_geo)
+    lon = Column(Float, nullable=True)  # Parsed longitude (indexed in ads_geo)
     localisable = Column(Integer, nullable=True)  # Boolean: can be geolocated
     
     # Job details
-    texte_offre = Column(Text, nullable=True)  # Full job description
+    texte_offre = deferred(Column(CompressedText, nullable=True))  # Full job description (compressed, loaded on access)
     salaire_texte = Column(Text, nullable=True)  # Salary information
     type_contrat = Column(Integer, nullable=True)  # Contract type ID
     contract_duration = Column(Integer, nullable=True)  # Contract duration
@@ -162,13 +269,26 @@ class Ad(Base):
     # Scoring & metadata
     score = Column(Text, nullable=True)  # Relevance score (stored as text for precision)
     
-    # Full raw payload for future analysis
-    payload_json = Column(Text, nullable=False)
+    # Full raw payload for future analysis (compressed, loaded on access)
+    payload_json = deferred(Column(CompressedText, nullable=False))
+    content_hash = Column(String, nullable=True)  # SHA-256 of the canonical payload
+    version = Column(Integer, nullable=True)  # Latest version in ad_versions (NULL = never changed)
     
     # Tracking timestamps
     first_seen_at = Column(Text, nullable=False)
     last_seen_at = Column(Text, nullable=False)
     
+    # Removal tracking
+    last_run_seq = Column(Integer, nullable=True)  # Highest Run.seq that saw the ad
+    removed_at = Column(Text, nullable=True)  # Set when a complete sweep no longer sees the ad
+    
+    __table_args__ = (
+        # Live ads by last run: the set-difference of retire_removed_ads
+        Index("ix_ads_live_last_run_seq", "last_run_seq", sqlite_where=text("removed_at IS NULL")),
+        # Publication month (YYYY-MM): the partitions of the Parquet export
+        Index("ix_ads_publication_month", text("substr(date_publication, 1, 7)")),
+    )
+    
     def __repr__(self):
         return f"<Ad(id={self.id}, intitule={self.intitule!r})>"
 
@@ -179,25 +299,112 @@ class Run(Base):
     __tablename__ = "runs"
     
     run_id = Column(String, primary_key=True)
+    seq = Column(Integer, nullable=True)  # Compact run sequence stamped on the ads a run sees
     started_at = Column(Text, nullable=False)
     ended_at = Column(Text, nullable=True)
     ads_fetched = Column(Integer, default=0)
     pages_fetched = Column(Integer, default=0)
+    ads_new = Column(Integer, default=0)
+    ads_changed = Column(Integer, default=0)
+    ads_unchanged = Column(Integer, default=0)
     notes = Column(Text, nullable=True)
     
+    # Resume bookkeeping
+    status = Column(String, nullable=True)  # running, complete or incomplete
+    mode = Column(String, nullable=True)  # full or incremental
+    page_size = Column(Integer, nullable=True)
+    total_available = Column(Integer, nullable=True)  # totalCount of the first page
+    search_filters_json = Column(Text, nullable=True)  # Fields layered over REQUEST_TEMPLATE
+    scope = Column(String, nullable=True)  # search_scope of the run's payload (which ads it can see)
+    
+    # Aggregates of the run_pages timings, set by finish_run
+    duration_seconds = Column(Float, nullable=True)  # Wall clock from started_at to ended_at
+    ads_per_second = Column(Float, nullable=True)
+    pages_per_second = Column(Float, nullable=True)
+    latency_p50 = Column(Float, nullable=True)  # Request latency (seconds to response headers)
+    latency_p95 = Column(Float, nullable=True)
+    latency_p99 = Column(Float, nullable=True)
+    bytes_received = Column(Integer, nullable=True)  # Response bodies
+    retries = Column(Integer, nullable=True)
+    backoff_seconds = Column(Float, nullable=True)  # Sleeping between retries
+    sleep_seconds = Column(Float, nullable=True)  # Backoff plus rate limiter waits
+    ads_removed = Column(Integer, nullable=True)  # Ads retired by this sweep (NULL = not eligible)
+    
+    __table_args__ = (Index("ix_runs_seq", "seq", unique=True),)
+    
     def __repr__(self):
         return f"<Run(run_id={self.run_id}, ads_fetched={self.ads_fetched})>"
 
 
+class RunPage(Base):
+    """Per-page checkpoint of a crawl run."""
+    
+    __tablename__ = "run_pages"
+    
+    run_id = Column(String, primary_key=True)
+    start_index = Column(Integer, primary_key=True, autoincrement=False)
+    status = Column(String, nullable=False)  # done or failed
+    ads_count = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    updated_at = Column(Text, nullable=False)
+    
+    # Phase timings (see extraction/timing.py)
+    request_seconds = Column(Float, nullable=True)
+    download_seconds = Column(Float, nullable=True)
+    decode_seconds = Column(Float, nullable=True)
+    transform_seconds = Column(Float, nullable=True)
+    write_seconds = Column(Float, nullable=True)
+    commit_seconds = Column(Float, nullable=True)  # Written by the run's next transaction
+    retries = Column(Integer, nullable=True)
+    backoff_seconds = Column(Float, nullable=True)
+    wait_seconds = Column(Float, nullable=True)
+    bytes_received = Column(Integer, nullable=True)
+    
+    def __repr__(self):
+        return f"<RunPage(run_id={self.run_id}, start_index={self.start_index}, status={self.status})>"
+
+
+class AdVersion(Base):
+    """One version of an ad's payload: a full keyframe or a delta (see extraction/versions.py)."""
+    
+    __tablename__ = "ad_versions"
+    
+    ad_id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    seen_at = Column(Text, nullable=False)  # First crawl that saw this version
+    content_hash = Column(String, nullable=True)
+    delta_json = Column(Text, nullable=True)  # Changed keys vs the previous version (deltas only)
+    payload_json = deferred(Column(CompressedText, nullable=True))  # Full payload (keyframes only)
+    
+    def __repr__(self):
+        return f"<AdVersion(ad_id={self.ad_id}, version={self.version})>"
+
+
+class CompressionDictionary(Base):
+    """Shared dictionary for compressing payload_json / texte_offre."""
+    
+    __tablename__ = "compression_dictionaries"
+    
+    id = Column(Integer, primary_key=True)
+    codec = Column(String, nullable=False)  # zlib or zstd
+    data = Column(LargeBinary, nullable=False)
+    sample_count = Column(Integer, nullable=True)  # Payloads it was trained on
+    created_at = Column(Text, nullable=False)
+    
+    def __repr__(self):
+        return f"<CompressionDictionary(id={self.id}, codec={self.codec}, bytes={len(self.data)})>"
+
+
 # ============================================================================
 # DATABASE UTILITIES
 # ============================================================================
 
-def init_database(db_path: str) -> sessionmaker:
+def init_database(db_path: str, profile: str = DEFAULT_SQLITE_PROFILE) -> sessionmaker:
     """Initialize database connection and create tables.
     
     Args:
         db_path: Path to SQLite database file
+        profile: SQLite connection profile (see SQLITE_PROFILES)
         
     Returns:
         SQLAlchemy sessionmaker factory
@@ -211,117 +418,357 @@ def init_database(db_path: str) -> sessionmaker:
         connect_args={"check_same_thread": False},
         echo=False,  # Set to True for SQL debugging
     )
+    apply_sqlite_profile(engine, profile)
     
     # Create all tables
     Base.metadata.create_all(engine)
+    add_missing_columns(engine)
+    ensure_search_index(engine)
     
-    return sessionmaker(bind=engine)
+    session_maker = sessionmaker(bind=engine)
+    load_compression_dictionaries(session_maker)
+    backfilled = ensure_geo_index(session_maker)
+    if backfilled:
+        print(f"🌍 Backfilled coordinates of {backfilled:,} ads")
+    return session_maker
 
 
-def upsert_ad(session: Session, offer: Dict[str, Any], now_iso: str) -> bool:
-    """Insert or update a single ad with conflict resolution.
+def load_compression_dictionaries(session_maker: sessionmaker) -> None:
+    """Register stored compression dictionaries.
+    
+    Every dictionary is needed to read values compressed with it; the
+    newest one trained for the configured codec is used for new writes.
+    
+    Args:
+        session_maker: SQLAlchemy session factory
+    """
+    codec, _ = compression.write_settings()
+    latest = 0
+    with session_maker() as db_session:
+        for dictionary in db_session.execute(select(CompressionDictionary).order_by(CompressionDictionary.id)).scalars():
+            compression.register_dictionary(dictionary.id, dictionary.codec, dictionary.data)
+            if dictionary.codec == codec:
+                latest = dictionary.id
+    if latest:
+        compression.configure(codec, latest)
+
+
+def add_missing_columns(engine) -> None:
+    """Add model columns and indexes missing from existing tables (lightweight migration).
+    
+    create_all only creates missing tables, so databases from older versions
+    get new nullable columns added with ALTER TABLE and new indexes created.
+    
+    Args:
+        engine: SQLAlchemy engine
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        # sqlite_master rather than the inspector, which skips expression indexes
+        indexes = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+
+
+def _bool_to_int(val) -> int | None:
+    """Convert a boolean to int for SQLite."""
+    if val is None:
+        return None
+    return 1 if val else 0
+
+
+def _float_to_str(val) -> str | None:
+    """Convert a float to string for precision."""
+    if val is None:
+        return None
+    return str(val)
+
+
+def offer_content_hash(offer: Dict[str, Any]) -> str:
+    """Compute a stable content hash of an offer payload.
+    
+    Keys are sorted so the hash does not depend on API key order, and
+    HASH_IGNORED_KEYS are left out.
     
     Args:
-        session: SQLAlchemy session
         offer: Raw offer dictionary from API
-        now_iso: Current timestamp in ISO format
         
     Returns:
-        True if new ad, False if updated existing
+        Hex SHA-256 digest
     """
+    content = {key: value for key, value in offer.items() if key not in HASH_IGNORED_KEYS}
+    canonical = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _parse_offer_id(offer: Dict[str, Any]) -> Optional[int]:
+    """Return the offer id as an int, or None if missing or invalid."""
     offer_id = offer.get("id")
     if not offer_id:
-        return False
-    
-    # Try to parse as integer
+        return None
     try:
-        offer_id = int(offer_id)
+        return int(offer_id)
     except (ValueError, TypeError):
-        return False
+        return None
+
+
+def offer_to_row(
+    offer: Dict[str, Any],
+    now_iso: str,
+    content_hash: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """Map a raw API offer to an ``ads`` row in one pass.
     
-    # Helper to convert boolean to int (SQLite)
-    def bool_to_int(val) -> int | None:
-        if val is None:
-            return None
-        return 1 if val else 0
+    Args:
+        offer: Raw offer dictionary from API
+        now_iso: Current timestamp in ISO format
+        content_hash: Precomputed offer_content_hash (computed if omitted)
+        
+    Returns:
+        Column dictionary for the Ad table, or None if the offer has no valid id
+    """
+    offer_id = _parse_offer_id(offer)
+    if offer_id is None:
+        return None
     
-    # Helper to convert float to string for precision
-    def float_to_str(val) -> str | None:
-        if val is None:
-            return None
-        return str(val)
+    return {
+        "id": offer_id,
+        "numero_offre": offer.get("numeroOffre"),
+        "intitule": offer.get("intitule"),
+        "intitule_surbrillance": offer.get("intituleSurbrillance"),
+        "nom_commercial": offer.get("nomCommercial"),
+        "url_logo": offer.get("urlLogo"),
+        "client_reel": _bool_to_int(offer.get("clientReel")),
+        "offre_confidentielle": _bool_to_int(offer.get("offreConfidentielle")),
+        "lieu_texte": offer.get("lieuTexte"),
+        "latitude": offer.get("latitude"),
+        "longitude": offer.get("longitude"),
+        "lat": parse_coordinate(offer.get("latitude"), 90),
+        "lon": parse_coordinate(offer.get("longitude"), 180),
+        "localisable": _bool_to_int(offer.get("localisable")),
+        "texte_offre": offer.get("texteOffre"),
+        "salaire_texte": offer.get("salaireTexte"),
+        "type_contrat": offer.get("typeContrat"),
+        "contract_duration": offer.get("contractDuration"),
+        "secteur_activite": offer.get("secteurActivite"),
+        "secteur_activite_parent": offer.get("secteurActiviteParent"),
+        "origine_code": offer.get("origineCode"),
+        "date_publication": offer.get("datePublication"),
+        "date_validation": offer.get("dateValidation"),
+        "id_nom_teletravail": offer.get("idNomTeletravail"),
+        "indicateur_oqa": _bool_to_int(offer.get("indicateurOqa")),
+        "indicateur_faible_candidature": _bool_to_int(offer.get("indicateurFaibleCandidature")),
+        "score": _float_to_str(offer.get("score")),
+        "payload_json": json.dumps(offer, ensure_ascii=False),
+        "content_hash": content_hash or offer_content_hash(offer),
+        "first_seen_at": now_iso,
+        "last_seen_at": now_iso,
+    }
+
+
+def upsert_ad(session: Session, offer: Dict[str, Any], now_iso: str) -> bool:
+    """Insert or update a single ad with conflict resolution.
+    
+    Per-row ORM path; save_page uses upsert_ads_bulk instead.
+    
+    Args:
+        session: SQLAlchemy session
+        offer: Raw offer dictionary from API
+        now_iso: Current timestamp in ISO format
+        
+    Returns:
+        True if new ad, False if updated existing
+    """
+    row = offer_to_row(offer, now_iso)
+    if row is None:
+        return False
     
     # Check if ad exists
-    existing = session.get(Ad, offer_id)
+    existing = session.get(Ad, row["id"])
     
     if existing:
-        # Update existing ad
-        existing.last_seen_at = now_iso
-        existing.payload_json = json.dumps(offer, ensure_ascii=False)
-        
-        # Update all extracted fields (in case they changed)
-        existing.numero_offre = offer.get("numeroOffre")
-        existing.intitule = offer.get("intitule")
-        existing.intitule_surbrillance = offer.get("intituleSurbrillance")
-        existing.nom_commercial = offer.get("nomCommercial")
-        existing.url_logo = offer.get("urlLogo")
-        existing.client_reel = bool_to_int(offer.get("clientReel"))
-        existing.offre_confidentielle = bool_to_int(offer.get("offreConfidentielle"))
-        existing.lieu_texte = offer.get("lieuTexte")
-        existing.latitude = offer.get("latitude")
-        existing.longitude = offer.get("longitude")
-        existing.localisable = bool_to_int(offer.get("localisable"))
-        existing.texte_offre = offer.get("texteOffre")
-        existing.salaire_texte = offer.get("salaireTexte")
-        existing.type_contrat = offer.get("typeContrat")
-        existing.contract_duration = offer.get("contractDuration")
-        existing.secteur_activite = offer.get("secteurActivite")
-        existing.secteur_activite_parent = offer.get("secteurActiviteParent")
-        existing.origine_code = offer.get("origineCode")
-        existing.date_publication = offer.get("datePublication")
-        existing.date_validation = offer.get("dateValidation")
-        existing.id_nom_teletravail = offer.get("idNomTeletravail")
-        existing.indicateur_oqa = bool_to_int(offer.get("indicateurOqa"))
-        existing.indicateur_faible_candidature = bool_to_int(offer.get("indicateurFaibleCandidature"))
-        existing.score = float_to_str(offer.get("score"))
-        
+        # Record the change before the payload is overwritten
+        if existing.content_hash != row["content_hash"]:
+            versions, existing.version = version_rows(
+                row["id"], existing.version, existing.payload_json, existing.content_hash, existing.first_seen_at,
+                offer, row["payload_json"], row["content_hash"], now_iso,
+            )
+            session.execute(sqlite_insert(AdVersion.__table__).on_conflict_do_nothing(), versions)
+        # Update all extracted fields (in case they changed), keep first_seen_at
+        for column, value in row.items():
+            if column not in ("id", "first_seen_at"):
+                setattr(existing, column, value)
+        existing.removed_at = None
+        index_rows(session, [row])
         return False
     else:
         # Insert new ad
-        ad = Ad(
-            id=offer_id,
-            numero_offre=offer.get("numeroOffre"),
-            intitule=offer.get("intitule"),
-            intitule_surbrillance=offer.get("intituleSurbrillance"),
-            nom_commercial=offer.get("nomCommercial"),
-            url_logo=offer.get("urlLogo"),
-            client_reel=bool_to_int(offer.get("clientReel")),
-            offre_confidentielle=bool_to_int(offer.get("offreConfidentielle")),
-            lieu_texte=offer.get("lieuTexte"),
-            latitude=offer.get("latitude"),
-            longitude=offer.get("longitude"),
-            localisable=bool_to_int(offer.get("localisable")),
-            texte_offre=offer.get("texteOffre"),
-            salaire_texte=offer.get("salaireTexte"),
-            type_contrat=offer.get("typeContrat"),
-            contract_duration=offer.get("contractDuration"),
-            secteur_activite=offer.get("secteurActivite"),
-            secteur_activite_parent=offer.get("secteurActiviteParent"),
-            origine_code=offer.get("origineCode"),
-            date_publication=offer.get("datePublication"),
-            date_validation=offer.get("dateValidation"),
-            id_nom_teletravail=offer.get("idNomTeletravail"),
-            indicateur_oqa=bool_to_int(offer.get("indicateurOqa")),
-            indicateur_faible_candidature=bool_to_int(offer.get("indicateurFaibleCandidature")),
-            score=float_to_str(offer.get("score")),
-            payload_json=json.dumps(offer, ensure_ascii=False),
-            first_seen_at=now_iso,
-            last_seen_at=now_iso,
-        )
-        session.add(ad)
+        session.add(Ad(**row))
+        index_rows(session, [row])
         return True
 
 
+# Columns rewritten when an already-known ad is seen again
+_UPSERT_UPDATE_COLUMNS = [
+    column.name for column in Ad.__table__.columns
+    if column.name not in ("id", "first_seen_at", "last_run_seq")
+]
+
+
+def _stamp_run_seq(current, run_seq):
+    """SQL keeping the highest run sequence that saw an ad.
+    
+    Runs overlap (an incremental crawl during a sweep), so an older run
+    must not lower the stamp of a newer one.
+    """
+    return func.max(func.coalesce(current, 0), func.coalesce(run_seq, 0))
+
+
+def hash_offers(offers: List[Dict[str, Any]]) -> List[tuple[int, Dict[str, Any], str]]:
+    """Pair every valid offer with its id and content hash.
+    
+    Args:
+        offers: Raw offer dictionaries from API
+        
+    Returns:
+        List of (offer_id, offer, content_hash), skipping offers without a valid id
+    """
+    hashed = []
+    for offer in offers:
+        offer_id = _parse_offer_id(offer)
+        if offer_id is not None:
+            hashed.append((offer_id, offer, offer_content_hash(offer)))
+    return hashed
+
+
+def upsert_ads_bulk(
+    session: Session,
+    offers: List[Dict[str, Any]],
+    now_iso: str,
+    hashed: Optional[List[tuple[int, Dict[str, Any], str]]] = None,
+    timing: Optional[PageTiming] = None,
+    run_seq: Optional[int] = None,
+) -> tuple[int, int, int]:
+    """Insert or update a whole page of ads with set-based statements.
+    
+    Known ids and their content hashes are read with a single IN query.
+    Unchanged ads only get last_seen_at bumped, in one UPDATE for the whole
+    page; new and changed ads go through one executemany'd
+    ``INSERT ... ON CONFLICT(id) DO UPDATE`` that never touches first_seen_at.
+    Changed ads also get their previous payload read (one more IN query) and
+    the change recorded in ad_versions with one executemany'd insert.
+    Every ad of the page is stamped with run_seq and revived if it had been
+    marked removed; new and changed ads are (re)indexed for full-text search.
+    
+    Args:
+        session: SQLAlchemy session
+        offers: Raw offer dictionaries from API
+        now_iso: Current timestamp in ISO format
+        hashed: Precomputed hash_offers(offers), computed if omitted
+        timing: Optional page timing (transform and write phases)
+        run_seq: Run.seq of the crawl seeing the page (None = no stamp)
+        
+    Returns:
+        Tuple of (new_ads, changed_ads, unchanged_ads)
+    """
+    if timing is None:
+        timing = PageTiming()
+    if hashed is None:
+        with timing.phase("transform"):
+            hashed = hash_offers(offers)
+    if not hashed:
+        return 0, 0, 0
+    
+    with timing.phase("write"):
+        known_hashes = dict(
+            session.execute(
+                select(Ad.id, Ad.content_hash).where(Ad.id.in_({offer_id for offer_id, _, _ in hashed}))
+            ).all()
+        )
+    
+    # Previous (payload_json, content_hash, version, first_seen_at) of changed ads
+    previous = {}
+    changed_ids = [
+        offer_id for offer_id, _, content_hash in hashed
+        if offer_id in known_hashes and known_hashes[offer_id] != content_hash
+    ]
+    if changed_ids:
+        with timing.phase("write"):
+            previous = {
+                ad_id: (payload_json, content_hash, version, first_seen_at)
+                for ad_id, payload_json, content_hash, version, first_seen_at in session.execute(
+                    select(Ad.id, Ad.payload_json, Ad.content_hash, Ad.version, Ad.first_seen_at)
+                    .where(Ad.id.in_(changed_ids))
+                )
+            }
+    
+    new_ads = 0
+    changed_ads = 0
+    unchanged_ids = []
+    rows = []
+    versions = []
+    with timing.phase("transform"):
+        for offer_id, offer, content_hash in hashed:
+            row = None
+            if offer_id not in known_hashes:
+                new_ads += 1
+            elif known_hashes[offer_id] == content_hash:
+                unchanged_ids.append(offer_id)
+                continue
+            else:
+                changed_ads += 1
+                row = offer_to_row(offer, now_iso, content_hash)
+                previous_json, previous_hash, version, first_seen_at = previous[offer_id]
+                page_versions, row["version"] = version_rows(
+                    offer_id, version, previous_json, previous_hash, first_seen_at,
+                    offer, row["payload_json"], content_hash, now_iso,
+                )
+                versions.extend(page_versions)
+            if row is None:
+                row = offer_to_row(offer, now_iso, content_hash)
+                row["version"] = None
+            row["last_run_seq"] = run_seq
+            row["removed_at"] = None
+            # A repeated id within the page compares against this version
+            known_hashes[offer_id] = content_hash
+            previous[offer_id] = (row["payload_json"], content_hash, row["version"], row["first_seen_at"])
+            rows.append(row)
+    
+    with timing.phase("write"):
+        if versions:
+            session.execute(sqlite_insert(AdVersion.__table__).on_conflict_do_nothing(), versions)
+        
+        if unchanged_ids:
+            session.execute(
+                update(Ad).where(Ad.id.in_(unchanged_ids)).values(
+                    last_seen_at=now_iso,
+                    last_run_seq=_stamp_run_seq(Ad.last_run_seq, run_seq),
+                    removed_at=None,
+                )
+            )
+        
+        if rows:
+            stmt = sqlite_insert(Ad.__table__)
+            set_ = {column: stmt.excluded[column] for column in _UPSERT_UPDATE_COLUMNS}
+            set_["last_run_seq"] = _stamp_run_seq(Ad.__table__.c.last_run_seq, stmt.excluded.last_run_seq)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Ad.__table__.c.id],
+                set_=set_,
+            )
+            session.execute(stmt, rows)
+            index_rows(session, rows)
+    
+    return new_ads, changed_ads, len(unchanged_ids)
+
+
 # ============================================================================
 # HTTP UTILITIES
 # ============================================================================
@@ -376,32 +823,147 @@ def get_proxy_config() -> Optional[Dict[str, str]]:
     return None
 
 
-def exponential_backoff_sleep(attempt: int, base_delay: float = 1.0, max_delay: float = 60.0):
-    """Sleep with exponential backoff and jitter.
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 60.0) -> float:
+    """Compute an exponential backoff delay with jitter.
     
     Args:
         attempt: Retry attempt number (0-indexed)
         base_delay: Base delay in seconds
         max_delay: Maximum delay in seconds
+        
+    Returns:
+        Delay in seconds
     """
     delay = min(base_delay * (2 ** attempt), max_delay)
     jitter = random.uniform(0, delay * 0.1)  # 10% jitter
-    sleep_time = delay + jitter
+    return delay + jitter
+
+
+def exponential_backoff_sleep(
+    attempt: int,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    rate_controller: Optional[AdaptiveRateController] = None,
+) -> float:
+    """Sleep with exponential backoff and jitter.
+    
+    With a rate controller the backoff follows its shared error streak and
+    any pending Retry-After instead of this request's attempt number.
+    
+    Args:
+        attempt: Retry attempt number (0-indexed)
+        base_delay: Base delay in seconds
+        max_delay: Maximum delay in seconds
+        rate_controller: Optional shared AdaptiveRateController
+        
+    Returns:
+        Seconds slept
+    """
+    if rate_controller is not None:
+        sleep_time = rate_controller.retry_delay(base_delay, max_delay)
+    else:
+        sleep_time = backoff_delay(attempt, base_delay, max_delay)
     print(f"    ⏳ Backing off for {sleep_time:.2f}s (attempt {attempt + 1})")
     time.sleep(sleep_time)
+    return sleep_time
+
+
+def print_rate_summary(
+    rate_controller: AdaptiveRateController,
+    proxies: Optional[Dict[str, str] | ProxyPool] = None,
+) -> None:
+    """Print the final state of the rate controller (or of every pooled proxy)."""
+    if isinstance(proxies, ProxyPool):
+        print(f"\n🌐 Proxy pool:\n{proxies.summary()}")
+    else:
+        print(f"\n⏱️  Rate control: {rate_controller.summary()}")
+
+
+def make_rate_controller(max_rps: Optional[float] = MAX_REQUESTS_PER_SECOND) -> AdaptiveRateController:
+    """Create the crawler's adaptive rate controller.
+    
+    The rate starts at 1 / REQUEST_DELAY_SECONDS and adapts from there.
+    When APEC_REQUEST_BUDGET is set, requests also draw from the request
+    budget shared with other processes (the metric ingestion), at crawl
+    priority.
+    
+    Args:
+        max_rps: Upper bound in requests per second (None = unbounded)
+        
+    Returns:
+        A controller to share between all workers of a crawl
+    """
+    initial_rate = 1.0 / REQUEST_DELAY_SECONDS
+    if max_rps:
+        initial_rate = min(initial_rate, max_rps)
+    return AdaptiveRateController(
+        initial_rate=initial_rate,
+        max_rate=max_rps,
+        shared_budget=open_shared_budget(PRIORITY_CRAWL),
+    )
+
+
+def build_page_payload(
+    start_index: int,
+    search_filters: Optional[Dict[str, Any]] = None,
+    page_size: int = PAGE_SIZE,
+) -> Dict[str, Any]:
+    """Build the search payload for one pagination window.
+    
+    Args:
+        start_index: Starting index for pagination
+        search_filters: Optional fields overriding REQUEST_TEMPLATE
+        page_size: Results per page (1 for a totalCount probe)
+        
+    Returns:
+        Request body based on REQUEST_TEMPLATE
+    """
+    payload = REQUEST_TEMPLATE.copy()
+    if search_filters:
+        payload.update(search_filters)
+    payload["pagination"] = {"range": page_size, "startIndex": start_index}
+    return payload
+
+
+def search_scope(search_filters: Optional[Dict[str, Any]] = None) -> str:
+    """Key of the set of ads a search can return.
+    
+    Runs whose payloads differ only in pagination and sort order see the
+    same ads and share a scope; any other filter (including a different
+    REQUEST_TEMPLATE) gives another scope.
+    
+    Args:
+        search_filters: Optional fields overriding REQUEST_TEMPLATE
+        
+    Returns:
+        Hex digest of the payload without pagination and sorts
+    """
+    payload = build_page_payload(0, search_filters)
+    del payload["pagination"]
+    payload.pop("sorts", None)
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
 
 
 def fetch_page(
     session: requests.Session,
     start_index: int,
-    proxies: Optional[Dict[str, str]] = None,
+    proxies: Optional[Dict[str, str] | ProxyPool] = None,
+    search_filters: Optional[Dict[str, Any]] = None,
+    page_size: int = PAGE_SIZE,
+    rate_controller: Optional[AdaptiveRateController] = None,
+    timing: Optional[PageTiming] = None,
 ) -> Dict[str, Any]:
     """Fetch one page of job offers with retry logic.
     
     Args:
         session: Requests session with headers
         start_index: Starting index for pagination
-        proxies: Optional proxy configuration
+        proxies: Optional proxy configuration or ProxyPool
+        search_filters: Optional fields overriding REQUEST_TEMPLATE
+        page_size: Results per page (1 for a totalCount probe)
+        rate_controller: Optional shared controller pacing every attempt
+        timing: Optional page timing (request to decode phases)
         
     Returns:
         API response dictionary
@@ -410,19 +972,153 @@ def fetch_page(
         requests.HTTPError: If request fails after retries
         SystemExit: If authentication fails (401/403)
     """
-    payload = REQUEST_TEMPLATE.copy()
-    payload["pagination"] = {"range": PAGE_SIZE, "startIndex": start_index}
+    if timing is None:
+        timing = PageTiming()
+    body = fetch_page_raw(session, start_index, proxies, search_filters, page_size, rate_controller, timing)
+    with timing.phase("decode"):
+        return json.loads(body)
+
+
+def fetch_page_raw(
+    session: requests.Session,
+    start_index: int,
+    proxies: Optional[Dict[str, str] | ProxyPool] = None,
+    search_filters: Optional[Dict[str, Any]] = None,
+    page_size: int = PAGE_SIZE,
+    rate_controller: Optional[AdaptiveRateController] = None,
+    timing: Optional[PageTiming] = None,
+) -> bytes:
+    """Fetch one page of job offers with retry logic, without decoding it.
+    
+    Args:
+        session: Requests session with headers
+        start_index: Starting index for pagination
+        proxies: Optional proxy configuration or ProxyPool
+        search_filters: Optional fields overriding REQUEST_TEMPLATE
+        page_size: Results per page (1 for a totalCount probe)
+        rate_controller: Optional shared controller pacing every attempt
+        timing: Optional page timing (request and download phases)
+        
+    Returns:
+        Raw JSON response body
+        
+    Raises:
+        requests.HTTPError: If request fails after retries
+        SystemExit: If authentication fails (401/403)
+    """
+    return _post_page(session, start_index, proxies, search_filters, page_size, rate_controller, timing=timing).content
+
+
+def fetch_page_stream(
+    session: requests.Session,
+    start_index: int,
+    proxies: Optional[Dict[str, str] | ProxyPool] = None,
+    search_filters: Optional[Dict[str, Any]] = None,
+    rate_controller: Optional[AdaptiveRateController] = None,
+    timing: Optional[PageTiming] = None,
+) -> PageStream:
+    """Fetch one page of job offers, returning once the headers have arrived.
+    
+    Retries cover everything up to a successful status; the body is then
+    decoded incrementally by iterating ``PageStream.offers()``.
+    
+    Args:
+        session: Requests session with headers
+        start_index: Starting index for pagination
+        proxies: Optional proxy configuration or ProxyPool
+        search_filters: Optional fields overriding REQUEST_TEMPLATE
+        rate_controller: Optional shared controller pacing every attempt
+        timing: Optional page timing (request phase; the body is timed by
+            save_page_stream)
+        
+    Returns:
+        The page stream (consume it before fetching many more pages)
+        
+    Raises:
+        requests.HTTPError: If request fails after retries
+        SystemExit: If authentication fails (401/403)
+    """
+    response = _post_page(
+        session, start_index, proxies, search_filters, PAGE_SIZE, rate_controller, stream=True, timing=timing
+    )
+    return PageStream(
+        response.iter_content(STREAM_CHUNK_SIZE),
+        ttfb=response.elapsed.total_seconds(),
+        on_close=response.close,
+    )
+
+
+def _post_page(
+    session: requests.Session,
+    start_index: int,
+    proxies: Optional[Dict[str, str] | ProxyPool],
+    search_filters: Optional[Dict[str, Any]],
+    page_size: int,
+    rate_controller: Optional[AdaptiveRateController],
+    stream: bool = False,
+    timing: Optional[PageTiming] = None,
+) -> requests.Response:
+    """POST one page request with retry logic and return the successful response.
+    
+    With a ProxyPool every attempt goes through the healthiest free proxy
+    and is paced by that proxy's own controller instead of rate_controller;
+    a 401/403 is then blamed on the proxy and retried elsewhere.
+    
+    The timing gets the retries, backoff and rate limiter waits of every
+    attempt, and the request (plus download and bytes unless streaming) of
+    the successful one.
     
+    Raises:
+        requests.HTTPError: If request fails after retries
+        SystemExit: If authentication fails (401/403)
+    """
+    payload = build_page_payload(start_index, search_filters, page_size)
     url = f"{BASE_URL}{ENDPOINT_PATH}"
+    if timing is None:
+        timing = PageTiming()
     
     for attempt in range(MAX_RETRIES):
+        timing.retries = attempt
+        if attempt:
+            _RETRIES.inc()
+        proxy, controller, attempt_proxies = None, rate_controller, proxies
+        with timing.phase("wait"):
+            if isinstance(proxies, ProxyPool):
+                proxy = proxies.acquire()
+                controller, attempt_proxies = proxy.rate_controller, proxy.requests_proxies
+            if controller is not None:
+                controller.acquire()
+        started = time.monotonic()
         try:
-            response = session.post(
-                url,
-                json=payload,
-                timeout=REQUEST_TIMEOUT,
-                proxies=proxies,
-            )
+            try:
+                response = session.post(
+                    url,
+                    json=payload,
+                    timeout=REQUEST_TIMEOUT,
+                    proxies=attempt_proxies,
+                    stream=stream,
+                )
+            except requests.exceptions.RequestException:
+                metrics.REQUESTS.labels("crawler", "error").inc()
+                if proxy is not None:
+                    proxies.release(proxy, None)
+                raise
+            metrics.REQUESTS.labels("crawler", str(response.status_code)).inc()
+            _REQUEST_LATENCY.observe(response.elapsed.total_seconds())
+            if controller is not None:
+                controller.record_response(
+                    response.status_code,
+                    time.monotonic() - started,
+                    response.headers.get("Retry-After"),
+                )
+            if proxy is not None:
+                proxies.release(proxy, response.status_code)
+                if response.status_code in (401, 403):
+                    print(f"    ⚠️  Proxy {proxy.label} rejected (HTTP {response.status_code})")
+                    if attempt < MAX_RETRIES - 1:
+                        response.close()
+                        continue
+                    response.raise_for_status()
             
             # Handle authentication errors immediately
             if response.status_code in (401, 403):
@@ -434,7 +1130,8 @@ def fetch_page(
             if response.status_code == 429:
                 print(f"    ⚠️  Rate limited (429)")
                 if attempt < MAX_RETRIES - 1:
-                    exponential_backoff_sleep(attempt)
+                    response.close()
+                    timing.backoff += exponential_backoff_sleep(attempt, rate_controller=controller)
                     continue
                 else:
                     response.raise_for_status()
@@ -443,26 +1140,37 @@ def fetch_page(
             if response.status_code >= 500:
                 print(f"    ⚠️  Server error ({response.status_code})")
                 if attempt < MAX_RETRIES - 1:
-                    exponential_backoff_sleep(attempt)
+                    response.close()
+                    timing.backoff += exponential_backoff_sleep(attempt, rate_controller=controller)
                     continue
                 else:
                     response.raise_for_status()
             
             # Success
             response.raise_for_status()
-            return response.json()
+            timing.request = response.elapsed.total_seconds()
+            if not stream:
+                # The body was read by session.post
+                timing.download = max(time.monotonic() - started - timing.request, 0.0)
+                timing.bytes_received = len(response.content)
+                _BYTES_RECEIVED.inc(timing.bytes_received)
+            return response
             
         except requests.exceptions.Timeout:
             print(f"    ⚠️  Request timeout")
+            if controller is not None:
+                controller.record_error()
             if attempt < MAX_RETRIES - 1:
-                exponential_backoff_sleep(attempt)
+                timing.backoff += exponential_backoff_sleep(attempt, rate_controller=controller)
             else:
                 raise
                 
         except requests.exceptions.ConnectionError as e:
             print(f"    ⚠️  Connection error: {e}")
+            if controller is not None:
+                controller.record_error()
             if attempt < MAX_RETRIES - 1:
-                exponential_backoff_sleep(attempt)
+                timing.backoff += exponential_backoff_sleep(attempt, rate_controller=controller)
             else:
                 raise
     
@@ -473,95 +1181,887 @@ def fetch_page(
 # MAIN CRAWLER
 # ============================================================================
 
-def crawl_all_ads(
+@dataclass
+class CrawlStats:
+    """Running totals for one crawl."""
+    
+    new_ads: int = 0
+    changed_ads: int = 0
+    unchanged_ads: int = 0
+    pages: int = 0
+    
+    @classmethod
+    def from_run(cls, run: Run) -> "CrawlStats":
+        """Start from the totals already stored on a run being resumed."""
+        return cls(
+            new_ads=run.ads_new or 0,
+            changed_ads=run.ads_changed or 0,
+            unchanged_ads=run.ads_unchanged or 0,
+            pages=run.pages_fetched or 0,
+        )
+    
+    @property
+    def ads_fetched(self) -> int:
+        """All ads processed, whatever their outcome."""
+        return self.new_ads + self.changed_ads + self.unchanged_ads
+    
+    def add_page(self, new_ads: int, changed_ads: int, unchanged_ads: int) -> None:
+        """Account for one persisted page."""
+        self.new_ads += new_ads
+        self.changed_ads += changed_ads
+        self.unchanged_ads += unchanged_ads
+        self.pages += 1
+        _ADS_NEW.inc(new_ads)
+        _ADS_CHANGED.inc(changed_ads)
+        _ADS_UNCHANGED.inc(unchanged_ads)
+
+
+def start_run(
     session_maker: sessionmaker,
-    http_session: requests.Session,
-    proxies: Optional[Dict[str, str]],
-) -> tuple[str, int, int]:
-    """Main crawl loop: paginate through all ads and persist to DB.
+    notes: str = "Full crawl of all APEC job ads",
+    mode: str = "full",
+    search_filters: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Create the Run record for a new crawl.
+    
+    The run gets the next run sequence (Run.seq) in the same statement, so
+    concurrent crawls never share one.
     
     Args:
         session_maker: SQLAlchemy session factory
-        http_session: Requests session with headers
-        proxies: Optional proxy configuration
+        notes: Free-form description stored on the run
+        mode: "full" for a complete sweep, "incremental" otherwise
+        search_filters: Fields layered over REQUEST_TEMPLATE for this run
         
     Returns:
-        Tuple of (run_id, total_ads_fetched, total_pages_fetched)
+        The new run_id
     """
-    # Create run record
     run_id = str(uuid.uuid4())
     now_iso = datetime.now(timezone.utc).isoformat()
     
     with session_maker() as db_session:
         run = Run(
             run_id=run_id,
+            seq=select(func.coalesce(func.max(Run.seq), 0) + 1).scalar_subquery(),
             started_at=now_iso,
             ads_fetched=0,
             pages_fetched=0,
-            notes="Full crawl of all APEC job ads",
+            notes=notes,
+            status="running",
+            mode=mode,
+            page_size=PAGE_SIZE,
+            search_filters_json=json.dumps(search_filters) if search_filters else None,
+            scope=search_scope(search_filters),
         )
         db_session.add(run)
         db_session.commit()
     
-    print(f"🚀 Starting crawl run: {run_id}")
+    return run_id
+
+
+# run_id -> Run.seq (a run's sequence never changes)
+_run_seqs: Dict[str, int] = {}
+
+
+def run_sequence(session_maker: sessionmaker, run_id: str) -> int:
+    """Run.seq of a run, assigning one to runs created before sequences existed.
+    
+    Args:
+        session_maker: SQLAlchemy session factory
+        run_id: Run to look up
+        
+    Returns:
+        The run's sequence number
+    """
+    seq = _run_seqs.get(run_id)
+    if seq is not None:
+        return seq
+    with session_maker() as db_session:
+        db_session.execute(
+            update(Run)
+            .where(Run.run_id == run_id, Run.seq.is_(None))
+            .values(seq=select(func.coalesce(func.max(Run.seq), 0) + 1).scalar_subquery())
+        )
+        seq = db_session.execute(select(Run.seq).where(Run.run_id == run_id)).scalar_one()
+        db_session.commit()
+    _run_seqs[run_id] = seq
+    return seq
+
+
+def retire_removed_ads(session_maker: sessionmaker, run_id: str) -> Optional[int]:
+    """Mark the ads a complete full sweep did not see as removed.
+    
+    Every page stamps its ads with the run's sequence (ads.last_run_seq),
+    so the removed ads are the live ads stamped by an older run of the same
+    scope (see search_scope): one UPDATE over the partial index on live ads.
+    Ads last seen by a run of another scope (a sharded run over all of
+    France, a REQUEST_TEMPLATE since changed) or by no run at all may lie
+    outside what this sweep could see, and are left alone.
+    
+    Only unfiltered full sweeps qualify (incremental, filtered and sharded
+    runs see a subset of the ads, or a scope that shifts over time), and
+    only if the run saw at least REMOVAL_MIN_COVERAGE of the totalCount
+    reported by its first page: ads shift between windows while a sweep
+    paginates, so a few may be missed and are then retired until a later
+    run sees them again (which clears removed_at).
+    
+    Args:
+        session_maker: SQLAlchemy session factory
+        run_id: Run that just completed
+        
+    Returns:
+        Number of ads marked removed, or None if the run is not eligible
+    """
+    with session_maker() as db_session:
+        run = db_session.get(Run, run_id)
+        if (
+            run is None
+            or run.mode != "full"
+            or run.search_filters_json is not None
+            or run.seq is None
+            or run.scope is None
+            or not run.total_available
+        ):
+            return None
+        seen = db_session.execute(
+            select(func.count()).select_from(Ad).where(Ad.last_run_seq >= run.seq)
+        ).scalar_one()
+        if seen < REMOVAL_MIN_COVERAGE * run.total_available:
+            print(f"⚠️  Saw {seen}/{run.total_available} ads, too few to retire removed ads")
+            return None
+        older_same_scope = select(Run.seq).where(Run.scope == run.scope, Run.seq < run.seq)
+        result = db_session.execute(
+            update(Ad)
+            .where(Ad.removed_at.is_(None), Ad.last_run_seq.in_(older_same_scope))
+            .values(removed_at=datetime.now(timezone.utc).isoformat())
+            .execution_options(synchronize_session=False)
+        )
+        run.ads_removed = result.rowcount
+        db_session.commit()
+        return run.ads_removed
+
+
+def record_total_available(session_maker: sessionmaker, run_id: str, total_available: int) -> None:
+    """Store the first page's totalCount so the run's windows can be resumed.
+    
+    Args:
+        session_maker: SQLAlchemy session factory
+        run_id: Run to update
+        total_available: totalCount reported by the API
+    """
+    with session_maker() as db_session:
+        run = db_session.get(Run, run_id)
+        if run and run.total_available is None:
+            run.total_available = total_available
+            db_session.commit()
+
+
+def finish_run(session_maker: sessionmaker, run_id: str, stats: CrawlStats, complete: bool = True) -> None:
+    """Close a Run record with its final statistics.
+    
+    Throughput, request latency percentiles, bytes, retries and sleep time
+    are aggregated from the run's run_pages timings (every page of the run,
+    resumed sessions included); throughput uses the wall clock since
+    started_at.
+    
+    A complete run then retires the ads it did not see (retire_removed_ads).
+    
+    Args:
+        session_maker: SQLAlchemy session factory
+        run_id: Run to update
+        stats: Totals accumulated during the crawl
+        complete: False if pages are still missing (the run stays resumable)
+    """
+    ended = datetime.now(timezone.utc)
+    with session_maker() as db_session:
+        write_commit_times(db_session, run_id)
+        run = db_session.get(Run, run_id)
+        if run:
+            run.ended_at = ended.isoformat()
+            run.ads_fetched = stats.ads_fetched
+            run.pages_fetched = stats.pages
+            run.ads_new = stats.new_ads
+            run.ads_changed = stats.changed_ads
+            run.ads_unchanged = stats.unchanged_ads
+            run.status = "complete" if complete else "incomplete"
+            
+            latencies = db_session.execute(
+                select(RunPage.request_seconds).where(RunPage.run_id == run_id, RunPage.request_seconds > 0)
+            ).scalars().all()
+            bytes_received, retries, backoff_seconds, wait_seconds = db_session.execute(
+                select(
+                    func.coalesce(func.sum(RunPage.bytes_received), 0),
+                    func.coalesce(func.sum(RunPage.retries), 0),
+                    func.coalesce(func.sum(RunPage.backoff_seconds), 0.0),
+                    func.coalesce(func.sum(RunPage.wait_seconds), 0.0),
+                ).where(RunPage.run_id == run_id)
+            ).one()
+            run.duration_seconds = (ended - datetime.fromisoformat(run.started_at)).total_seconds()
+            run.ads_per_second = stats.ads_fetched / max(run.duration_seconds, 1e-9)
+            run.pages_per_second = stats.pages / max(run.duration_seconds, 1e-9)
+            run.latency_p50 = percentile(latencies, 0.50)
+            run.latency_p95 = percentile(latencies, 0.95)
+            run.latency_p99 = percentile(latencies, 0.99)
+            run.bytes_received = bytes_received
+            run.retries = retries
+            run.backoff_seconds = backoff_seconds
+            run.sleep_seconds = backoff_seconds + wait_seconds
+            db_session.commit()
+    
+    if complete:
+        removed = retire_removed_ads(session_maker, run_id)
+        if removed is not None:
+            print(f"🗑️  Marked {removed} ads as removed")
+
+
+def find_resumable_run(session_maker: sessionmaker, run_id: Optional[str] = None) -> Optional[Run]:
+    """Find the run to resume.
+    
+    Args:
+        session_maker: SQLAlchemy session factory
+        run_id: Explicit run to resume (returned whatever its status and
+            mode; crawl_all_ads rejects it if it cannot be resumed), or None
+            for the latest unfinished full run
+        
+    Returns:
+        The Run record, or None if there is nothing to resume
+    """
+    with session_maker() as db_session:
+        if run_id:
+            return db_session.get(Run, run_id)
+        return db_session.execute(
+            select(Run)
+            .where(Run.status.in_(("running", "incomplete")), Run.mode == "full")
+            .order_by(Run.started_at.desc())
+            .limit(1)
+        ).scalar_one_or_none()
+
+
+def pending_windows(session_maker: sessionmaker, run: Run) -> List[int]:
+    """List the startIndex windows of a run that were never committed.
+    
+    Args:
+        session_maker: SQLAlchemy session factory
+        run: Run being resumed (total_available must be known)
+        
+    Returns:
+        startIndex values still to fetch, in order
+    """
+    page_size = run.page_size or PAGE_SIZE
+    with session_maker() as db_session:
+        done = set(
+            db_session.execute(
+                select(RunPage.start_index).where(
+                    RunPage.run_id == run.run_id, RunPage.status == "done"
+                )
+            ).scalars()
+        )
+    return [index for index in range(0, run.total_available, page_size) if index not in done]
+
+
+# Commit durations of checkpointed pages not yet stored in run_pages
+_commit_times = CommitTimes()
+
+
+def write_commit_times(db_session: Session, run_id: str) -> None:
+    """Store the pending commit durations of a run's previous checkpoints.
+    
+    A page's commit time is only known after its transaction, so it is
+    written by the run's next one instead of costing a commit of its own.
+    
+    Args:
+        db_session: Session whose transaction will carry the update
+        run_id: Run whose pending commit times are written
+    """
+    pending = _commit_times.take(run_id)
+    if not pending:
+        return
+    table = RunPage.__table__
+    db_session.execute(
+        update(table)
+        .where(table.c.run_id == bindparam("page_run_id"), table.c.start_index == bindparam("page_start_index"))
+        .values(commit_seconds=bindparam("page_commit_seconds")),
+        [
+            {"page_commit_seconds": seconds, "page_run_id": page_run_id, "page_start_index": start_index}
+            for seconds, page_run_id, start_index in pending
+        ],
+    )
+
+
+def run_phase_totals(session_maker: sessionmaker, run_id: str) -> Dict[str, float]:
+    """Seconds spent in each phase by a run's pages (summed over pages).
+    
+    With concurrent fetches the request phases of several pages overlap,
+    so totals can exceed the run's wall clock.
+    
+    Args:
+        session_maker: SQLAlchemy session factory
+        run_id: Run to summarize
+        
+    Returns:
+        Seconds by phase, plus "backoff" and "wait"
+    """
+    columns = [f"{name}_seconds" for name in (*PHASES, "backoff", "wait")]
+    with session_maker() as db_session:
+        totals = db_session.execute(
+            select(*(func.coalesce(func.sum(RunPage.__table__.c[column]), 0.0) for column in columns))
+            .where(RunPage.run_id == run_id)
+        ).one()
+    return {column.removesuffix("_seconds"): total for column, total in zip(columns, totals)}
+
+
+def format_page_counts(new_ads: int, changed_ads: int, unchanged_ads: int) -> str:
+    """Format one page's upsert outcome for progress output."""
+    return f"→ {new_ads} new, {changed_ads} changed, {unchanged_ads} unchanged"
+
+
+def save_page(
+    session_maker: sessionmaker,
+    offers: List[Dict[str, Any]],
+    run_id: Optional[str] = None,
+    start_index: Optional[int] = None,
+    hashed: Optional[List[tuple[int, Dict[str, Any], str]]] = None,
+    timing: Optional[PageTiming] = None,
+    run_seq: Optional[int] = None,
+) -> tuple[int, int, int]:
+    """Bulk-upsert one page of offers in a single transaction.
+    
+    When run_id is given, the page checkpoint is committed in the same
+    transaction as the ads, so a resumed run never skips unsaved pages.
+    The checkpoint also stores the page's timings. The ads are stamped with
+    the run's sequence (run_seq, looked up from run_id if omitted).
+    
+    Args:
+        session_maker: SQLAlchemy session factory
+        offers: Raw offer dictionaries from one API page
+        run_id: Run the page belongs to (enables checkpointing)
+        start_index: startIndex of the page
+        hashed: Precomputed hash_offers(offers), computed if omitted
+        timing: Timing of the page so far (transform to commit added here)
+        run_seq: Run.seq stamped on the ads (for runs without checkpoints)
+        
+    Returns:
+        Tuple of (new_ads, changed_ads, unchanged_ads) for the page
+    """
+    now_iso = datetime.now(timezone.utc).isoformat()
+    if timing is None:
+        timing = PageTiming()
+    if run_seq is None and run_id is not None:
+        run_seq = run_sequence(session_maker, run_id)
+    
+    with session_maker() as db_session:
+        counts = upsert_ads_bulk(db_session, offers, now_iso, hashed, timing, run_seq)
+        if run_id is not None:
+            with timing.phase("write"):
+                write_commit_times(db_session, run_id)
+                db_session.merge(
+                    RunPage(
+                        run_id=run_id,
+                        start_index=start_index,
+                        status="done",
+                        ads_count=len(offers),
+                        error=None,
+                        updated_at=now_iso,
+                        **timing.columns(),
+                    )
+                )
+        with timing.phase("commit"):
+            db_session.commit()
+    
+    metrics.COMMIT_LATENCY.observe(timing.commit)
+    if run_id is not None:
+        _commit_times.add(run_id, start_index, timing.commit)
+    return counts
+
+
+def archive_page(
+    archive: Optional[PageArchive],
+    run_id: Optional[str],
+    start_index: int,
+    page: Dict[str, Any],
+    body: Optional[bytes] = None,
+) -> None:
+    """Append a decoded, non-empty page to the raw page archive (if any).
+    
+    Args:
+        archive: Raw page archive (None = nothing to do)
+        run_id: Index key of the page: its run, or a shard of it (see
+            extraction/archive.py shard_run_key)
+        start_index: startIndex of the page
+        page: Decoded response body
+        body: Raw response body, archived as received instead of
+            re-serializing page
+    """
+    offers = page.get("resultats", [])
+    if archive is None or run_id is None or not offers:
+        return
+    ad_ids = [_parse_offer_id(offer) for offer in offers]
+    if body is None:
+        archive.append_page(run_id, start_index, page, ad_ids)
+        return
+    record = archive.record(run_id, start_index)
+    record.write(body)
+    archive.append(record, ad_ids)
+
+
+def save_page_stream(
+    session_maker: sessionmaker,
+    page: PageStream,
+    run_id: Optional[str] = None,
+    start_index: Optional[int] = None,
+    batch_size: int = STREAM_BATCH_SIZE,
+    archive: Optional[PageArchive] = None,
+    timing: Optional[PageTiming] = None,
+) -> tuple[tuple[int, int, int], int]:
+    """Upsert offers in small batches while the page body is being read.
+    
+    Like save_page, everything (checkpoint included) is committed in one
+    transaction once the body is complete, but at most batch_size decoded
+    offers are held in memory. An empty page is not checkpointed.
+    
+    With an archive (and a run_id) the raw body is compressed into an
+    archive record as it is read and appended once the page is committed.
+    
+    Args:
+        session_maker: SQLAlchemy session factory
+        page: Page stream returned by fetch_page_stream
+        run_id: Run the page belongs to (enables checkpointing)
+        start_index: startIndex of the page
+        batch_size: Offers per upsert batch
+        archive: Optional raw page archive
+        timing: Timing of the page so far (download to commit added here;
+            decoding is interleaved with the download and counted in it)
+        
+    Returns:
+        Tuple of ((new_ads, changed_ads, unchanged_ads), offers_read)
+    """
+    now_iso = datetime.now(timezone.utc).isoformat()
+    if timing is None:
+        timing = PageTiming()
+    run_seq = run_sequence(session_maker, run_id) if run_id is not None else None
+    new_ads = changed_ads = unchanged_ads = 0
+    offers_read = 0
+    record = None
+    ad_ids: List[Optional[int]] = []
+    if archive is not None and run_id is not None:
+        record = archive.record(run_id, start_index)
+        page.tee(record.write)
+    
+    with session_maker() as db_session:
+        offers = page.offers()
+        while True:
+            batch = list(islice(offers, batch_size))
+            if not batch:
+                break
+            offers_read += len(batch)
+            ad_ids.extend(_parse_offer_id(offer) for offer in batch)
+            batch_new, batch_changed, batch_unchanged = upsert_ads_bulk(
+                db_session, batch, now_iso, timing=timing, run_seq=run_seq
+            )
+            new_ads += batch_new
+            changed_ads += batch_changed
+            unchanged_ads += batch_unchanged
+        timing.bytes_received = page.bytes_read
+        _BYTES_RECEIVED.inc(page.bytes_read)
+        timing.download = max(page.body_seconds - timing.transform - timing.write, 0.0)
+        if not offers_read:
+            return (0, 0, 0), 0
+        if run_id is not None:
+            with timing.phase("write"):
+                write_commit_times(db_session, run_id)
+                db_session.merge(
+                    RunPage(
+                        run_id=run_id,
+                        start_index=start_index,
+                        status="done",
+                        ads_count=offers_read,
+                        error=None,
+                        updated_at=now_iso,
+                        **timing.columns(),
+                    )
+                )
+        with timing.phase("commit"):
+            db_session.commit()
+    
+    metrics.COMMIT_LATENCY.observe(timing.commit)
+    if run_id is not None:
+        _commit_times.add(run_id, start_index, timing.commit)
+    if record is not None:
+        archive.append(record, ad_ids)
+    return (new_ads, changed_ads, unchanged_ads), offers_read
+
+
+def mark_page_failed(
+    session_maker: sessionmaker,
+    run_id: str,
+    start_index: int,
+    error: Exception,
+    timing: Optional[PageTiming] = None,
+) -> None:
+    """Checkpoint a page that could not be fetched, for a later retry.
+    
+    Args:
+        session_maker: SQLAlchemy session factory
+        run_id: Run the page belongs to
+        start_index: startIndex of the page
+        error: Last error raised for the page
+        timing: Timing of the failed attempts (retries, backoff, waits)
+    """
+    with session_maker() as db_session:
+        db_session.merge(
+            RunPage(
+                run_id=run_id,
+                start_index=start_index,
+                status="failed",
+                ads_count=0,
+                error=str(error),
+                updated_at=datetime.now(timezone.utc).isoformat(),
+                **(timing or PageTiming()).columns(),
+            )
+        )
+        db_session.commit()
+
+
+def crawl_windows_concurrently(
+    session_maker: sessionmaker,
+    http_session: requests.Session,
+    proxies: Optional[Dict[str, str] | ProxyPool],
+    start_indexes: List[int],
+    concurrency: int,
+    rate_controller: AdaptiveRateController,
+    stats: CrawlStats,
+    run_id: Optional[str] = None,
+    search_filters: Optional[Dict[str, Any]] = None,
+    stream_timings: Optional[StreamTimings] = None,
+    archive: Optional[PageArchive] = None,
+) -> List[int]:
+    """Fetch the given pagination windows with a bounded worker pool.
+    
+    Workers only perform HTTP requests; every page is persisted from the
+    calling thread so SQLite keeps a single writer. A shared adaptive rate
+    controller paces requests across all workers. Pages that fail after
+    MAX_RETRIES are checkpointed as failed and returned instead of aborting.
+    
+    Args:
+        session_maker: SQLAlchemy session factory
+        http_session: Requests session whose headers are copied per worker
+        proxies: Optional proxy configuration
+        start_indexes: startIndex values still to fetch
+        concurrency: Maximum number of requests in flight
+        rate_controller: Controller shared by all workers
+        stats: Crawl totals, updated in place
+        run_id: Run the pages belong to (enables checkpointing)
+        search_filters: Optional fields overriding REQUEST_TEMPLATE
+        stream_timings: Streaming mode when set: workers return once the
+            headers arrived and bodies are decoded incrementally while saving
+        archive: Optional raw page archive, appended to from the calling thread
+        
+    Returns:
+        startIndex values that failed, in order
+    """
+    thread_state = threading.local()
+    
+    def worker(start_index: int, timing: PageTiming) -> Dict[str, Any]:
+        # requests.Session is not thread-safe: give each worker its own
+        session = getattr(thread_state, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(http_session.headers)
+            thread_state.session = session
+        if stream_timings is not None:
+            return fetch_page_stream(session, start_index, proxies, search_filters, rate_controller, timing)
+        return fetch_page(session, start_index, proxies, search_filters, rate_controller=rate_controller, timing=timing)
+    
+    pending_indexes = iter(start_indexes)
+    in_flight: Dict[Future, int] = {}
+    timings: Dict[int, PageTiming] = {}
+    failed_indexes: List[int] = []
+    stop = False
+    
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="crawl")
+    try:
+        while True:
+            # Keep the pool saturated without queueing every window up front
+            while not stop and len(in_flight) < concurrency * 2:
+                start_index = next(pending_indexes, None)
+                if start_index is None:
+                    break
+                timings[start_index] = PageTiming()
+                in_flight[executor.submit(worker, start_index, timings[start_index])] = start_index
+            
+            if not in_flight:
+                break
+            
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                start_index = in_flight.pop(future)
+                timing = timings.pop(start_index)
+                try:
+                    response = future.result()
+                    if stream_timings is not None:
+                        counts, ads_count = save_page_stream(
+                            session_maker, response, run_id, start_index, archive=archive, timing=timing
+                        )
+                        stream_timings.add(response)
+                    else:
+                        offers = response.get("resultats", [])
+                        ads_count = len(offers)
+                        if offers:
+                            counts = save_page(session_maker, offers, run_id, start_index, timing=timing)
+                            archive_page(archive, run_id, start_index, response)
+                except (requests.HTTPError, requests.RequestException) as e:
+                    print(f"\n❌ Request failed (index {start_index}), deferred: {e}")
+                    failed_indexes.append(start_index)
+                    if run_id is not None:
+                        mark_page_failed(session_maker, run_id, start_index, e, timing)
+                    continue
+                
+                if not ads_count:
+                    print(f"📄 Index {start_index}: no results (end of pagination)")
+                    stop = True
+                    continue
+                
+                stats.add_page(*counts)
+                
+                print(f"📄 Index {start_index}: fetched {ads_count} offers {format_page_counts(*counts)}")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    
+    return sorted(failed_indexes)
+
+
+def retry_deferred_pages(
+    session_maker: sessionmaker,
+    http_session: requests.Session,
+    proxies: Optional[Dict[str, str] | ProxyPool],
+    failed_indexes: List[int],
+    concurrency: int,
+    rate_controller: AdaptiveRateController,
+    stats: CrawlStats,
+    run_id: str,
+    search_filters: Optional[Dict[str, Any]] = None,
+    stream_timings: Optional[StreamTimings] = None,
+    archive: Optional[PageArchive] = None,
+) -> List[int]:
+    """Retry deferred pages for up to DEFERRED_RETRY_ROUNDS passes.
+    
+    Returns:
+        startIndex values still failing afterwards
+    """
+    for retry_round in range(1, DEFERRED_RETRY_ROUNDS + 1):
+        if not failed_indexes:
+            break
+        print(f"\n🔁 Retrying {len(failed_indexes)} deferred pages (round {retry_round}/{DEFERRED_RETRY_ROUNDS})")
+        failed_indexes = crawl_windows_concurrently(
+            session_maker,
+            http_session,
+            proxies,
+            failed_indexes,
+            concurrency,
+            rate_controller,
+            stats,
+            run_id,
+            search_filters,
+            stream_timings,
+            archive,
+        )
+    if failed_indexes:
+        print(f"\n⚠️  {len(failed_indexes)} pages still failing; resume later with --resume {run_id}")
+    return failed_indexes
+
+
+def crawl_all_ads(
+    session_maker: sessionmaker,
+    http_session: requests.Session,
+    proxies: Optional[Dict[str, str] | ProxyPool],
+    concurrency: int = CONCURRENCY,
+    max_rps: Optional[float] = MAX_REQUESTS_PER_SECOND,
+    known_page_streak: Optional[int] = None,
+    published_within: Optional[str] = None,
+    resume_run_id: Optional[str] = None,
+    stream: bool = False,
+    archive: Optional[PageArchive] = None,
+) -> tuple[str, int, int]:
+    """Main crawl loop: paginate through all ads and persist to DB.
+    
+    The first page is always fetched sequentially to learn totalCount. With
+    concurrency > 1 the remaining startIndex windows are then spread across
+    a bounded worker pool instead of being fetched one by one.
+    
+    In incremental mode (known_page_streak set) pages are walked sequentially
+    and the crawl stops once that many consecutive pages held no new ad.
+    
+    Every committed page is checkpointed in run_pages. Pages that fail after
+    MAX_RETRIES go to a deferred queue retried at the end of the run; a run
+    left incomplete can be continued with resume_run_id.
+    
+    In streaming mode page bodies are decoded incrementally and upserted in
+    STREAM_BATCH_SIZE batches, so peak memory no longer grows with PAGE_SIZE.
+    
+    With an archive every non-empty page is also appended, as fetched, to
+    the raw page archive (see extraction/archive.py).
+    
+    Args:
+        session_maker: SQLAlchemy session factory
+        http_session: Requests session with headers
+        proxies: Optional proxy configuration or ProxyPool
+        concurrency: Parallel page fetches once totalCount is known
+        max_rps: Upper bound of the adaptive request rate (None = no cap)
+        known_page_streak: Stop after this many all-known pages (incremental mode)
+        published_within: Optional anciennetePublication window ("24h" or "7d")
+        resume_run_id: Continue this run instead of starting a new one
+        stream: Decode page bodies incrementally (time-to-first-byte vs body
+            time is reported at the end)
+        archive: Optional raw page archive
+        
+    Returns:
+        Tuple of (run_id, total_ads_fetched, total_pages_fetched)
+    """
+    stream_timings = StreamTimings() if stream else None
+    search_filters = None
+    if published_within:
+        search_filters = {"anciennetePublication": ANCIENNETE_PUBLICATION[published_within]}
+    
+    resumed_run = None
+    if resume_run_id:
+        resumed_run = find_resumable_run(session_maker, resume_run_id)
+        if resumed_run is None:
+            raise ValueError(f"Unknown run: {resume_run_id}")
+        if resumed_run.status not in ("running", "incomplete"):
+            raise ValueError(f"Run {resume_run_id} is {resumed_run.status}, only unfinished runs can be resumed")
+        if resumed_run.mode != "full":
+            raise ValueError(
+                f"Run {resume_run_id} has mode {resumed_run.mode}, only full sweeps have checkpoints to resume"
+            )
+        if resumed_run.page_size and resumed_run.page_size != PAGE_SIZE:
+            raise ValueError(
+                f"Run {resume_run_id} used page size {resumed_run.page_size}, not {PAGE_SIZE}"
+            )
+        run_id = resumed_run.run_id
+        known_page_streak = None
+        search_filters = json.loads(resumed_run.search_filters_json or "null")
+        with session_maker() as db_session:
+            db_session.get(Run, run_id).status = "running"
+            db_session.commit()
+    elif known_page_streak:
+        concurrency = 1  # the stop condition depends on page order
+        notes = f"Incremental crawl (stop after {known_page_streak} known pages)"
+        if published_within:
+            notes += f", published within {published_within}"
+        run_id = start_run(session_maker, notes=notes, mode="incremental", search_filters=search_filters)
+    else:
+        run_id = start_run(session_maker, search_filters=search_filters)
+    
+    print(f"{'♻️  Resuming' if resumed_run else '🚀 Starting'} crawl run: {run_id}")
     print(f"📊 Page size: {PAGE_SIZE}")
-    print(f"⏱️  Request delay: {REQUEST_DELAY_SECONDS}s")
+    if known_page_streak:
+        print(f"🔁 Incremental: stop after {known_page_streak} consecutive known pages")
+    if published_within:
+        print(f"🗓️  Published within: {published_within}")
+    if concurrency > 1:
+        print(f"🧵 Concurrency: {concurrency}")
+    print(f"⏱️  Adaptive rate: starts at {1 / REQUEST_DELAY_SECONDS:.2f} req/s, max {max_rps or 'unlimited'}")
     print(f"🔄 Max retries: {MAX_RETRIES}")
     if proxies:
-        print(f"🌐 Using proxy: {proxies.get('https', proxies.get('http'))}")
+        print(f"🌐 Using proxy: {describe_proxies(proxies)}")
     print()
     
+    rate_controller = make_rate_controller(max_rps)
+    
+    # Resumed runs with a known totalCount only need their missing windows
+    if resumed_run is not None and resumed_run.total_available is not None:
+        stats = CrawlStats.from_run(resumed_run)
+        windows = pending_windows(session_maker, resumed_run)
+        print(f"📌 {len(windows)} pages left of {resumed_run.total_available} ads")
+        failed_indexes = crawl_windows_concurrently(
+            session_maker,
+            http_session,
+            proxies,
+            windows,
+            concurrency,
+            rate_controller,
+            stats,
+            run_id,
+            search_filters,
+            stream_timings,
+            archive,
+        )
+        failed_indexes = retry_deferred_pages(
+            session_maker, http_session, proxies, failed_indexes,
+            concurrency, rate_controller, stats, run_id, search_filters, stream_timings, archive,
+        )
+        print_rate_summary(rate_controller, proxies)
+        if stream_timings is not None:
+            print(f"📶 Streaming: {stream_timings.summary()}")
+        finish_run(session_maker, run_id, stats, complete=not failed_indexes)
+        return run_id, stats.ads_fetched, stats.pages
+    
     start_index = 0
-    total_ads_saved = 0
-    total_pages = 0
-    new_ads_count = 0
-    updated_ads_count = 0
+    stats = CrawlStats.from_run(resumed_run) if resumed_run else CrawlStats()
+    known_streak = 0
+    total_available = None
+    failed_indexes: List[int] = []
+    aborted = False
     
     while True:
         # Check max pages limit
-        if MAX_PAGES and total_pages >= MAX_PAGES:
+        if MAX_PAGES and stats.pages >= MAX_PAGES:
             print(f"\n⚠️  Reached MAX_PAGES limit ({MAX_PAGES})")
             break
         
-        print(f"📄 Page {total_pages + 1} (index {start_index})...", end=" ", flush=True)
+        print(f"📄 Page {stats.pages + 1} (index {start_index})...", end=" ", flush=True)
         
+        timing = PageTiming()
         try:
-            response = fetch_page(http_session, start_index, proxies)
+            if stream_timings is not None:
+                page = fetch_page_stream(http_session, start_index, proxies, search_filters, rate_controller, timing)
+                counts, ads_count = save_page_stream(
+                    session_maker, page, run_id, start_index, archive=archive, timing=timing
+                )
+                stream_timings.add(page)
+                response = page.fields
+            else:
+                response = fetch_page(
+                    http_session, start_index, proxies, search_filters, rate_controller=rate_controller, timing=timing
+                )
         except (requests.HTTPError, requests.RequestException) as e:
             print(f"\n❌ Request failed: {e}")
-            break
-        
-        # Extract offers from response
-        offers = response.get("resultats", [])
-        total_available = response.get("totalCount", 0)
-        
-        if not offers:
-            print("no results (end of pagination)")
-            break
-        
-        print(f"fetched {len(offers)} offers", end=" ", flush=True)
-        
-        # Process offers in a transaction
-        now_iso = datetime.now(timezone.utc).isoformat()
-        page_new = 0
-        page_updated = 0
-        
-        with session_maker() as db_session:
-            for offer in offers:
-                is_new = upsert_ad(db_session, offer, now_iso)
-                if is_new:
-                    page_new += 1
-                else:
-                    page_updated += 1
+            if total_available is None:
+                aborted = True  # without totalCount there is nothing to paginate
+                break
+            # Defer the page and keep going
+            failed_indexes.append(start_index)
+            mark_page_failed(session_maker, run_id, start_index, e, timing)
+        else:
+            # Extract offers from response (already stored in streaming mode)
+            offers = response.get("resultats", [])
+            if stream_timings is None:
+                ads_count = len(offers)
+            if total_available is None:
+                record_total_available(session_maker, run_id, response.get("totalCount", 0))
+            total_available = response.get("totalCount", 0)
             
-            db_session.commit()
-        
-        new_ads_count += page_new
-        updated_ads_count += page_updated
-        total_ads_saved += page_new  # Only count new ads
-        total_pages += 1
-        
-        print(f"→ {page_new} new, {page_updated} updated (total: {total_ads_saved} new)")
+            if not ads_count:
+                print("no results (end of pagination)")
+                break
+            
+            print(f"fetched {ads_count} offers", end=" ", flush=True)
+            
+            # Process offers and checkpoint the page in one transaction
+            if stream_timings is None:
+                counts = save_page(session_maker, offers, run_id, start_index, timing=timing)
+                archive_page(archive, run_id, start_index, response)
+            stats.add_page(*counts)
+            
+            timing_note = f", ttfb {page.ttfb * 1000:.0f}ms, body {page.body_seconds * 1000:.0f}ms" if stream else ""
+            print(f"{format_page_counts(*counts)} (total: {stats.new_ads} new{timing_note})")
+            
+            # Incremental mode: a page without new ads extends the known streak
+            if known_page_streak:
+                known_streak = known_streak + 1 if counts[0] == 0 else 0
+                if known_streak >= known_page_streak:
+                    print(f"\n✅ {known_streak} consecutive pages already known, stopping incremental crawl")
+                    break
         
         # Check if we've reached the end
         next_index = start_index + PAGE_SIZE
@@ -571,28 +2071,173 @@ def crawl_all_ads(
         
         start_index = next_index
         
-        # Polite delay between requests
-        time.sleep(REQUEST_DELAY_SECONDS)
+        # totalCount is known now: hand the remaining windows to the pool
+        if concurrency > 1:
+            remaining = list(range(start_index, total_available, PAGE_SIZE))
+            if MAX_PAGES:
+                remaining = remaining[:max(MAX_PAGES - stats.pages, 0)]
+            failed_indexes += crawl_windows_concurrently(
+                session_maker,
+                http_session,
+                proxies,
+                remaining,
+                concurrency,
+                rate_controller,
+                stats,
+                run_id,
+                search_filters,
+                stream_timings,
+                archive,
+            )
+            print(f"\n✅ Concurrent crawl finished (total available: {total_available})")
+            break
     
-    # Update run record
-    end_iso = datetime.now(timezone.utc).isoformat()
-    with session_maker() as db_session:
-        run = db_session.get(Run, run_id)
-        if run:
-            run.ended_at = end_iso
-            run.ads_fetched = new_ads_count + updated_ads_count
-            run.pages_fetched = total_pages
-            db_session.commit()
+    failed_indexes = retry_deferred_pages(
+        session_maker,
+        http_session,
+        proxies,
+        failed_indexes,
+        concurrency,
+        rate_controller,
+        stats,
+        run_id,
+        search_filters,
+        stream_timings,
+        archive,
+    )
+    print_rate_summary(rate_controller, proxies)
+    if stream_timings is not None:
+        print(f"📶 Streaming: {stream_timings.summary()}")
+    finish_run(session_maker, run_id, stats, complete=not (failed_indexes or aborted))
     
-    return run_id, new_ads_count + updated_ads_count, total_pages
+    return run_id, stats.ads_fetched, stats.pages
 
 
 # ============================================================================
 # MAIN ENTRY POINT
 # ============================================================================
 
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line options for the crawler.
+    
+    Args:
+        argv: Optional argument list (defaults to sys.argv)
+        
+    Returns:
+        Parsed arguments namespace
+    """
+    parser = argparse.ArgumentParser(description="Crawl all APEC job ads into SQLite.")
+    parser.add_argument(
+        "--engine",
+        choices=["requests", "asyncio", "pipeline"],
+        default="requests",
+        help="Crawl engine: blocking requests (default), asyncio/aiohttp or a fetch/write pipeline",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=CONCURRENCY,
+        help=f"Parallel page fetches after the first page (default: {CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=16,
+        help="Pipeline engine: capacity of each inter-stage queue (default: 16)",
+    )
+    parser.add_argument(
+        "--shard",
+        action="store_true",
+        help="Split a full-France search into filter shards and crawl them in parallel",
+    )
+    parser.add_argument(
+        "--max-shard-size",
+        type=int,
+        default=5_000,
+        help="Sharded crawl: split shards larger than this many ads (default: 5000)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Stop once consecutive pages contain only already-known ads",
+    )
+    parser.add_argument(
+        "--known-streak",
+        type=int,
+        default=INCREMENTAL_KNOWN_PAGE_STREAK,
+        help=f"Known pages in a row that end an incremental crawl (default: {INCREMENTAL_KNOWN_PAGE_STREAK})",
+    )
+    parser.add_argument(
+        "--published-within",
+        choices=sorted(ANCIENNETE_PUBLICATION),
+        default=None,
+        help="Only request ads published within this window (anciennetePublication filter)",
+    )
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="latest",
+        default=None,
+        metavar="RUN_ID",
+        help="Continue an unfinished run (default: the latest one)",
+    )
+    parser.add_argument(
+        "--max-rps",
+        type=float,
+        default=MAX_REQUESTS_PER_SECOND,
+        help="Upper bound of the adaptive request rate, per proxy with a proxy pool (0 = no cap)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Decode page bodies incrementally to cap peak memory (reports TTFB vs body time)",
+    )
+    parser.add_argument(
+        "--archive-dir",
+        default=ARCHIVE_DIR,
+        help=f"Raw page archive directory (default: {ARCHIVE_DIR})",
+    )
+    parser.add_argument(
+        "--no-archive",
+        action="store_true",
+        help="Do not append fetched pages to the raw page archive",
+    )
+    parser.add_argument(
+        "--sqlite-profile",
+        choices=["auto", *SQLITE_PROFILES],
+        default="auto",
+        help="SQLite connection profile while crawling (default: auto = bulk for full sweeps, "
+             "the default profile for --incremental)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=METRICS_PORT,
+        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics while crawling",
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        default=METRICS_TEXTFILE,
+        metavar="PATH",
+        help="Keep Prometheus metrics in PATH for node_exporter's textfile collector",
+    )
+    args = parser.parse_args(argv)
+    if args.incremental and args.engine != "requests":
+        parser.error("--incremental walks pages in order and needs --engine requests")
+    if args.resume and args.incremental:
+        parser.error("--resume continues full crawls and cannot be combined with --incremental")
+    if args.resume and args.engine != "requests":
+        parser.error("--resume needs --engine requests")
+    if args.shard and (args.engine != "requests" or args.incremental or args.resume):
+        parser.error("--shard needs --engine requests and excludes --incremental and --resume")
+    if args.stream and (args.engine != "requests" or args.shard):
+        parser.error("--stream needs --engine requests and excludes --shard")
+    return args
+
+
 def main():
     """Main execution: crawl all APEC ads and persist to SQLite."""
+    args = parse_args()
     load_dotenv()  # Load environment variables from .env file if present
     
     print("=" * 70)
@@ -608,27 +2253,105 @@ def main():
     http_session = requests.Session()
     http_session.headers.update(HEADERS)
     
-    # Get proxy configuration
-    proxies = get_proxy_config()
+    # Get proxy configuration: a pool from APEC_PROXY_LIST/APEC_PROXY_FILE, else one proxy
+    proxies = load_proxy_pool(
+        initial_rate=1.0 / REQUEST_DELAY_SECONDS,
+        max_rate=args.max_rps or None,
+    ) or get_proxy_config()
+    
+    # Resolve the run to resume, if any
+    resume_run_id = None
+    if args.resume:
+        run = find_resumable_run(session_maker, None if args.resume == "latest" else args.resume)
+        if run is None:
+            print("ℹ️  No unfinished run to resume")
+            return
+        resume_run_id = run.run_id
+    
+    # Raw page archive (every engine)
+    archive = None
+    if not args.no_archive:
+        archive = PageArchive(args.archive_dir)
+        print(f"🗄️  Page archive: {args.archive_dir}")
     
     # Record start time
     start_time = time.time()
     
+    # Sweeps write every page: switch to the bulk-load profile while crawling
+    sqlite_profile = args.sqlite_profile
+    if sqlite_profile == "auto":
+        sqlite_profile = DEFAULT_SQLITE_PROFILE if args.incremental else "bulk"
+    print(f"🗃️  SQLite profile: {sqlite_profile}")
+    
+    # Optional Prometheus exposition
+    exposition = None
+    if args.metrics_port is not None or args.metrics_textfile:
+        exposition = metrics.start_exposition(args.metrics_port, args.metrics_textfile)
+        print(f"📈 Metrics: {exposition.describe()}")
+    
     # Run crawler
-    try:
-        run_id, ads_fetched, pages_fetched = crawl_all_ads(
-            session_maker,
-            http_session,
-            proxies,
-        )
-    except KeyboardInterrupt:
-        print("\n\n⚠️  Interrupted by user")
-        sys.exit(1)
-    except Exception as e:
-        print(f"\n\n❌ Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
-        sys.exit(1)
+    with use_sqlite_profile(session_maker.kw["bind"], sqlite_profile):
+        try:
+            if args.engine == "asyncio":
+                from .async_crawl import crawl_all_ads_async
+                
+                run_id, ads_fetched, pages_fetched = crawl_all_ads_async(
+                    session_maker,
+                    proxies,
+                    concurrency=max(args.concurrency, 1),
+                    max_rps=args.max_rps or None,
+                    archive=archive,
+                )
+            elif args.shard:
+                from .sharding import crawl_sharded
+                
+                run_id, ads_fetched, pages_fetched = crawl_sharded(
+                    session_maker,
+                    http_session,
+                    proxies,
+                    concurrency=max(args.concurrency, 1),
+                    max_rps=args.max_rps or None,
+                    max_shard_size=max(args.max_shard_size, PAGE_SIZE),
+                    archive=archive,
+                )
+            elif args.engine == "pipeline":
+                from .pipeline import crawl_all_ads_pipeline
+                
+                run_id, ads_fetched, pages_fetched = crawl_all_ads_pipeline(
+                    session_maker,
+                    http_session,
+                    proxies,
+                    fetchers=max(args.concurrency, 1),
+                    max_rps=args.max_rps or None,
+                    queue_size=max(args.queue_size, 1),
+                    archive=archive,
+                )
+            else:
+                run_id, ads_fetched, pages_fetched = crawl_all_ads(
+                    session_maker,
+                    http_session,
+                    proxies,
+                    concurrency=max(args.concurrency, 1),
+                    max_rps=args.max_rps or None,
+                    known_page_streak=max(args.known_streak, 1) if args.incremental else None,
+                    published_within=args.published_within,
+                    resume_run_id=resume_run_id,
+                    stream=args.stream,
+                    archive=archive,
+                )
+        except KeyboardInterrupt:
+            print("\n\n⚠️  Interrupted by user")
+            sys.exit(1)
+        except Exception as e:
+            print(f"\n\n❌ Unexpected error: {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
+        finally:
+            if archive is not None:
+                archive.close()
+            if exposition is not None:
+                exposition.close()
     
     # Calculate duration
     duration_seconds = time.time() - start_time
@@ -639,6 +2362,7 @@ def main():
         total_unique_ads = db_session.execute(
             select(func.count(Ad.id))
         ).scalar()
+        run = db_session.get(Run, run_id)
     
     # Print summary
     print()
@@ -647,9 +2371,22 @@ def main():
     print("=" * 70)
     print(f"Run ID:           {run_id}")
     print(f"Ads fetched:      {ads_fetched:,}")
+    if run:
+        print(f"  New:            {run.ads_new or 0:,}")
+        print(f"  Changed:        {run.ads_changed or 0:,}")
+        print(f"  Unchanged:      {run.ads_unchanged or 0:,}")
     print(f"Pages fetched:    {pages_fetched:,}")
     print(f"Unique ads in DB: {total_unique_ads:,}")
     print(f"Duration:         {duration_minutes:.2f} minutes ({duration_seconds:.1f}s)")
+    if run and run.latency_p50 is not None:
+        print(f"Throughput:       {run.ads_per_second:,.1f} ads/s, {run.pages_per_second:.2f} pages/s")
+        print(f"Latency:          p50 {run.latency_p50 * 1000:.0f}ms, p95 {run.latency_p95 * 1000:.0f}ms, "
+              f"p99 {run.latency_p99 * 1000:.0f}ms")
+        print(f"Received:         {run.bytes_received / 1e6:,.1f} MB")
+        print(f"Retries:          {run.retries:,} ({run.backoff_seconds:.1f}s backing off)")
+        print(f"Sleeping:         {run.sleep_seconds:.1f}s (backoff + rate limiting)")
+        phases = run_phase_totals(session_maker, run_id)
+        print("Time by phase:    " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in phases.items()))
     print(f"Database:         {Path(DB_PATH).absolute()}")
     print("=" * 70)
     print()
@@ -0,0 +1,345 @@
+"""
+Incremental Parquet export of the crawl database for analysis.
+
+Tables are written under the output directory as Hive-style partitions:
+
+- ``ads/publication_month=YYYY-MM/part-0.parquet`` (``unknown`` for ads
+  without a valid datePublication)
+- ``ad_versions/seen_month=YYYY-MM/part-0.parquet`` (``--versions``)
+- ``runs.parquet`` (``--runs``, small and rewritten every time)
+
+so ``pandas.read_parquet("data/parquet/ads")`` or DuckDB read them, and
+filters on the partition column skip whole files.
+
+Low-cardinality columns (CATEGORICAL_COLUMNS) are dictionary-encoded. The
+text ones (lieu_texte, nom_commercial...) are Arrow dictionaries and read
+back as pandas categoricals; the integer codes (secteur_activite,
+type_contrat...) read back as int64, since Arrow only restores dictionary
+types for strings, but are stored dictionary-encoded all the same. Rows
+are read CHUNK_ROWS at a time and each chunk is written as one row group,
+so memory does not grow with the table; ads partitions are read through
+the publication month index.
+
+Re-exports are incremental: a signature of every partition (row count, sum
+of ads.version, removals) is stored in ``_export_state.json`` and only
+partitions whose signature changed are rewritten. ads.version grows with
+every content change, so new, changed, removed and revived ads are all
+caught. Crawl bookkeeping that changes on every sighting (last_seen_at,
+last_run_seq) is not exported; removed_at tells whether an ad is still
+online. Rows rewritten without a new version (extraction.rebuild, geo
+backfill) need ``--full``.
+
+Parquet support is optional: ``pip install pyarrow``.
+
+Usage:
+    python -m extraction.export                       # ads, changed partitions only
+    python -m extraction.export --versions --runs     # also ad_versions and runs
+    python -m extraction.export --full --out /tmp/apec_parquet
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Float, Integer, Table, text
+from sqlalchemy.orm import sessionmaker
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional dependency
+    pyarrow = None
+
+EXPORT_DIR = "data/parquet"
+STATE_FILE = "_export_state.json"
+PART_FILE = "part-0.parquet"
+UNKNOWN_PARTITION = "unknown"
+
+# Rows read per query chunk, and written per Parquet row group
+CHUNK_ROWS = 5000
+
+# Dictionary-encoded columns (the text ones are pandas categoricals)
+CATEGORICAL_COLUMNS = {
+    "ads": (
+        "secteur_activite",
+        "secteur_activite_parent",
+        "type_contrat",
+        "lieu_texte",
+        "nom_commercial",
+        "origine_code",
+        "id_nom_teletravail",
+    ),
+    "runs": ("status", "mode"),
+}
+
+# Columns left out of the export (bulky raw data or per-sighting bookkeeping)
+EXCLUDED_COLUMNS = {
+    "ads": ("payload_json", "last_seen_at", "last_run_seq"),
+}
+
+# Partition key of each partitioned table: (partition column, SQL month expression)
+_PARTITIONS = {
+    # Must match the expression of ix_ads_publication_month to use the index
+    "ads": ("publication_month", "substr(date_publication, 1, 7)"),
+    "ad_versions": ("seen_month", "substr(seen_at, 1, 7)"),
+}
+
+# Per-month signature: changes whenever a row of the month is added, changed or removed
+_SIGNATURES = {
+    "ads": "count(*), total(coalesce(version, 1)), count(removed_at), max(removed_at)",
+    "ad_versions": "count(*), max(seen_at)",
+}
+
+_MONTH = re.compile(r"\d{4}-\d{2}")
+
+
+def _require_pyarrow() -> None:
+    if pyarrow is None:
+        raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+
+
+def _partition_name(month: Optional[str]) -> str:
+    """Partition of a raw month value (YYYY-MM, else UNKNOWN_PARTITION)."""
+    return month if month and _MONTH.fullmatch(month) else UNKNOWN_PARTITION
+
+
+def export_columns(table: Table) -> List[str]:
+    """Columns of a table written to Parquet, in table order."""
+    excluded = EXCLUDED_COLUMNS.get(table.name, ())
+    return [column.name for column in table.columns if column.name not in excluded]
+
+
+def arrow_schema(table: Table) -> "pyarrow.Schema":
+    """Parquet schema of a table: int64 / float64 / string, text categoricals as dictionaries."""
+    categorical = CATEGORICAL_COLUMNS.get(table.name, ())
+    fields = []
+    for name in export_columns(table):
+        column_type = table.c[name].type
+        if isinstance(column_type, Integer):
+            arrow_type = pyarrow.int64()
+        elif isinstance(column_type, Float):
+            arrow_type = pyarrow.float64()
+        else:
+            arrow_type = pyarrow.string()
+        if name in categorical and arrow_type == pyarrow.string():
+            arrow_type = pyarrow.dictionary(pyarrow.int32(), arrow_type)
+        fields.append(pyarrow.field(name, arrow_type))
+    return pyarrow.schema(fields)
+
+
+def _record_batch(schema: "pyarrow.Schema", rows: Sequence[Sequence[Any]]) -> "pyarrow.RecordBatch":
+    """Rows (tuples in schema order) as a record batch."""
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        if pyarrow.types.is_dictionary(field.type):
+            arrays.append(pyarrow.array(values, type=field.type.value_type).dictionary_encode())
+        else:
+            arrays.append(pyarrow.array(values, type=field.type))
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(session_maker: sessionmaker, table: Table, where: str, params: Dict[str, Any], path: Path,
+                  chunk_rows: int = CHUNK_ROWS) -> int:
+    """Stream the rows of a table matching a condition into one Parquet file.
+
+    The file is written next to path and moved into place once complete,
+    so readers never see a partial file.
+
+    Args:
+        session_maker: SQLAlchemy session factory
+        table: Table to read (compressed columns are decompressed)
+        where: SQL condition selecting the rows ("1" for all)
+        params: Bound parameters of the condition
+        path: Parquet file to (re)write
+        chunk_rows: Rows per read and per row group
+
+    Returns:
+        Number of rows written
+    """
+    schema = arrow_schema(table)
+    columns = [table.c[name] for name in schema.names]
+    query = table.select().with_only_columns(*columns).where(text(where))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    written = 0
+    with session_maker() as db_session:
+        result = db_session.execute(query, params, execution_options={"yield_per": chunk_rows})
+        with pyarrow.parquet.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+            for rows in result.partitions():
+                writer.write_batch(_record_batch(schema, rows))
+                written += len(rows)
+    os.replace(tmp_path, path)
+    return written
+
+
+def partition_signatures(session_maker: sessionmaker, table_name: str) -> Dict[str, Tuple[str, ...]]:
+    """Signature of every partition of a table, with the raw months it covers.
+
+    Returns:
+        Partition name -> (signature, raw month values...); months that are
+        not YYYY-MM (NULL included, as "") share the UNKNOWN_PARTITION
+    """
+    _, month_sql = _PARTITIONS[table_name]
+    statement = text(f"SELECT {month_sql} AS month, {_SIGNATURES[table_name]} FROM {table_name} GROUP BY month")
+    partitions: Dict[str, List[Any]] = {}
+    with session_maker() as db_session:
+        for month, *signature in db_session.execute(statement):
+            entry = partitions.setdefault(_partition_name(month), [[], []])
+            entry[0].append(signature)
+            entry[1].append(month or "")
+    return {
+        name: (json.dumps(sorted(signatures, key=str)), *sorted(months))
+        for name, (signatures, months) in partitions.items()
+    }
+
+
+def export_partitioned(
+    session_maker: sessionmaker,
+    table: Table,
+    out_dir: Path,
+    previous: Dict[str, Any],
+    chunk_rows: int = CHUNK_ROWS,
+) -> Tuple[Dict[str, Any], int, int]:
+    """Rewrite the partitions of a table whose signature changed.
+
+    Args:
+        session_maker: SQLAlchemy session factory
+        table: ads or ad_versions
+        out_dir: Export directory
+        previous: This table's entry of the last export's state ({} = full export)
+        chunk_rows: Rows per read and per row group
+
+    Returns:
+        Tuple of (new state entry, partitions rewritten, rows written)
+    """
+    partition_column, month_sql = _PARTITIONS[table.name]
+    columns = export_columns(table)
+    table_dir = out_dir / table.name
+    previous_partitions = previous.get("partitions", {}) if previous.get("columns") == columns else {}
+    signatures = partition_signatures(session_maker, table.name)
+
+    rewritten = rows_written = 0
+    for name in sorted(signatures):
+        if previous_partitions.get(name) == list(signatures[name]):
+            continue
+        months = signatures[name][1:]
+        placeholders = ", ".join(f":month_{i}" for i in range(len(months)))
+        where = f"{month_sql} IN ({placeholders})"
+        if "" in months:
+            where += f" OR {month_sql} IS NULL"
+        params = {f"month_{i}": month for i, month in enumerate(months)}
+        started = time.perf_counter()
+        count = write_parquet(session_maker, table, where, params,
+                              table_dir / f"{partition_column}={name}" / PART_FILE, chunk_rows)
+        print(f"📦 {table.name}/{partition_column}={name}: {count:,} rows ({time.perf_counter() - started:.1f}s)")
+        rewritten += 1
+        rows_written += count
+
+    # Partitions left without rows
+    for name in set(previous_partitions) - set(signatures):
+        shutil.rmtree(table_dir / f"{partition_column}={name}", ignore_errors=True)
+        print(f"🗑️  {table.name}/{partition_column}={name}: removed (no rows left)")
+
+    state = {"columns": columns, "partitions": {name: list(signature) for name, signature in signatures.items()}}
+    return state, rewritten, rows_written
+
+
+def load_state(out_dir: Path) -> Dict[str, Any]:
+    """State of the last export to out_dir ({} if none)."""
+    try:
+        return json.loads((out_dir / STATE_FILE).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(out_dir: Path, state: Dict[str, Any]) -> None:
+    """Write the export state atomically."""
+    tmp_path = out_dir / f"{STATE_FILE}.{os.getpid()}.tmp"
+    tmp_path.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    os.replace(tmp_path, out_dir / STATE_FILE)
+
+
+def export_database(
+    session_maker: sessionmaker,
+    out_dir: str = EXPORT_DIR,
+    versions: bool = False,
+    runs: bool = False,
+    full: bool = False,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Dict[str, Tuple[int, int]]:
+    """Export ads (and optionally ad_versions and runs) to partitioned Parquet.
+
+    The state is saved after every table, so an interrupted export only
+    redoes the tables it did not finish.
+
+    Args:
+        session_maker: SQLAlchemy session factory
+        out_dir: Export directory
+        versions: Also export ad_versions
+        runs: Also export runs
+        full: Rewrite every partition, ignoring the previous state
+        chunk_rows: Rows per read and per row group
+
+    Returns:
+        (partitions rewritten, rows written) by table
+
+    Raises:
+        RuntimeError: If pyarrow is not installed
+    """
+    _require_pyarrow()
+    from .crawl_all_apec_ads import Ad, AdVersion, Run
+
+    out_path = Path(out_dir)
+    out_path.mkdir(parents=True, exist_ok=True)
+    state = {} if full else load_state(out_path)
+    summary: Dict[str, Tuple[int, int]] = {}
+
+    tables = [Ad.__table__] + ([AdVersion.__table__] if versions else [])
+    for table in tables:
+        state[table.name], rewritten, rows_written = export_partitioned(
+            session_maker, table, out_path, state.get(table.name, {}), chunk_rows
+        )
+        save_state(out_path, state)
+        summary[table.name] = (rewritten, rows_written)
+
+    if runs:
+        count = write_parquet(session_maker, Run.__table__, "1", {}, out_path / "runs.parquet", chunk_rows)
+        print(f"📦 runs: {count:,} rows")
+        summary["runs"] = (1, count)
+    return summary
+
+
+def main() -> None:
+    """Export the database to Parquet and print what was rewritten."""
+    from .crawl_all_apec_ads import DB_PATH, init_database
+
+    parser = argparse.ArgumentParser(description="Export the crawl database to Parquet partitioned by month.")
+    parser.add_argument("--db", default=DB_PATH, help=f"SQLite database (default: {DB_PATH})")
+    parser.add_argument("--out", default=EXPORT_DIR, help=f"Export directory (default: {EXPORT_DIR})")
+    parser.add_argument("--versions", action="store_true", help="Also export ad_versions (by seen month)")
+    parser.add_argument("--runs", action="store_true", help="Also export runs")
+    parser.add_argument("--full", action="store_true", help="Rewrite every partition")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                        help=f"Rows per read and per row group (default: {CHUNK_ROWS})")
+    args = parser.parse_args()
+
+    try:
+        _require_pyarrow()
+    except RuntimeError as e:
+        parser.error(str(e))
+    session_maker = init_database(args.db)
+    print(f"🗂️  {args.db} → {args.out}")
+    started = time.perf_counter()
+    summary = export_database(session_maker, args.out, args.versions, args.runs, args.full, max(args.chunk_rows, 1))
+    for table_name, (rewritten, rows_written) in summary.items():
+        print(f"✅ {table_name}: {rewritten} partitions rewritten, {rows_written:,} rows")
+    print(f"⏱️  {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
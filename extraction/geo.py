@@ -0,0 +1,338 @@
+"""
+Numeric coordinates and an R*Tree spatial index for proximity queries.
+
+The API's latitude / longitude are kept as received in ``ads.latitude`` /
+``ads.longitude`` (Text); offer_to_row also parses them into the REAL
+columns ``ads.lat`` / ``ads.lon`` (NULL when missing or out of range).
+
+``ads_geo`` is an SQLite R*Tree over those columns whose id is the ad id.
+Triggers on ``ads`` keep it in sync, so every write path (bulk upsert,
+per-row upsert, rebuild) maintains it without Python work. Databases from
+older versions are backfilled the first time init_database opens them
+(``--backfill`` redoes it).
+
+Queries read candidates from the R*Tree, then refine them with the exact
+haversine distance, computed for all candidates at once with numpy
+(optional dependency: ``pip install numpy``; a plain Python loop is used
+without it). R*Tree boxes are stored as 32-bit floats rounded outwards, so
+the R*Tree only selects candidates whose stored box overlaps the query box;
+bounding-box counts then check the exact ``ads.lat`` / ``ads.lon``.
+
+Usage:
+    python -m extraction.geo near 48.8566 2.3522 --radius 10
+    python -m extraction.geo bbox 48.80 2.25 48.91 2.42
+    python -m extraction.geo --backfill
+"""
+
+import argparse
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+try:
+    import numpy
+except ImportError:  # optional dependency
+    numpy = None
+
+GEO_TABLE = "ads_geo"
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+BACKFILL_BATCH_SIZE = 5000
+
+_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS ads_geo_insert AFTER INSERT ON ads
+    WHEN new.lat IS NOT NULL AND new.lon IS NOT NULL
+    BEGIN
+        INSERT OR REPLACE INTO {GEO_TABLE} VALUES (new.id, new.lat, new.lat, new.lon, new.lon);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS ads_geo_update AFTER UPDATE OF lat, lon ON ads
+    BEGIN
+        DELETE FROM {GEO_TABLE} WHERE id = old.id;
+        INSERT INTO {GEO_TABLE} SELECT new.id, new.lat, new.lat, new.lon, new.lon
+        WHERE new.lat IS NOT NULL AND new.lon IS NOT NULL;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS ads_geo_delete AFTER DELETE ON ads
+    BEGIN
+        DELETE FROM {GEO_TABLE} WHERE id = old.id;
+    END""",
+)
+
+
+@dataclass
+class GeoHit:
+    """One ad near a point, nearest first."""
+
+    ad_id: int
+    distance_km: float
+    lat: float
+    lon: float
+
+
+def parse_coordinate(value: Any, limit: float) -> Optional[float]:
+    """Coordinate as a float, or None if missing, unparsable or beyond ±limit.
+
+    Args:
+        value: Latitude or longitude as sent by the API (number or string,
+            a decimal comma is accepted)
+        limit: 90 for a latitude, 180 for a longitude
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value.replace(",", ".")) if isinstance(value, str) else float(value)
+    except (TypeError, ValueError):
+        return None
+    if not -limit <= number <= limit:  # also rejects NaN
+        return None
+    return number
+
+
+def _create_index(connection) -> None:
+    connection.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {GEO_TABLE} USING rtree(id, min_lat, max_lat, min_lon, max_lon)"))
+    for trigger in _TRIGGERS:
+        connection.execute(text(trigger))
+
+
+def ensure_geo_index(session_maker: sessionmaker) -> int:
+    """Create the R*Tree and its triggers, backfilling databases that lack them.
+
+    Args:
+        session_maker: SQLAlchemy session factory (tables already created)
+
+    Returns:
+        Number of ads backfilled (0 when the index already existed)
+    """
+    engine: Engine = session_maker.kw["bind"]
+    with engine.connect() as connection:
+        if inspect(connection).has_table(GEO_TABLE):
+            return 0
+    with engine.begin() as connection:
+        _create_index(connection)
+    return backfill_coordinates(session_maker)
+
+
+def backfill_coordinates(session_maker: sessionmaker, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Parse lat / lon of ads stored without them and fill the R*Tree.
+
+    Ads are read by id, batch_size at a time; the triggers index every
+    updated row. Ads whose coordinates were already parsed are copied into
+    the R*Tree in one statement, so the index is complete afterwards.
+
+    Args:
+        session_maker: SQLAlchemy session factory
+        batch_size: Ads parsed per statement
+
+    Returns:
+        Number of ads given coordinates
+    """
+    engine: Engine = session_maker.kw["bind"]
+    with engine.begin() as connection:
+        _create_index(connection)
+
+    filled = 0
+    last_id = 0
+    select_batch = text(
+        "SELECT id, latitude, longitude FROM ads"
+        " WHERE id > :last_id AND lat IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL"
+        " ORDER BY id LIMIT :batch_size"
+    )
+    update_batch = text("UPDATE ads SET lat = :lat, lon = :lon WHERE id = :ad_id")
+    with session_maker() as db_session:
+        db_session.execute(text(
+            f"INSERT OR REPLACE INTO {GEO_TABLE} SELECT id, lat, lat, lon, lon FROM ads"
+            " WHERE lat IS NOT NULL AND lon IS NOT NULL"
+        ))
+        while True:
+            batch = db_session.execute(select_batch, {"last_id": last_id, "batch_size": batch_size}).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            updates = []
+            for ad_id, latitude, longitude in batch:
+                lat, lon = parse_coordinate(latitude, 90), parse_coordinate(longitude, 180)
+                if lat is not None and lon is not None:
+                    updates.append({"ad_id": ad_id, "lat": lat, "lon": lon})
+            if updates:
+                db_session.execute(update_batch, updates)
+                filled += len(updates)
+        db_session.commit()
+    return filled
+
+
+def haversine_km(lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]) -> Sequence[float]:
+    """Great-circle distances in km from one point to many.
+
+    Args:
+        lat: Latitude of the origin, in degrees
+        lon: Longitude of the origin, in degrees
+        lats: Latitudes of the other points
+        lons: Longitudes of the other points
+
+    Returns:
+        Distances in the order of lats / lons (a numpy array when numpy is
+        installed, else a list)
+    """
+    if numpy is not None:
+        phi1 = math.radians(lat)
+        phi2 = numpy.radians(numpy.asarray(lats, dtype=float))
+        dphi = phi2 - phi1
+        dlambda = numpy.radians(numpy.asarray(lons, dtype=float) - lon)
+        a = numpy.sin(dphi / 2) ** 2 + math.cos(phi1) * numpy.cos(phi2) * numpy.sin(dlambda / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))
+    phi1, cos_phi1 = math.radians(lat), math.cos(math.radians(lat))
+    distances = []
+    for other_lat, other_lon in zip(lats, lons):
+        phi2 = math.radians(other_lat)
+        a = (math.sin((phi2 - phi1) / 2) ** 2
+             + cos_phi1 * math.cos(phi2) * math.sin(math.radians(other_lon - lon) / 2) ** 2)
+        distances.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0))))
+    return distances
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> tuple[float, float, float, float]:
+    """Box (min_lat, min_lon, max_lat, max_lon) containing a circle.
+
+    The box covers every longitude when the circle reaches a pole; it is
+    not split at the antimeridian, which APEC locations never cross.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if min_lat == -90.0 or max_lat == 90.0:
+        return min_lat, -180.0, max_lat, 180.0
+    dlon = dlat / min(math.cos(math.radians(min_lat)), math.cos(math.radians(max_lat)))
+    return min_lat, max(lon - dlon, -180.0), max_lat, min(lon + dlon, 180.0)
+
+
+def _removed_filter(include_removed: bool) -> str:
+    return "" if include_removed else " AND ads.removed_at IS NULL"
+
+
+def ads_within(
+    session_maker: sessionmaker,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    limit: Optional[int] = None,
+    include_removed: bool = False,
+) -> List[GeoHit]:
+    """Ads within radius_km of a point, nearest first.
+
+    Args:
+        session_maker: SQLAlchemy session factory
+        lat: Latitude of the center, in degrees
+        lon: Longitude of the center, in degrees
+        radius_km: Radius in km
+        limit: Maximum number of hits (None = all)
+        include_removed: Also return ads marked removed from APEC
+
+    Returns:
+        Hits with their exact (haversine) distance
+    """
+    min_lat, min_lon, max_lat, max_lon = bounding_box(lat, lon, radius_km)
+    statement = text(
+        f"SELECT ads.id, ads.lat, ads.lon FROM {GEO_TABLE} JOIN ads ON ads.id = {GEO_TABLE}.id"
+        f" WHERE {GEO_TABLE}.max_lat >= :min_lat AND {GEO_TABLE}.min_lat <= :max_lat"
+        f" AND {GEO_TABLE}.max_lon >= :min_lon AND {GEO_TABLE}.min_lon <= :max_lon"
+        f"{_removed_filter(include_removed)}"
+    )
+    with session_maker() as db_session:
+        candidates = db_session.execute(statement, {
+            "min_lat": min_lat, "max_lat": max_lat, "min_lon": min_lon, "max_lon": max_lon,
+        }).all()
+    if not candidates:
+        return []
+    ids, lats, lons = zip(*candidates)
+    distances = haversine_km(lat, lon, lats, lons)
+    hits = [
+        GeoHit(ad_id, float(distance), ad_lat, ad_lon)
+        for ad_id, ad_lat, ad_lon, distance in zip(ids, lats, lons, distances)
+        if distance <= radius_km
+    ]
+    hits.sort(key=lambda hit: hit.distance_km)
+    return hits if limit is None else hits[:limit]
+
+
+def count_in_bbox(
+    session_maker: sessionmaker,
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    include_removed: bool = False,
+) -> int:
+    """Number of ads located inside a bounding box (edges included).
+
+    The R*Tree is searched for stored boxes overlapping the query box (they
+    are rounded outwards, so a point on an edge may be stored just past it)
+    and the candidates are checked against their exact coordinates.
+
+    Args:
+        session_maker: SQLAlchemy session factory
+        min_lat: Southern edge, in degrees
+        min_lon: Western edge, in degrees
+        max_lat: Northern edge, in degrees
+        max_lon: Eastern edge, in degrees
+        include_removed: Also count ads marked removed from APEC
+    """
+    params = {"min_lat": min_lat, "max_lat": max_lat, "min_lon": min_lon, "max_lon": max_lon}
+    statement = text(
+        f"SELECT count(*) FROM {GEO_TABLE} JOIN ads ON ads.id = {GEO_TABLE}.id"
+        f" WHERE {GEO_TABLE}.max_lat >= :min_lat AND {GEO_TABLE}.min_lat <= :max_lat"
+        f" AND {GEO_TABLE}.max_lon >= :min_lon AND {GEO_TABLE}.min_lon <= :max_lon"
+        f" AND ads.lat BETWEEN :min_lat AND :max_lat AND ads.lon BETWEEN :min_lon AND :max_lon"
+        f"{_removed_filter(include_removed)}"
+    )
+    with session_maker() as db_session:
+        return db_session.execute(statement, params).scalar_one()
+
+
+def main() -> None:
+    """Answer a radius or bounding-box query, or backfill coordinates."""
+    from .crawl_all_apec_ads import DB_PATH, init_database
+
+    parser = argparse.ArgumentParser(description="Proximity queries over geolocated ads.")
+    parser.add_argument("--db", default=DB_PATH, help=f"SQLite database (default: {DB_PATH})")
+    parser.add_argument("--backfill", action="store_true", help="Parse missing coordinates and refill the R*Tree")
+    parser.add_argument("--include-removed", action="store_true", help="Also include ads removed from APEC")
+    commands = parser.add_subparsers(dest="command")
+    near = commands.add_parser("near", help="Ads within a radius of a point, nearest first")
+    near.add_argument("lat", type=float)
+    near.add_argument("lon", type=float)
+    near.add_argument("--radius", type=float, default=10.0, help="Radius in km (default: 10)")
+    near.add_argument("--limit", type=int, default=20, help="Maximum number of results (default: 20)")
+    bbox = commands.add_parser("bbox", help="Count the ads inside a bounding box")
+    for edge in ("min_lat", "min_lon", "max_lat", "max_lon"):
+        bbox.add_argument(edge, type=float)
+    args = parser.parse_args()
+    if not args.backfill and args.command is None:
+        parser.error("a command is required (near, bbox) or --backfill")
+
+    if args.backfill:
+        session_maker = init_database(args.db, profile="bulk")
+        started = time.perf_counter()
+        filled = backfill_coordinates(session_maker)
+        print(f"✅ Backfilled coordinates of {filled:,} ads in {time.perf_counter() - started:.1f}s")
+    else:
+        session_maker = init_database(args.db)
+
+    started = time.perf_counter()
+    if args.command == "near":
+        hits = ads_within(session_maker, args.lat, args.lon, args.radius, args.limit, args.include_removed)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for hit in hits:
+            print(f"{hit.ad_id}W  {hit.distance_km:7.2f} km  ({hit.lat:.5f}, {hit.lon:.5f})")
+        print(f"{len(hits)} ads within {args.radius:g} km ({elapsed_ms:.1f} ms)")
+    elif args.command == "bbox":
+        count = count_in_bbox(session_maker, args.min_lat, args.min_lon, args.max_lat, args.max_lon, args.include_removed)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"{count:,} ads in the box ({elapsed_ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
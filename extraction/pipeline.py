@@ -0,0 +1,301 @@
+"""
+Decoupled fetch / transform / write pipeline for the APEC crawler.
+
+Three stages joined by bounded queues, so SQLite commits overlap with HTTP
+latency instead of serializing with it:
+
+    fetchers (N threads) --raw bodies--> transformer --hashed pages--> writer
+
+- fetchers download raw page bodies (fetch_page_raw) paced by a shared
+  adaptive rate controller
+- the transformer decodes JSON and computes content hashes (hash_offers)
+- a single writer bulk-upserts and checkpoints each page (save_page), then
+  appends its raw body to the page archive (if any)
+
+Full queues block the upstream stage (backpressure). Queue depths and
+per-stage busy time are reported at the end of the run.
+
+Usage:
+    python -m extraction.crawl_all_apec_ads --engine pipeline --concurrency 8
+"""
+
+import json
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+from sqlalchemy.orm import sessionmaker
+
+from .crawl_all_apec_ads import (
+    MAX_PAGES,
+    MAX_RETRIES,
+    PAGE_SIZE,
+    CrawlStats,
+    archive_page,
+    fetch_page_raw,
+    finish_run,
+    format_page_counts,
+    hash_offers,
+    make_rate_controller,
+    mark_page_failed,
+    print_rate_summary,
+    record_total_available,
+    retry_deferred_pages,
+    save_page,
+    start_run,
+)
+from .archive import PageArchive
+from .proxy_pool import ProxyPool
+from .timing import PageTiming
+
+# Default capacity of each inter-stage queue (pages)
+QUEUE_SIZE = 16
+
+_DONE = object()
+
+
+class StageMetrics:
+    """Busy time and output queue depth of one pipeline stage."""
+
+    def __init__(self, name: str, out_queue: Optional[queue.Queue] = None):
+        """Initialize the metrics.
+
+        Args:
+            name: Stage name for the report
+            out_queue: Queue the stage feeds (its depth is sampled on each put)
+        """
+        self.name = name
+        self.out_queue = out_queue
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.max_depth = 0
+        self._depth_total = 0
+        self._lock = threading.Lock()
+
+    def record(self, busy_seconds: float) -> None:
+        """Account for one processed item."""
+        depth = self.out_queue.qsize() if self.out_queue is not None else 0
+        with self._lock:
+            self.items += 1
+            self.busy_seconds += busy_seconds
+            self.max_depth = max(self.max_depth, depth)
+            self._depth_total += depth
+
+    @property
+    def mean_depth(self) -> float:
+        """Mean output queue depth observed after each item."""
+        return self._depth_total / self.items if self.items else 0.0
+
+
+def print_stage_report(stages: List[StageMetrics], wall_seconds: float, workers: Dict[str, int]) -> None:
+    """Print per-stage utilisation and queue depths.
+
+    Args:
+        stages: Metrics of every stage, in pipeline order
+        wall_seconds: Wall-clock duration of the pipeline
+        workers: Number of threads per stage name
+    """
+    print()
+    print(f"{'stage':<12} {'items':>7} {'busy s':>9} {'util':>6} {'queue max':>10} {'queue avg':>10}")
+    for stage in stages:
+        threads = workers.get(stage.name, 1)
+        utilisation = stage.busy_seconds / (wall_seconds * threads) if wall_seconds else 0.0
+        queue_max = f"{stage.max_depth}" if stage.out_queue is not None else "-"
+        queue_avg = f"{stage.mean_depth:.1f}" if stage.out_queue is not None else "-"
+        print(
+            f"{stage.name:<12} {stage.items:>7} {stage.busy_seconds:>9.2f} "
+            f"{utilisation:>6.0%} {queue_max:>10} {queue_avg:>10}"
+        )
+
+
+def crawl_all_ads_pipeline(
+    session_maker: sessionmaker,
+    http_session: requests.Session,
+    proxies: Optional[Dict[str, str] | ProxyPool],
+    fetchers: int = 4,
+    max_rps: Optional[float] = None,
+    queue_size: int = QUEUE_SIZE,
+    archive: Optional[PageArchive] = None,
+) -> tuple[str, int, int]:
+    """Crawl all ads through the fetch / transform / write pipeline.
+
+    Args:
+        session_maker: SQLAlchemy session factory
+        http_session: Requests session whose headers are copied per fetcher
+        proxies: Optional proxy configuration
+        fetchers: Number of fetcher threads
+        max_rps: Upper bound of the adaptive request rate (None = no cap)
+        queue_size: Capacity of each inter-stage queue
+        archive: Optional raw page archive; the writer appends each page's
+            raw body once the page is committed
+
+    Returns:
+        Tuple of (run_id, total_ads_fetched, total_pages_fetched)
+    """
+    run_id = start_run(session_maker, notes="Full crawl of all APEC job ads (pipeline engine)")
+
+    print(f"🚀 Starting pipeline crawl run: {run_id}")
+    print(f"📊 Page size: {PAGE_SIZE}")
+    print(f"🧵 Fetchers: {fetchers} (max {max_rps or 'unlimited'} req/s), queue size: {queue_size}")
+    print(f"🔄 Max retries: {MAX_RETRIES}")
+    print()
+
+    started = time.perf_counter()
+    window_queue: queue.Queue = queue.Queue()
+    raw_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    page_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    fetch_metrics = StageMetrics("fetch", raw_queue)
+    transform_metrics = StageMetrics("transform", page_queue)
+    write_metrics = StageMetrics("write")
+    rate_controller = make_rate_controller(max_rps)
+    stop = threading.Event()
+
+    def new_session() -> requests.Session:
+        session = requests.Session()
+        session.headers.update(http_session.headers)
+        return session
+
+    def fetcher() -> None:
+        session = new_session()
+        while True:
+            start_index = window_queue.get()
+            if start_index is _DONE:
+                break
+            if stop.is_set():
+                continue  # drain remaining windows after end of pagination
+            begin = time.perf_counter()
+            timing = PageTiming()
+            try:
+                body = fetch_page_raw(session, start_index, proxies, rate_controller=rate_controller, timing=timing)
+            except (requests.HTTPError, requests.RequestException) as e:
+                body = e
+            fetch_metrics.record(time.perf_counter() - begin)
+            raw_queue.put((start_index, body, timing))
+        raw_queue.put(_DONE)
+
+    def transformer(fetcher_count: int) -> None:
+        finished = 0
+        try:
+            while finished < fetcher_count:
+                item = raw_queue.get()
+                if item is _DONE:
+                    finished += 1
+                    continue
+                start_index, body, timing = item
+                if isinstance(body, Exception):
+                    page_queue.put((start_index, body, None, timing, None))
+                    continue
+                begin = time.perf_counter()
+                try:
+                    with timing.phase("decode"):
+                        page = json.loads(body)
+                        offers = page.get("resultats", [])
+                    with timing.phase("transform"):
+                        hashed = hash_offers(offers)
+                except Exception as e:
+                    # Truncated or non-JSON body (e.g. an HTML error page): defer the page like a failed fetch
+                    page_queue.put((start_index, ValueError(f"Undecodable page body: {e!r}"), None, timing, None))
+                    continue
+                transform_metrics.record(time.perf_counter() - begin)
+                page_queue.put((start_index, page, hashed, timing, body))
+        finally:
+            # The writer stops on _DONE, so it must come even if this thread fails
+            page_queue.put(_DONE)
+
+    # First page is fetched up front: its totalCount defines the windows
+    first_timing = PageTiming()
+    try:
+        first_body = fetch_page_raw(new_session(), 0, proxies, rate_controller=rate_controller, timing=first_timing)
+    except (requests.HTTPError, requests.RequestException) as e:
+        print(f"\n❌ Request failed: {e}")
+        finish_run(session_maker, run_id, CrawlStats(), complete=False)
+        return run_id, 0, 0
+
+    try:
+        total_available = json.loads(first_body).get("totalCount", 0)
+    except (ValueError, AttributeError) as e:
+        print(f"\n❌ Undecodable first page: {e!r}")
+        finish_run(session_maker, run_id, CrawlStats(), complete=False)
+        return run_id, 0, 0
+    record_total_available(session_maker, run_id, total_available)
+    windows = list(range(PAGE_SIZE, total_available, PAGE_SIZE))
+    if MAX_PAGES:
+        windows = windows[:max(MAX_PAGES - 1, 0)]
+
+    raw_queue.put((0, first_body, first_timing))
+    for start_index in windows:
+        window_queue.put(start_index)
+    for _ in range(fetchers):
+        window_queue.put(_DONE)
+
+    threads = [
+        threading.Thread(target=fetcher, name=f"fetcher-{i}", daemon=True)
+        for i in range(fetchers)
+    ]
+    threads.append(threading.Thread(target=transformer, args=(fetchers,), name="transformer", daemon=True))
+    for thread in threads:
+        thread.start()
+
+    # Writer stage runs on this thread: SQLite keeps a single writer
+    stats = CrawlStats()
+    failed_indexes: List[int] = []
+    drained = complete = False
+    try:
+        while True:
+            item = page_queue.get()
+            if item is _DONE:
+                drained = True
+                break
+            start_index, page, hashed, timing, body = item
+            if isinstance(page, Exception):
+                print(f"\n❌ Request failed (index {start_index}), deferred: {page}")
+                failed_indexes.append(start_index)
+                mark_page_failed(session_maker, run_id, start_index, page, timing)
+                continue
+            offers = page.get("resultats", [])
+            if not offers:
+                print(f"📄 Index {start_index}: no results (end of pagination)")
+                stop.set()
+                continue
+            begin = time.perf_counter()
+            counts = save_page(session_maker, offers, run_id, start_index, hashed, timing)
+            archive_page(archive, run_id, start_index, page, body)
+            write_metrics.record(time.perf_counter() - begin)
+            stats.add_page(*counts)
+            print(f"📄 Index {start_index}: stored {len(offers)} offers {format_page_counts(*counts)}")
+
+        for thread in threads:
+            thread.join()
+        wall_seconds = time.perf_counter() - started
+
+        print(f"\n✅ Pipeline crawl finished (total available: {total_available})")
+        print_stage_report(
+            [fetch_metrics, transform_metrics, write_metrics],
+            wall_seconds,
+            {"fetch": fetchers},
+        )
+
+        failed_indexes = retry_deferred_pages(
+            session_maker,
+            http_session,
+            proxies,
+            sorted(failed_indexes),
+            fetchers,
+            rate_controller,
+            stats,
+            run_id,
+            archive=archive,
+        )
+        print_rate_summary(rate_controller, proxies)
+        complete = not failed_indexes
+    finally:
+        if not drained:
+            # The writer failed: skip the remaining windows and empty the bounded
+            # queues so the fetchers and the transformer are not left blocked
+            stop.set()
+            while page_queue.get() is not _DONE:
+                pass
+        finish_run(session_maker, run_id, stats, complete=complete)
+    return run_id, stats.ads_fetched, stats.pages
@@ -0,0 +1,224 @@
+"""
+Proxy pool with per-proxy pacing and health scoring.
+
+Every proxy gets its own AdaptiveRateController (so its own rate limit and
+latency EWMA), an in-flight limit and an error score. Each request attempt
+is routed to the healthiest proxy with a free slot, so aggregate throughput
+grows with the number of proxies and a slow exit node only slows its own
+share of the work.
+
+A proxy failing QUARANTINE_AFTER times in a row (429, 5xx, 401/403,
+timeouts, connection errors) is quarantined, for twice as long after each
+relapse. When the quarantine ends it comes back on probation with a single
+request in flight until it succeeds again.
+
+Proxies are read from APEC_PROXY_LIST (comma or whitespace separated URLs)
+or from the file named by APEC_PROXY_FILE (one URL per line, # comments).
+Requests through a pool bypass the cross-process request budget: every
+proxy is its own exit IP with its own limits.
+
+Usage:
+    APEC_PROXY_FILE=proxies.txt python -m extraction.crawl_all_apec_ads --concurrency 16
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from ingestion.rate_control import AdaptiveRateController
+
+# Consecutive failures before a proxy is quarantined
+QUARANTINE_AFTER = 3
+
+# First quarantine duration in seconds (doubled on every relapse)
+QUARANTINE_SECONDS = 30.0
+MAX_QUARANTINE_SECONDS = 600.0
+
+# Smoothing factor of the per-proxy error score
+ERROR_ALPHA = 0.2
+
+
+class Proxy:
+    """One exit node and its health state."""
+
+    def __init__(self, url: str, initial_rate: float, max_rate: Optional[float], max_in_flight: int):
+        """Initialize the proxy state.
+
+        Args:
+            url: Proxy URL (credentials included)
+            initial_rate: Starting requests per second for this proxy
+            max_rate: Upper bound of this proxy's adaptive rate
+            max_in_flight: Requests this proxy may carry at once
+        """
+        self.url = url
+        self.requests_proxies = {"http": url, "https": url}
+        self.rate_controller = AdaptiveRateController(initial_rate=initial_rate, max_rate=max_rate)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.error_score = 0.0  # EWMA of failures, 0 = healthy, 1 = always failing
+        self.failure_streak = 0
+        self.quarantines = 0
+        self.quarantined_until = 0.0
+        self.on_probation = False
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def label(self) -> str:
+        """Proxy URL without credentials, for logs."""
+        return self.url.rsplit("@", 1)[-1]
+
+    @property
+    def slots(self) -> int:
+        """Requests this proxy may carry at once right now."""
+        return 1 if self.on_probation else self.max_in_flight
+
+    def score(self) -> float:
+        """Expected cost of routing one more request here (lower is better)."""
+        latency = self.rate_controller.latency_ewma
+        latency = 1.0 if latency is None else latency
+        return latency * (1.0 + 4.0 * self.error_score) * (1 + self.in_flight) / self.rate_controller.rate
+
+
+class ProxyPool:
+    """Thread-safe pool routing requests to the healthiest proxies."""
+
+    def __init__(
+        self,
+        urls: List[str],
+        initial_rate: float = 1.0,
+        max_rate: Optional[float] = 5.0,
+        max_in_flight: int = 2,
+    ):
+        """Initialize the pool.
+
+        Args:
+            urls: Proxy URLs
+            initial_rate: Starting requests per second of each proxy
+            max_rate: Upper bound of each proxy's adaptive rate
+            max_in_flight: Requests each proxy may carry at once
+        """
+        if not urls:
+            raise ValueError("A proxy pool needs at least one proxy")
+        self.proxies = [Proxy(url, initial_rate, max_rate, max_in_flight) for url in urls]
+        self._condition = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self.proxies)
+
+    def acquire(self) -> Proxy:
+        """Reserve a slot on the healthiest available proxy, waiting if needed.
+
+        Returns:
+            The proxy to send the next request through (hand it back with release)
+        """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                candidates = []
+                for proxy in self.proxies:
+                    if proxy.quarantined_until > now:
+                        continue
+                    if proxy.quarantined_until:
+                        # Quarantine over: back on probation until it succeeds
+                        proxy.quarantined_until = 0.0
+                        proxy.on_probation = True
+                        print(f"    🩺 Proxy {proxy.label} back on probation")
+                    if proxy.in_flight < proxy.slots:
+                        candidates.append(proxy)
+                if candidates:
+                    proxy = min(candidates, key=Proxy.score)
+                    proxy.in_flight += 1
+                    proxy.requests += 1
+                    return proxy
+                # Wait for a released slot or the end of the next quarantine
+                wake_at = [p.quarantined_until for p in self.proxies if p.quarantined_until > now]
+                self._condition.wait(timeout=min(wake_at) - now if wake_at else None)
+
+    def release(self, proxy: Proxy, status: Optional[int]) -> None:
+        """Hand a proxy slot back and update its health.
+
+        Args:
+            proxy: Proxy returned by acquire
+            status: HTTP status code, or None for a transport error
+        """
+        healthy = status is not None and status not in (401, 403, 429) and status < 500
+        with self._condition:
+            proxy.in_flight -= 1
+            proxy.error_score += ERROR_ALPHA * ((0.0 if healthy else 1.0) - proxy.error_score)
+            if healthy:
+                proxy.failure_streak = 0
+                proxy.on_probation = False
+            else:
+                proxy.failures += 1
+                proxy.failure_streak += 1
+                if proxy.on_probation or proxy.failure_streak >= QUARANTINE_AFTER:
+                    duration = min(QUARANTINE_SECONDS * 2 ** proxy.quarantines, MAX_QUARANTINE_SECONDS)
+                    proxy.quarantined_until = time.monotonic() + duration
+                    proxy.quarantines += 1
+                    proxy.failure_streak = 0
+                    proxy.on_probation = False
+                    print(f"    🚧 Proxy {proxy.label} quarantined for {duration:.0f}s")
+            self._condition.notify_all()
+
+    def summary(self) -> str:
+        """Per-proxy request counts and health, one line per proxy."""
+        lines = []
+        for proxy in sorted(self.proxies, key=lambda p: -p.requests):
+            latency = proxy.rate_controller.latency_ewma
+            latency = f"{latency * 1000:.0f}ms" if latency is not None else "n/a"
+            lines.append(
+                f"   {proxy.label}: {proxy.requests} requests, {proxy.failures} failures, "
+                f"error score {proxy.error_score:.2f}, latency {latency}, "
+                f"rate {proxy.rate_controller.rate:.2f} req/s, {proxy.quarantines} quarantines"
+            )
+        return "\n".join(lines)
+
+
+def read_proxy_urls() -> List[str]:
+    """Read proxy URLs from APEC_PROXY_LIST or the APEC_PROXY_FILE file.
+
+    Returns:
+        Proxy URLs (empty if neither is set)
+    """
+    text = os.environ.get("APEC_PROXY_LIST", "")
+    proxy_file = os.environ.get("APEC_PROXY_FILE")
+    if not text and proxy_file:
+        text = Path(proxy_file).read_text()
+    urls = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0]
+        urls += [url.strip() for url in line.replace(",", " ").split() if url.strip()]
+    return [url if "://" in url else f"http://{url}" for url in urls]
+
+
+def load_proxy_pool(
+    initial_rate: float = 1.0,
+    max_rate: Optional[float] = 5.0,
+    max_in_flight: int = 2,
+) -> Optional[ProxyPool]:
+    """Build a proxy pool from the environment.
+
+    Args:
+        initial_rate: Starting requests per second of each proxy
+        max_rate: Upper bound of each proxy's adaptive rate
+        max_in_flight: Requests each proxy may carry at once
+
+    Returns:
+        The pool, or None when no proxy list is configured
+    """
+    urls = read_proxy_urls()
+    if not urls:
+        return None
+    return ProxyPool(urls, initial_rate, max_rate, max_in_flight)
+
+
+def describe_proxies(proxies) -> Optional[str]:
+    """Human-readable form of a proxy configuration or pool, for logs."""
+    if isinstance(proxies, ProxyPool):
+        return f"pool of {len(proxies)} proxies"
+    if proxies:
+        return proxies.get("https", proxies.get("http"))
+    return None
@@ -0,0 +1,235 @@
+"""
+Rebuild (or re-project) the ``ads`` table from the raw page archive.
+
+No request is sent: archived pages are decoded in a process pool, mapped
+with offer_to_row and written with one executemany'd upsert per batch. Run
+it after adding a column or fixing the mapping to re-materialise every ad in
+seconds instead of crawling APEC again.
+
+Each ad takes the content of its latest archived sighting;
+first_seen_at / last_seen_at span all of its sightings (the fetch times of
+the pages). Ads already in the database are re-projected whenever their
+archived content hash is the stored one, even if a crawl saw them after
+the archived page (an engine or run that kept no raw pages). Ads the
+archive never saw are left alone (``--fresh`` starts from an empty table
+and an empty version history instead).
+
+The rebuild does not record version history (extraction/versions.py): an
+existing ad whose archived content hash differs from the stored one keeps
+its content, and only its seen span is widened. The next crawl that sees
+the new content records the change as usual. Rows stored without a content
+hash (older versions) take the archived content only if it is newer.
+
+Workers get whole byte ranges of one segment at a time, decompress and
+decode them, and also compress payload_json / texte_offre, so the writing
+process only executes SQL.
+
+Usage:
+    python -m extraction.rebuild
+    python -m extraction.rebuild --db data/rebuilt.sqlite --workers 8
+    python -m extraction.rebuild --run <run_id>      # one run only
+    python -m extraction.rebuild --fresh             # drop existing ads and versions first
+
+The full-text search index of the database, if any, is rebuilt afterwards.
+"""
+
+import argparse
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, func, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker
+
+from . import compression
+from .archive import ARCHIVE_DIR, INDEX_FILE, PageArchive, decode_record, segment_name
+from .crawl_all_apec_ads import (
+    DB_PATH,
+    Ad,
+    AdVersion,
+    hash_offers,
+    init_database,
+    offer_to_row,
+)
+from .search import reindex, search_index_enabled
+
+# Pages decoded per worker task
+PAGES_PER_TASK = 40
+
+# Rows per executemany'd upsert
+WRITE_BATCH_SIZE = 2_000
+
+_COMPRESSED_COLUMNS = ("payload_json", "texte_offre")
+
+
+def _init_worker(codec: Optional[str], dictionary_id: int, dictionaries: List[Tuple[int, str, bytes]]) -> None:
+    """Give a worker process the writer's compression settings."""
+    for registered_id, dictionary_codec, data in dictionaries:
+        compression.register_dictionary(registered_id, dictionary_codec, data)
+    compression.configure(codec, dictionary_id)
+
+
+def project_pages(directory: str, segment: int, ranges: List[Tuple[int, int, str]]) -> Tuple[List[Dict[str, Any]], int]:
+    """Decode archived pages of one segment into ``ads`` rows.
+
+    Args:
+        directory: Archive directory
+        segment: Segment holding the pages
+        ranges: (offset, length, fetched_at) of each page
+
+    Returns:
+        Tuple of (rows, offers_read): one row per ad with the content of its
+        latest sighting and first/last_seen_at spanning all of them
+    """
+    rows: Dict[int, Dict[str, Any]] = {}
+    offers_read = 0
+    with open(Path(directory) / segment_name(segment), "rb") as segment_file:
+        with mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset, length, fetched_at in ranges:
+                offers = decode_record(mapped[offset:offset + length])["page"].get("resultats", [])
+                offers_read += len(offers)
+                for offer_id, offer, content_hash in hash_offers(offers):
+                    known = rows.get(offer_id)
+                    if known is not None and known["last_seen_at"] > fetched_at:
+                        known["first_seen_at"] = min(known["first_seen_at"], fetched_at)
+                        continue
+                    row = offer_to_row(offer, fetched_at, content_hash)
+                    if known is not None:
+                        row["first_seen_at"] = min(known["first_seen_at"], fetched_at)
+                    rows[offer_id] = row
+    for row in rows.values():
+        for column in _COMPRESSED_COLUMNS:
+            if row[column] is not None:
+                row[column] = compression.compress_text(row[column])
+    return list(rows.values()), offers_read
+
+
+def plan_tasks(archive: PageArchive, run_id: Optional[str] = None) -> List[Tuple[int, List[Tuple[int, int, str]]]]:
+    """Split the indexed pages into per-segment tasks of PAGES_PER_TASK pages."""
+    tasks: List[Tuple[int, List[Tuple[int, int, str]]]] = []
+    for segment, offset, length, fetched_at in archive.page_locations(run_id):
+        if not tasks or tasks[-1][0] != segment or len(tasks[-1][1]) >= PAGES_PER_TASK:
+            tasks.append((segment, []))
+        tasks[-1][1].append((offset, length, fetched_at))
+    return tasks
+
+
+def _rebuild_statement():
+    """Upsert re-projecting the stored content and keeping the widest seen span.
+
+    The rebuild does not record version history, so the archived content
+    only replaces the stored one when their content hashes are equal (a
+    re-projection of the same payload, however old the archived sighting);
+    a changed payload is left for the next crawl to record. Rows without a
+    content hash take the archived content if its sighting is not older.
+    ads.version and the removal columns (last_run_seq, removed_at) are left
+    alone.
+    """
+    table = Ad.__table__
+    stmt = sqlite_insert(table)
+    replace = or_(
+        stmt.excluded.content_hash == table.c.content_hash,
+        and_(table.c.content_hash.is_(None), stmt.excluded.last_seen_at >= table.c.last_seen_at),
+    )
+    set_ = {
+        column: case((replace, stmt.excluded[column]), else_=table.c[column])
+        for column in (c.name for c in table.columns)
+        if column not in ("id", "first_seen_at", "last_seen_at", "version", "last_run_seq", "removed_at")
+    }
+    set_["first_seen_at"] = func.min(table.c.first_seen_at, stmt.excluded.first_seen_at)
+    set_["last_seen_at"] = func.max(table.c.last_seen_at, stmt.excluded.last_seen_at)
+    return stmt.on_conflict_do_update(index_elements=[table.c.id], set_=set_)
+
+
+def rebuild_ads(
+    session_maker: sessionmaker,
+    archive: PageArchive,
+    workers: int,
+    run_id: Optional[str] = None,
+    fresh: bool = False,
+) -> Tuple[int, int]:
+    """Upsert every archived ad into the ads table.
+
+    Args:
+        session_maker: SQLAlchemy session factory of the target database
+        archive: Archive to read
+        workers: Decoding processes
+        run_id: Only use the pages of this run
+        fresh: Delete every existing ad and its versions first (same transaction)
+
+    Returns:
+        Tuple of (offers_read, rows_written)
+    """
+    tasks = plan_tasks(archive, run_id)
+    codec, dictionary_id = compression.write_settings()
+    dictionaries = [
+        (registered_id, dictionary_codec, data)
+        for registered_id, (dictionary_codec, data) in compression.registered_dictionaries().items()
+    ]
+    stmt = _rebuild_statement()
+    offers_read = rows_written = 0
+
+    with session_maker() as db_session, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(codec, dictionary_id, dictionaries)
+    ) as executor:
+        if fresh:
+            # Rebuilt ads have no version, so their old history must go too
+            db_session.execute(delete(AdVersion))
+            db_session.execute(delete(Ad))
+        futures = [
+            executor.submit(project_pages, str(archive.directory), segment, ranges)
+            for segment, ranges in tasks
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            rows, task_offers = future.result()
+            offers_read += task_offers
+            for start in range(0, len(rows), WRITE_BATCH_SIZE):
+                db_session.execute(stmt, rows[start:start + WRITE_BATCH_SIZE])
+            rows_written += len(rows)
+            print(f"   … {done}/{len(tasks)} tasks, {offers_read:,} offers read", end="\r", flush=True)
+        db_session.commit()
+    print()
+    return offers_read, rows_written
+
+
+def main() -> None:
+    """Rebuild the ads table from the archive and report the throughput."""
+    parser = argparse.ArgumentParser(description="Rebuild the ads table from archived raw pages (offline).")
+    parser.add_argument("--db", default=DB_PATH, help=f"Target SQLite database (default: {DB_PATH})")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help=f"Archive directory (default: {ARCHIVE_DIR})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Decoding processes (default: CPUs)")
+    parser.add_argument("--run", default=None, metavar="RUN_ID", help="Only use the pages of this run")
+    parser.add_argument("--fresh", action="store_true", help="Delete existing ads and their versions before rebuilding")
+    args = parser.parse_args()
+
+    if not (Path(args.archive_dir) / INDEX_FILE).exists():
+        parser.error(f"No archive in {args.archive_dir}")
+    archive = PageArchive(args.archive_dir)
+    session_maker = init_database(args.db, profile="bulk")
+
+    print(f"🗄️  Archive: {args.archive_dir} → {args.db} ({max(args.workers, 1)} workers)")
+    started = time.perf_counter()
+    try:
+        offers_read, rows_written = rebuild_ads(session_maker, archive, max(args.workers, 1), args.run, args.fresh)
+    finally:
+        archive.close()
+    elapsed = time.perf_counter() - started
+
+    with session_maker() as db_session:
+        total = db_session.execute(select(func.count(Ad.id))).scalar()
+    print(f"✅ {offers_read:,} archived offers → {rows_written:,} ads upserted in {elapsed:.1f}s "
+          f"({offers_read / max(elapsed, 1e-9):,.0f} offers/s); {total:,} ads in {args.db}")
+
+    # Rebuilt rows carry compressed text, so the search index is redone in one pass
+    if search_index_enabled(session_maker.kw["bind"]):
+        started = time.perf_counter()
+        indexed = reindex(session_maker)
+        print(f"🔎 Search index rebuilt: {indexed:,} ads in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
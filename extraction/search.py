@@ -0,0 +1,260 @@
+"""
+Full-text search over ad titles and descriptions.
+
+``ads_fts`` is an SQLite FTS5 table over intitule and texte_offre whose
+rowid is the ad id. Queries are ranked with BM25, title matches weighing
+TITLE_WEIGHT times more than description matches, and the unicode61
+tokenizer folds case and accents, so "ingenieur" matches "Ingénieur".
+
+texte_offre is stored compressed, so SQL triggers cannot read it: the
+index is kept in sync by the write paths instead (upsert_ads_bulk and
+upsert_ad call index_rows for every new or changed ad). The index keeps its
+own uncompressed copy of both columns, which snippets are built from.
+
+A new database gets the index when it is created. An existing database
+(or one rebuilt from the archive) is indexed with --reindex; until then no
+index is maintained and searching fails.
+
+Usage:
+    python -m extraction.search "data engineer"
+    python -m extraction.search "ingénieur NEAR(python django)" --raw --limit 5
+    python -m extraction.search --reindex
+"""
+
+import argparse
+import re
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+FTS_TABLE = "ads_fts"
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+
+# BM25 weight of a title match relative to a description match
+TITLE_WEIGHT = 10.0
+
+# Snippets: tokens around the best match, and the markers of matched terms
+SNIPPET_TOKENS = 24
+SNIPPET_MARKERS = ("[", "]")
+
+REINDEX_BATCH_SIZE = 1000
+
+# Whether each engine's database has the index (checked once per engine)
+_enabled: "weakref.WeakKeyDictionary[Engine, bool]" = weakref.WeakKeyDictionary()
+
+
+@dataclass
+class SearchHit:
+    """One ad matching a search, best matches first."""
+
+    ad_id: int
+    score: float  # BM25 (lower is better, as returned by FTS5)
+    title: str
+    snippet: str  # Excerpt of the description around the matched terms
+
+
+def _create_index(connection) -> None:
+    connection.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(intitule, texte_offre, tokenize='{FTS_TOKENIZER}')"
+    ))
+
+
+def ensure_search_index(engine: Engine) -> bool:
+    """Create the index of a new (empty) database, and remember whether it exists.
+
+    Args:
+        engine: Engine of a database whose tables were just created
+
+    Returns:
+        True if the database has a search index to maintain
+    """
+    with engine.begin() as connection:
+        if not inspect(connection).has_table(FTS_TABLE):
+            if connection.execute(text("SELECT 1 FROM ads LIMIT 1")).first() is not None:
+                _enabled[engine] = False
+                return False
+            _create_index(connection)
+    _enabled[engine] = True
+    return True
+
+
+def search_index_enabled(engine: Engine) -> bool:
+    """Whether the database of an engine has a search index."""
+    enabled = _enabled.get(engine)
+    if enabled is None:
+        with engine.connect() as connection:
+            enabled = _enabled[engine] = inspect(connection).has_table(FTS_TABLE)
+    return enabled
+
+
+def index_rows(session: Session, rows: Iterable[Dict[str, Any]]) -> None:
+    """Replace the indexed text of new or changed ads.
+
+    Runs in the caller's transaction. Does nothing if the database has no
+    index.
+
+    Args:
+        session: Session whose transaction writes the ads
+        rows: offer_to_row dicts with plain (uncompressed) texte_offre; the
+            last row of a repeated id wins
+    """
+    if not search_index_enabled(session.get_bind()):
+        return
+    entries = {
+        row["id"]: {"ad_id": row["id"], "intitule": row["intitule"], "texte_offre": row["texte_offre"]}
+        for row in rows
+    }
+    if not entries:
+        return
+    session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :ad_id"), [{"ad_id": ad_id} for ad_id in entries])
+    session.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, intitule, texte_offre) VALUES (:ad_id, :intitule, :texte_offre)"),
+        list(entries.values()),
+    )
+
+
+def reindex(session_maker: sessionmaker, batch_size: int = REINDEX_BATCH_SIZE) -> int:
+    """Build the index from scratch from the ads table.
+
+    Ads are read in id order, batch_size at a time, so memory stays flat on
+    large databases.
+
+    Args:
+        session_maker: SQLAlchemy session factory
+        batch_size: Ads read and indexed per statement
+
+    Returns:
+        Number of ads indexed
+    """
+    from sqlalchemy import select
+
+    from .crawl_all_apec_ads import Ad
+
+    engine = session_maker.kw["bind"]
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+        _create_index(connection)
+    _enabled[engine] = True
+
+    indexed = 0
+    last_id = None
+    with session_maker() as db_session:
+        while True:
+            query = select(Ad.id, Ad.intitule, Ad.texte_offre).order_by(Ad.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(Ad.id > last_id)
+            batch = db_session.execute(query).all()
+            if not batch:
+                break
+            db_session.execute(
+                text(f"INSERT INTO {FTS_TABLE} (rowid, intitule, texte_offre) VALUES (:ad_id, :intitule, :texte_offre)"),
+                [{"ad_id": ad_id, "intitule": intitule, "texte_offre": texte} for ad_id, intitule, texte in batch],
+            )
+            indexed += len(batch)
+            last_id = batch[-1].id
+        # Merge the segments written batch by batch into one b-tree
+        db_session.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"))
+        db_session.commit()
+    return indexed
+
+
+def to_match_query(query: str) -> str:
+    """FTS5 query matching every word of a plain-text query (prefixes of the last one).
+
+    Words are quoted, so user input never reaches the FTS5 query syntax.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return '""'
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search(
+    session_maker: sessionmaker,
+    query: str,
+    limit: int = 20,
+    raw: bool = False,
+    include_removed: bool = False,
+) -> List[SearchHit]:
+    """Ads matching a query, best BM25 score first.
+
+    Args:
+        session_maker: SQLAlchemy session factory
+        query: Plain words (all must match), or an FTS5 query if raw
+        limit: Maximum number of hits
+        raw: Pass query to FTS5 as is (phrases, OR, NEAR, column filters)
+        include_removed: Also return ads marked removed from APEC
+
+    Returns:
+        Hits with their score, title and description snippet
+
+    Raises:
+        RuntimeError: If the database has no search index (run --reindex)
+    """
+    engine = session_maker.kw["bind"]
+    if not search_index_enabled(engine):
+        raise RuntimeError("No search index: run python -m extraction.search --reindex")
+    opening, closing = SNIPPET_MARKERS
+    removed_filter = "" if include_removed else "AND ads.removed_at IS NULL"
+    statement = text(
+        f"SELECT {FTS_TABLE}.rowid, bm25({FTS_TABLE}, :title_weight, 1.0) AS score, {FTS_TABLE}.intitule,"
+        f" snippet({FTS_TABLE}, 1, :opening, :closing, '…', :tokens)"
+        f" FROM {FTS_TABLE} JOIN ads ON ads.id = {FTS_TABLE}.rowid"
+        f" WHERE {FTS_TABLE} MATCH :match {removed_filter}"
+        f" ORDER BY score LIMIT :limit"
+    )
+    with session_maker() as db_session:
+        rows = db_session.execute(statement, {
+            "title_weight": TITLE_WEIGHT,
+            "opening": opening,
+            "closing": closing,
+            "tokens": SNIPPET_TOKENS,
+            "match": query if raw else to_match_query(query),
+            "limit": limit,
+        }).all()
+    return [SearchHit(ad_id, score, title or "", snippet or "") for ad_id, score, title, snippet in rows]
+
+
+def main() -> None:
+    """Search the ads, or (re)build the search index."""
+    from .crawl_all_apec_ads import DB_PATH, init_database
+
+    parser = argparse.ArgumentParser(description="Full-text search over ad titles and descriptions.")
+    parser.add_argument("query", nargs="?", help="Words to search for (accents and case are ignored)")
+    parser.add_argument("--db", default=DB_PATH, help=f"SQLite database (default: {DB_PATH})")
+    parser.add_argument("--limit", type=int, default=20, help="Maximum number of results (default: 20)")
+    parser.add_argument("--raw", action="store_true", help="Use the query as FTS5 syntax (phrases, OR, NEAR)")
+    parser.add_argument("--include-removed", action="store_true", help="Also list ads removed from APEC")
+    parser.add_argument("--reindex", action="store_true", help="Rebuild the search index from the ads table")
+    args = parser.parse_args()
+    if not args.reindex and not args.query:
+        parser.error("a query is required (or --reindex)")
+
+    if args.reindex:
+        session_maker = init_database(args.db, profile="bulk")
+        started = time.perf_counter()
+        indexed = reindex(session_maker)
+        print(f"✅ Indexed {indexed:,} ads in {time.perf_counter() - started:.1f}s")
+        if not args.query:
+            return
+    else:
+        session_maker = init_database(args.db)
+
+    hits = search(session_maker, args.query, args.limit, args.raw, args.include_removed)
+    if not hits:
+        print("No matching ads")
+    for hit in hits:
+        print(f"{hit.ad_id}W  {hit.score:8.2f}  {hit.title}")
+        print(f"    {hit.snippet}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Filter-space sharding for the APEC crawler.
+
+A full-France crawl is one huge paginated query that is slow and fragile at
+deep startIndex values. The planner splits the search space into shards
+along the filter dimensions already modelled in ``SEARCH_CONFIGS``
+(location, sector, convention/contract type, experience level), reading
+each candidate's totalCount with a ``range=1`` probe. Shards still larger
+than MAX_SHARD_SIZE are split recursively.
+
+A split is only accepted if its children's totalCounts add up to exactly
+the parent's. A smaller sum means the filter values known to SEARCH_CONFIGS
+do not cover the dimension; a larger one means the values overlap or are
+nested, and then double counting can hide ads that no child returns. In
+both cases the next dimension is tried, and a shard no dimension splits
+exactly is crawled whole: losing ads is worse than deep pagination.
+(anciennetePublication is no fallback: its windows are nested, not
+disjoint.) Ids are still deduplicated across shards while crawling.
+
+Leaf shards are crawled in parallel by a bounded worker pool; pages are
+persisted (and archived, indexed per shard) from the calling thread so
+SQLite keeps a single writer.
+
+Usage:
+    python -m extraction.crawl_all_apec_ads --shard --concurrency 8
+"""
+
+import json
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import requests
+from sqlalchemy.orm import sessionmaker
+
+from ingestion.config import SEARCH_CONFIGS
+
+from .crawl_all_apec_ads import (
+    DEFERRED_RETRY_ROUNDS,
+    PAGE_SIZE,
+    CrawlStats,
+    archive_page,
+    fetch_page,
+    finish_run,
+    format_page_counts,
+    make_rate_controller,
+    print_rate_summary,
+    run_sequence,
+    save_page,
+    start_run,
+)
+from .archive import PageArchive, shard_run_key
+from .proxy_pool import ProxyPool
+
+# Shards above this many ads are split further when possible
+MAX_SHARD_SIZE = 5_000
+
+# Starting point of a sharded crawl: all of France, every sector
+SHARD_BASE_FILTERS = {"lieux": ["799"], "secteursActivite": []}
+
+# Dimensions tried for splitting, in order
+SHARD_DIMENSION_KEYS = ("lieux", "secteursActivite", "typesConvention", "niveauxExperience", "typesContrat")
+
+
+def dimension_values(configs: Dict[str, Dict[str, Any]], keys=SHARD_DIMENSION_KEYS) -> Dict[str, List[str]]:
+    """Collect the filter values each dimension takes across search configs.
+
+    Args:
+        configs: SEARCH_CONFIGS-like mapping of config name to filter fields
+        keys: Filter keys to collect
+
+    Returns:
+        Mapping of filter key to its sorted distinct values (empty keys omitted)
+    """
+    values: Dict[str, Set[str]] = {key: set() for key in keys}
+    for config in configs.values():
+        for key in keys:
+            values[key].update(config.get(key) or [])
+    return {key: sorted(found) for key, found in values.items() if found}
+
+
+SHARD_DIMENSIONS = dimension_values(SEARCH_CONFIGS)
+
+
+@dataclass
+class Shard:
+    """One disjoint slice of the search space."""
+
+    filters: Dict[str, Any]
+    total: int
+
+    @property
+    def key(self) -> str:
+        """Stable text form of the shard's filters."""
+        return json.dumps(self.filters, sort_keys=True)
+
+
+def plan_shards(
+    probe: Callable[[Dict[str, Any]], int],
+    base_filters: Dict[str, Any],
+    max_shard_size: int = MAX_SHARD_SIZE,
+    dimensions: Optional[Dict[str, List[str]]] = None,
+) -> List[Shard]:
+    """Split the search space into leaf shards of at most max_shard_size ads.
+
+    Args:
+        probe: Returns the totalCount for a set of filters (one range=1 request)
+        base_filters: Filters of the root shard
+        max_shard_size: Target maximum ads per leaf shard
+        dimensions: Split dimensions (defaults to SHARD_DIMENSIONS)
+
+    Returns:
+        Leaf shards; shards that cannot be split are kept as they are
+    """
+    dimensions = SHARD_DIMENSIONS if dimensions is None else dimensions
+
+    def split(shard: Shard, remaining: List[str]) -> List[Shard]:
+        if shard.total <= max_shard_size:
+            return [shard] if shard.total else []
+        for position, key in enumerate(remaining):
+            current = shard.filters.get(key) or []
+            values = [value for value in dimensions[key] if [value] != current]
+            if len(current) == 1 or not values:
+                continue  # already pinned to a single value
+            children = [Shard({**shard.filters, key: [value]}, 0) for value in values]
+            for child in children:
+                child.total = probe(child.filters)
+            # Only accept disjoint splits covering every ad, that make progress
+            if sum(child.total for child in children) != shard.total:
+                continue
+            if any(child.total >= shard.total for child in children):
+                continue
+            print(f"   ✂️  {shard.total} ads split by {key} into {len(children)} shards")
+            later = remaining[:position] + remaining[position + 1:]
+            return [leaf for child in children for leaf in split(child, later)]
+        print(f"   ⚠️  Shard of {shard.total} ads cannot be split further: {shard.key}")
+        return [shard]
+
+    root = Shard(dict(base_filters), probe(base_filters))
+    print(f"🗺️  Root shard: {root.total} ads")
+    return split(root, [key for key in SHARD_DIMENSION_KEYS if key in dimensions])
+
+
+def crawl_sharded(
+    session_maker: sessionmaker,
+    http_session: requests.Session,
+    proxies: Optional[Dict[str, str] | ProxyPool],
+    concurrency: int = 4,
+    max_rps: Optional[float] = None,
+    base_filters: Optional[Dict[str, Any]] = None,
+    max_shard_size: int = MAX_SHARD_SIZE,
+    archive: Optional[PageArchive] = None,
+) -> tuple[str, int, int]:
+    """Plan shards, then crawl all their pages in parallel with id dedup.
+
+    Sharded runs are recorded with mode "sharded": they are not resumable
+    page by page since windows of different shards share startIndex values.
+
+    Args:
+        session_maker: SQLAlchemy session factory
+        http_session: Requests session whose headers are copied per worker
+        proxies: Optional proxy configuration
+        concurrency: Maximum number of requests in flight
+        max_rps: Upper bound of the adaptive request rate (None = no cap)
+        base_filters: Filters of the root shard (defaults to SHARD_BASE_FILTERS)
+        max_shard_size: Target maximum ads per leaf shard
+        archive: Optional raw page archive; pages are indexed per shard
+            (see extraction/archive.py shard_run_key)
+
+    Returns:
+        Tuple of (run_id, total_ads_fetched, total_pages_fetched)
+    """
+    base_filters = SHARD_BASE_FILTERS if base_filters is None else base_filters
+    rate_controller = make_rate_controller(max_rps)
+    thread_state = threading.local()
+
+    def session() -> requests.Session:
+        # requests.Session is not thread-safe: give each worker its own
+        worker_session = getattr(thread_state, "session", None)
+        if worker_session is None:
+            worker_session = requests.Session()
+            worker_session.headers.update(http_session.headers)
+            thread_state.session = worker_session
+        return worker_session
+
+    def probe(filters: Dict[str, Any]) -> int:
+        response = fetch_page(session(), 0, proxies, filters, page_size=1, rate_controller=rate_controller)
+        return response.get("totalCount", 0)
+
+    def fetch(filters: Dict[str, Any], start_index: int) -> Dict[str, Any]:
+        return fetch_page(session(), start_index, proxies, filters, rate_controller=rate_controller)
+
+    print(f"📊 Page size: {PAGE_SIZE}, max shard size: {max_shard_size}")
+    print(f"🧵 Concurrency: {concurrency} (max {max_rps or 'unlimited'} req/s)")
+    print()
+
+    # Plan before creating the run, so a failing probe leaves no run behind
+    shards = plan_shards(probe, base_filters, max_shard_size)
+    windows: List[Tuple[Dict[str, Any], int]] = [
+        (shard.filters, start_index)
+        for shard in shards
+        for start_index in range(0, shard.total, PAGE_SIZE)
+    ]
+    print(f"🧩 {len(shards)} leaf shards, {sum(s.total for s in shards)} ads, {len(windows)} pages\n")
+
+    run_id = start_run(session_maker, notes="Sharded crawl of all APEC job ads", mode="sharded",
+                       search_filters=base_filters)
+    print(f"🚀 Starting sharded crawl run: {run_id}")
+
+    run_seq = run_sequence(session_maker, run_id)
+    stats = CrawlStats()
+    seen_ids: Set[Any] = set()
+    duplicates = 0
+
+    def crawl_windows(pending: List[Tuple[Dict[str, Any], int]]) -> List[Tuple[Dict[str, Any], int]]:
+        nonlocal duplicates
+        failed = []
+        remaining = iter(pending)
+        in_flight: Dict[Future, Tuple[Dict[str, Any], int]] = {}
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="shard")
+        try:
+            while True:
+                while len(in_flight) < concurrency * 2:
+                    window = next(remaining, None)
+                    if window is None:
+                        break
+                    in_flight[executor.submit(fetch, *window)] = window
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    window = in_flight.pop(future)
+                    try:
+                        response = future.result()
+                    except (requests.HTTPError, requests.RequestException) as e:
+                        print(f"\n❌ Request failed (index {window[1]}), deferred: {e}")
+                        failed.append(window)
+                        continue
+                    # Cross-shard dedup: overlapping shards return the same ads
+                    offers = []
+                    for offer in response.get("resultats", []):
+                        if offer.get("id") in seen_ids:
+                            duplicates += 1
+                            continue
+                        seen_ids.add(offer.get("id"))
+                        offers.append(offer)
+                    if offers:
+                        counts = save_page(session_maker, offers, run_seq=run_seq)
+                        stats.add_page(*counts)
+                        print(f"📄 Index {window[1]}: stored {len(offers)} offers {format_page_counts(*counts)}")
+                    archive_page(archive, shard_run_key(run_id, window[0]), window[1], response)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return failed
+
+    complete = False
+    try:
+        failed = crawl_windows(windows)
+        for retry_round in range(1, DEFERRED_RETRY_ROUNDS + 1):
+            if not failed:
+                break
+            print(f"\n🔁 Retrying {len(failed)} deferred pages (round {retry_round}/{DEFERRED_RETRY_ROUNDS})")
+            failed = crawl_windows(failed)
+        if failed:
+            print(f"\n⚠️  {len(failed)} pages still failing")
+
+        print(f"\n✅ Sharded crawl finished ({duplicates} cross-shard duplicates skipped)")
+        print_rate_summary(rate_controller, proxies)
+        complete = not failed
+    finally:
+        finish_run(session_maker, run_id, stats, complete=complete)
+    return run_id, stats.ads_fetched, stats.pages
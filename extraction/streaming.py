@@ -0,0 +1,180 @@
+"""
+Incremental decoding of APEC result pages.
+
+``response.json()`` materialises a whole page (every ``texteOffre``
+included) before the first ad is stored. PageStream instead reads the body
+chunk by chunk and yields the offers of the ``resultats`` array one at a
+time, so only the current offer and one network chunk are held in memory.
+Other top-level fields (``totalCount``...) are collected in ``fields``.
+
+The standard library has no streaming JSON parser: the top-level object is
+walked by hand and each value is decoded with ``JSONDecoder.raw_decode``
+once the buffer holds all of it.
+"""
+
+import codecs
+import json
+import time
+from typing import Any, Dict, Iterator, Optional
+
+# Bytes read from the socket per chunk
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = ",:]}" + _WHITESPACE
+
+
+class PageStream:
+    """One result page decoded incrementally from an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterator[bytes], ttfb: float = 0.0, on_close=None):
+        """Initialize the stream.
+
+        Args:
+            chunks: Body chunks, e.g. ``response.iter_content(STREAM_CHUNK_SIZE)``
+            ttfb: Seconds from sending the request to receiving the headers
+            on_close: Optional callable run once the body is consumed (e.g.
+                ``response.close``)
+        """
+        self.fields: Dict[str, Any] = {}
+        self.ttfb = ttfb
+        self.body_seconds = 0.0
+        self.bytes_read = 0
+        self._chunks = chunks
+        self._on_close = on_close
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._started: Optional[float] = None
+
+    def tee(self, sink) -> None:
+        """Pass every raw body chunk to sink as it is read (e.g. an archive record)."""
+        chunks = self._chunks
+
+        def teed():
+            for chunk in chunks:
+                sink(chunk)
+                yield chunk
+
+        self._chunks = teed()
+
+    def _fill(self) -> bool:
+        """Append the next chunk to the buffer; False once the body is exhausted."""
+        if self._eof:
+            return False
+        if self._started is None:
+            self._started = time.perf_counter()
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            self._buffer += self._text.decode(b"", final=True)
+            self.body_seconds = time.perf_counter() - self._started
+            return False
+        self.bytes_read += len(chunk)
+        # Drop the consumed prefix so the buffer stays about one chunk long
+        self._buffer = self._buffer[self._pos:] + self._text.decode(chunk)
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Next non-whitespace character, without consuming it."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of page body")
+
+    def _expect(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in page body, found {found!r}")
+        self._pos += 1
+
+    def _value(self) -> Any:
+        """Decode the next complete JSON value."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number cut by a chunk boundary ("12" of "12.5") decodes fine but
+            # is not followed by a delimiter yet: read on and decode again
+            if (end == len(self._buffer) or self._buffer[end] not in _DELIMITERS) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def offers(self) -> Iterator[Dict[str, Any]]:
+        """Yield the offers of ``resultats`` one at a time.
+
+        The remaining top-level fields are available in ``fields`` once the
+        generator is exhausted.
+        """
+        try:
+            self._expect("{")
+            if self._peek() == "}":
+                self._pos += 1
+                return
+            while True:
+                key = self._value()
+                self._expect(":")
+                if key == "resultats" and self._peek() == "[":
+                    self._pos += 1
+                    if self._peek() == "]":
+                        self._pos += 1
+                    else:
+                        while True:
+                            yield self._value()
+                            if self._peek() == ",":
+                                self._pos += 1
+                                continue
+                            self._expect("]")
+                            break
+                else:
+                    self.fields[key] = self._value()
+                if self._peek() == ",":
+                    self._pos += 1
+                    continue
+                self._expect("}")
+                break
+            # Drain the rest of the body so the timing covers all of it
+            while self._fill():
+                pass
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+class StreamTimings:
+    """Time-to-first-byte and body read time totals over streamed pages."""
+
+    def __init__(self):
+        self.pages = 0
+        self.ttfb_seconds = 0.0
+        self.body_seconds = 0.0
+        self.bytes_read = 0
+
+    def add(self, page: PageStream) -> None:
+        """Account for one fully consumed page."""
+        self.pages += 1
+        self.ttfb_seconds += page.ttfb
+        self.body_seconds += page.body_seconds
+        self.bytes_read += page.bytes_read
+
+    def summary(self) -> str:
+        """One-line description of the averages."""
+        if not self.pages:
+            return "no streamed pages"
+        return (
+            f"{self.pages} pages, mean TTFB {self.ttfb_seconds / self.pages * 1000:.0f}ms, "
+            f"mean body {self.body_seconds / self.pages * 1000:.0f}ms, "
+            f"{self.bytes_read / self.pages / 1024:.0f} KiB/page"
+        )
@@ -0,0 +1,105 @@
+"""
+Per-page phase timings of a crawl.
+
+Every page gets a PageTiming that the fetch and save helpers fill in as the
+page goes through its phases:
+
+- request: sending the request until the response headers arrived
+  (successful attempt)
+- download: reading the response body (in streaming mode the body is
+  decoded while it is read, so decoding is counted here)
+- decode: JSON decoding of the whole body
+- transform: content hashing and mapping offers to rows
+- write: SQL statements of the page's transaction
+- commit: committing that transaction
+
+plus the retries the page needed, the time slept backing off between them,
+the time spent waiting for the rate limiter, and the bytes received. The
+timings are stored on the page's run_pages checkpoint and aggregated on the
+Run when it finishes.
+
+A page's commit time is only known once its checkpoint is committed, so it
+is written by the next transaction of the run (see CommitTimes).
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+PHASES = ("request", "download", "decode", "transform", "write", "commit")
+
+
+@dataclass
+class PageTiming:
+    """Seconds spent by one page in each phase, and what slowed it down."""
+
+    request: float = 0.0
+    download: float = 0.0
+    decode: float = 0.0
+    transform: float = 0.0
+    write: float = 0.0
+    commit: float = 0.0
+    retries: int = 0
+    backoff: float = 0.0  # Sleeping between retries
+    wait: float = 0.0  # Waiting for the rate limiter / shared budget
+    bytes_received: int = 0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Add the duration of the block to one phase."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            setattr(self, name, getattr(self, name) + time.perf_counter() - started)
+
+    def columns(self) -> Dict[str, float | int]:
+        """run_pages column values (commit_seconds is written later)."""
+        values: Dict[str, float | int] = {
+            f"{name}_seconds": getattr(self, name) for name in PHASES if name != "commit"
+        }
+        values.update(
+            retries=self.retries,
+            backoff_seconds=self.backoff,
+            wait_seconds=self.wait,
+            bytes_received=self.bytes_received,
+        )
+        return values
+
+
+def percentile(values: Sequence[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of values (None if empty).
+
+    Args:
+        values: Samples, in any order
+        fraction: Percentile between 0 and 1 (0.95 for p95)
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+class CommitTimes:
+    """Commit durations of checkpointed pages, waiting to be written.
+
+    Crawls have a single writer per run, but the async engine's writer runs
+    on its own thread, so access is locked.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, List[Tuple[float, str, int]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, run_id: str, start_index: int, seconds: float) -> None:
+        """Remember the commit duration of one checkpointed page."""
+        with self._lock:
+            self._pending.setdefault(run_id, []).append((seconds, run_id, start_index))
+
+    def take(self, run_id: str) -> List[Tuple[float, str, int]]:
+        """Pop the pending (seconds, run_id, start_index) of a run."""
+        with self._lock:
+            return self._pending.pop(run_id, [])
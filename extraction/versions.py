@@ -0,0 +1,223 @@
+"""
+Version history of ad payloads.
+
+``ads.payload_json`` only holds the latest payload of an ad. Whenever a
+crawl sees an ad whose content hash changed, the change is recorded in
+``ad_versions``:
+
+- the first change of an ad stores its original payload as version 1, a
+  keyframe (ads that never change cost nothing)
+- every later version stores only the top-level keys that changed against
+  the previous version, as ``{"set": {...}, "unset": [...]}``
+- every KEYFRAME_INTERVAL versions a full keyframe is stored instead, so a
+  version is rebuilt from at most KEYFRAME_INTERVAL rows
+
+``ads.version`` is the number of the latest version (NULL while the ad
+never changed). Version rows are built per page by upsert_ads_bulk and
+written with one executemany'd insert.
+
+Usage:
+    python -m extraction.versions 171234567W            # list versions
+    python -m extraction.versions 171234567 --version 3  # payload of version 3
+    python -m extraction.versions 171234567 --diff 3     # keys changed by version 3
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+# A full payload is stored every KEYFRAME_INTERVAL versions (1, 9, 17...)
+KEYFRAME_INTERVAL = 8
+
+
+def diff_payloads(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Top-level keys changed from previous to current.
+
+    Returns:
+        ``{"set": {key: new value}, "unset": [removed keys]}``, empty parts omitted
+    """
+    delta: Dict[str, Any] = {}
+    changed = {key: value for key, value in current.items() if key not in previous or previous[key] != value}
+    removed = [key for key in previous if key not in current]
+    if changed:
+        delta["set"] = changed
+    if removed:
+        delta["unset"] = removed
+    return delta
+
+
+def apply_delta(payload: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload of the next version (payload itself is left unchanged)."""
+    result = dict(payload)
+    result.update(delta.get("set", {}))
+    for key in delta.get("unset", ()):
+        result.pop(key, None)
+    return result
+
+
+def is_keyframe_version(version: int) -> bool:
+    """Whether a version number is stored as a full payload."""
+    return (version - 1) % KEYFRAME_INTERVAL == 0
+
+
+def version_rows(
+    ad_id: int,
+    previous_version: Optional[int],
+    previous_json: str,
+    previous_hash: Optional[str],
+    previous_seen_at: str,
+    offer: Dict[str, Any],
+    payload_json: str,
+    content_hash: str,
+    seen_at: str,
+) -> tuple[List[Dict[str, Any]], int]:
+    """ad_versions rows recording one change of an ad.
+
+    Args:
+        ad_id: Ad id
+        previous_version: ads.version before the change (None = no history yet)
+        previous_json: payload_json before the change
+        previous_hash: content_hash before the change
+        previous_seen_at: When the previous payload was first seen (used
+            for version 1, i.e. the ad's first_seen_at)
+        offer: New payload
+        payload_json: New payload serialized as stored in ads.payload_json
+        content_hash: New content hash
+        seen_at: Crawl timestamp of the new payload
+
+    Returns:
+        Tuple of (rows to insert, new ads.version)
+    """
+    rows = []
+    if previous_version is None:
+        rows.append(_row(ad_id, 1, previous_seen_at, previous_hash, None, previous_json))
+        previous_version = 1
+    version = previous_version + 1
+    if is_keyframe_version(version):
+        rows.append(_row(ad_id, version, seen_at, content_hash, None, payload_json))
+    else:
+        delta = diff_payloads(json.loads(previous_json), offer)
+        delta_json = json.dumps(delta, ensure_ascii=False, separators=(",", ":"))
+        rows.append(_row(ad_id, version, seen_at, content_hash, delta_json, None))
+    return rows, version
+
+
+def _row(ad_id, version, seen_at, content_hash, delta_json, payload_json) -> Dict[str, Any]:
+    return {
+        "ad_id": ad_id,
+        "version": version,
+        "seen_at": seen_at,
+        "content_hash": content_hash,
+        "delta_json": delta_json,
+        "payload_json": payload_json,
+    }
+
+
+def payload_at(session, ad_id: int, version: int) -> Optional[Dict[str, Any]]:
+    """Rebuild the payload of one version of an ad.
+
+    Reads the closest keyframe at or before the version and the deltas
+    after it (at most KEYFRAME_INTERVAL rows).
+
+    Args:
+        session: SQLAlchemy session
+        ad_id: Ad id
+        version: Version number (1 = first payload seen)
+
+    Returns:
+        The payload, or None if the ad has no such version
+    """
+    from sqlalchemy import func, select
+
+    from .crawl_all_apec_ads import Ad, AdVersion
+
+    ad = session.get(Ad, ad_id)
+    if ad is None or version < 1 or version > (ad.version or 1):
+        return None
+    if version == (ad.version or 1):
+        return json.loads(ad.payload_json)
+
+    keyframe = (
+        select(func.max(AdVersion.version))
+        .where(AdVersion.ad_id == ad_id, AdVersion.version <= version, AdVersion.payload_json.is_not(None))
+        .scalar_subquery()
+    )
+    rows = session.execute(
+        select(AdVersion.version, AdVersion.delta_json, AdVersion.payload_json)
+        .where(AdVersion.ad_id == ad_id, AdVersion.version >= keyframe, AdVersion.version <= version)
+        .order_by(AdVersion.version)
+    ).all()
+    payload = None
+    for _, delta_json, payload_json in rows:
+        if payload_json is not None:
+            payload = json.loads(payload_json)
+        else:
+            payload = apply_delta(payload, json.loads(delta_json))
+    return payload
+
+
+def list_versions(session, ad_id: int) -> List[Dict[str, Any]]:
+    """Versions of an ad with their timestamps and changed keys.
+
+    Returns:
+        One dict per version (version, seen_at, keyframe, changed); the
+        changed keys of keyframes are computed against the previous version
+    """
+    from sqlalchemy import select
+
+    from .crawl_all_apec_ads import AdVersion
+
+    versions = []
+    rows = session.execute(
+        select(AdVersion.version, AdVersion.seen_at, AdVersion.delta_json, AdVersion.payload_json.is_not(None))
+        .where(AdVersion.ad_id == ad_id)
+        .order_by(AdVersion.version)
+    ).all()
+    for version, seen_at, delta_json, keyframe in rows:
+        if keyframe:
+            previous = payload_at(session, ad_id, version - 1) if version > 1 else None
+            delta = diff_payloads(previous, payload_at(session, ad_id, version)) if previous else {}
+        else:
+            delta = json.loads(delta_json)
+        changed = sorted([*delta.get("set", {}), *delta.get("unset", [])])
+        versions.append({"version": version, "seen_at": seen_at, "keyframe": keyframe, "changed": changed})
+    return versions
+
+
+def main() -> None:
+    """Print the version history of an ad, one version, or one version's changes."""
+    from .crawl_all_apec_ads import DB_PATH, init_database
+
+    parser = argparse.ArgumentParser(description="Inspect the version history of an ad.")
+    parser.add_argument("ad_id", help="APEC ad id (a trailing W, as in numeroOffre, is ignored)")
+    parser.add_argument("--db", default=DB_PATH, help=f"SQLite database (default: {DB_PATH})")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--version", type=int, help="Print the payload of this version")
+    group.add_argument("--diff", type=int, metavar="VERSION", help="Print the keys this version changed")
+    args = parser.parse_args()
+
+    ad_id = int(args.ad_id.rstrip("Ww"))
+    session_maker = init_database(args.db)
+    with session_maker() as db_session:
+        if args.version is not None or args.diff is not None:
+            version = args.version if args.version is not None else args.diff
+            payload = payload_at(db_session, ad_id, version)
+            if payload is None:
+                sys.exit(f"Ad {ad_id} has no version {version}")
+            if args.diff is not None:
+                previous = payload_at(db_session, ad_id, version - 1) if version > 1 else {}
+                payload = diff_payloads(previous, payload)
+            print(json.dumps(payload, ensure_ascii=False, indent=2))
+            return
+        versions = list_versions(db_session, ad_id)
+    if not versions:
+        print(f"Ad {ad_id} has a single version (never changed)")
+        return
+    for entry in versions:
+        kind = "keyframe" if entry["keyframe"] else "delta"
+        print(f"v{entry['version']:<4} {entry['seen_at']}  {kind:<8}  {', '.join(entry['changed']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
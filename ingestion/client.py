@@ -1,19 +1,79 @@
 """APEC API client."""
 
+import time
+
 import requests
 from typing import Any, Optional
 
-from .config import BASE_URL, HEADERS, REQUEST_TIMEOUT
+from . import metrics
+from .config import BASE_URL, HEADERS, MAX_RETRIES, MAX_SLEEP, MIN_SLEEP, PRIORITY_METRICS, REQUEST_TIMEOUT
+from .rate_control import AdaptiveRateController
+from .token_bucket import open_shared_budget
+
+_REQUEST_LATENCY = metrics.REQUEST_LATENCY.labels("ingestion")
+_RETRIES = metrics.RETRIES.labels("ingestion")
+_BYTES_RECEIVED = metrics.BYTES_RECEIVED.labels("ingestion")
 
 
 class ApecClient:
-    """Simple client for APEC API using requests.Session."""
+    """Simple client for APEC API using requests.Session.
+
+    Requests are paced by an AdaptiveRateController; 429 and 5xx responses
+    and transport errors are retried, honouring Retry-After.
+    """
 
-    def __init__(self):
+    def __init__(self, rate_controller: Optional[AdaptiveRateController] = None):
+        """Initialize the client.
+
+        Args:
+            rate_controller: Controller to share with other clients (defaults to
+                one pacing between MAX_SLEEP and MIN_SLEEP seconds per request,
+                drawing from the shared request budget, if enabled, at
+                metrics priority)
+        """
         self.session = requests.Session()
         self.session.headers.update(HEADERS)
         self.base_url = BASE_URL
         self.timeout = REQUEST_TIMEOUT
+        self.rate_controller = rate_controller or AdaptiveRateController(
+            initial_rate=1.0 / MAX_SLEEP,
+            max_rate=1.0 / MIN_SLEEP,
+            shared_budget=open_shared_budget(PRIORITY_METRICS),
+        )
+
+    def _request(self, method: str, path: str, **kwargs) -> dict[str, Any]:
+        url = f"{self.base_url}{path}"
+        for attempt in range(MAX_RETRIES):
+            last_attempt = attempt == MAX_RETRIES - 1
+            if attempt:
+                _RETRIES.inc()
+            self.rate_controller.acquire()
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                metrics.REQUESTS.labels("ingestion", "error").inc()
+                self.rate_controller.record_error()
+                if last_attempt:
+                    raise
+                time.sleep(self.rate_controller.retry_delay())
+                continue
+
+            metrics.REQUESTS.labels("ingestion", str(response.status_code)).inc()
+            _REQUEST_LATENCY.observe(response.elapsed.total_seconds())
+            _BYTES_RECEIVED.inc(len(response.content))
+            self.rate_controller.record_response(
+                response.status_code,
+                time.monotonic() - started,
+                response.headers.get("Retry-After"),
+            )
+            if (response.status_code == 429 or response.status_code >= 500) and not last_attempt:
+                time.sleep(self.rate_controller.retry_delay())
+                continue
+            response.raise_for_status()
+            return response.json()
+
+        raise requests.HTTPError(f"Failed after {MAX_RETRIES} retries")
 
     def get(self, path: str, params: Optional[dict] = None) -> dict[str, Any]:
         """Make GET request to APEC API.
@@ -28,10 +88,7 @@ class ApecClient:
         Raises:
             requests.HTTPError: If request fails
         """
-        url = f"{self.base_url}{path}"
-        response = self.session.get(url, params=params, timeout=self.timeout)
-        response.raise_for_status()
-        return response.json()
+        return self._request("GET", path, params=params)
 
     def post(self, path: str, data: Optional[dict] = None) -> dict[str, Any]:
         """Make POST request to APEC API.
@@ -46,7 +103,4 @@ class ApecClient:
         Raises:
             requests.HTTPError: If request fails
         """
-        url = f"{self.base_url}{path}"
-        response = self.session.post(url, json=data, timeout=self.timeout)
-        response.raise_for_status()
-        return response.json()
+        return self._request("POST", path, json=data)
@@ -1,6 +1,9 @@
 """Configuration constants for APEC API."""
 
-BASE_URL = "https://www.apec.fr/cms/webservices"
+import os
+
+# APEC_BASE_URL points the client at another server (e.g. benchmarks/apec_server.py)
+BASE_URL = os.environ.get("APEC_BASE_URL", "https://www.apec.fr/cms/webservices")
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:146.0) Gecko/20100101 Firefox/146.0",
@@ -12,9 +15,40 @@ HEADERS = {
 }
 
 REQUEST_TIMEOUT = 30
+MAX_RETRIES = 3  # attempts per request on 429/5xx and transport errors
+
+MIN_SLEEP = 0.5  # seconds (fastest pace the adaptive rate may reach)
+MAX_SLEEP = 2.0  # seconds (pace the adaptive rate starts from)
+
+# Request budget shared by every process hitting the API (token bucket state
+# lives in a SQLite file). Off unless APEC_REQUEST_BUDGET names that file,
+# e.g. APEC_REQUEST_BUDGET=data/request_budget.sqlite for every process.
+REQUEST_BUDGET_PATH = "data/request_budget.sqlite"
+REQUEST_BUDGET_RATE = 5.0  # tokens (requests) per second, all processes together (APEC_REQUEST_BUDGET_RATE)
+REQUEST_BUDGET_BURST = 10  # bucket capacity
+PRIORITY_METRICS = 10  # metric snapshots (ingestion/main.py) go first
+PRIORITY_CRAWL = 0  # bulk crawls wait while a higher priority process is waiting
+
+# SQLite connection profiles (see ingestion/sqlite_profiles.py); PRAGMAs run
+# on every new connection. "safe" keeps SQLite's defaults, "bulk" trades
+# durability of the last transactions on power loss for commit throughput.
+SQLITE_PROFILES = {
+    "safe": {},
+    "bulk": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,  # KiB (64 MiB)
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+}
+DEFAULT_SQLITE_PROFILE = os.environ.get("APEC_SQLITE_PROFILE", "safe")
 
-MIN_SLEEP = 0.5  # seconds
-MAX_SLEEP = 2.0  # seconds
+# anciennetePublication filter codes (publication age)
+ANCIENNETE_PUBLICATION = {
+    "24h": "101850",  # last 24 hours
+    "7d": "101851",  # last 7 days
+}
 
 # Search filter configurations
 SEARCH_CONFIGS = {
@@ -189,3 +223,8 @@ SEARCH_CONFIGS = {
         "typeClient": "CADRE",
     },
 }
+
+# Prometheus metrics exposition (see ingestion/metrics.py), both optional
+METRICS_PORT = int(os.environ["APEC_METRICS_PORT"]) if os.environ.get("APEC_METRICS_PORT") else None
+METRICS_TEXTFILE = os.environ.get("APEC_METRICS_TEXTFILE") or None
+METRICS_TEXTFILE_INTERVAL = 15.0  # seconds between textfile rewrites
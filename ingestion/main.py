@@ -2,12 +2,12 @@
 
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
-import time, random
+from typing import Any, Optional
 
+from . import metrics
 from .client import ApecClient
 from .storage import Database
-from .config import SEARCH_CONFIGS, MIN_SLEEP, MAX_SLEEP
+from .config import SEARCH_CONFIGS
 
 
 def build_search_payload(config_name: str) -> dict[str, Any]:
@@ -58,11 +58,12 @@ def extract_total_offers(response: dict[str, Any]) -> dict[str, Any]:
     }
 
 
-def run_ingestion(config_name: str) -> dict[str, Any]:
+def run_ingestion(config_name: str, client: Optional[ApecClient] = None) -> dict[str, Any]:
     """Execute the ingestion pipeline for a single config.
 
     Args:
         config_name: Name of the search configuration to use
+        client: Client to reuse across configs (shares its adaptive pacing)
 
     Returns:
         Dictionary with extracted data
@@ -70,12 +71,14 @@ def run_ingestion(config_name: str) -> dict[str, Any]:
     Steps:
         1. Call APEC search endpoint
         2. Extract total number of offers
+        3. Publish it as the config's apec_total_job_offers gauge
     """
-    client = ApecClient()
+    client = client or ApecClient()
     payload = build_search_payload(config_name)
 
     response = client.post("/rechercheOffre", data=payload)
     extracted = extract_total_offers(response)
+    metrics.TOTAL_JOB_OFFERS.set(extracted["value"], config_name)
     
     print(f"✓ [{config_name}] Extracted {extracted['value']} job offers")
     
@@ -84,18 +87,21 @@ def run_ingestion(config_name: str) -> dict[str, Any]:
 
 if __name__ == "__main__":
     results = {}
+    # One client for every config: its rate controller paces the requests
+    client = ApecClient()
+    # Optional Prometheus endpoint / textfile (APEC_METRICS_PORT, APEC_METRICS_TEXTFILE)
+    exposition = metrics.start_exposition()
     
-    for i, config in enumerate(SEARCH_CONFIGS.keys()):
-        print(f"Running ingestion for config: {config}")
-        extracted = run_ingestion(config)
-        results[config] = {
-            "value": extracted["value"],
-            "retrieved_at": extracted["retrieved_at"],
-        }
-        if i < len(SEARCH_CONFIGS) - 1:
-            # sleep a random time between 0.5 and 2 seconds to avoid rate limiting
-            sleep_time = random.uniform(MIN_SLEEP, MAX_SLEEP)
-            time.sleep(sleep_time)
+    try:
+        for config in SEARCH_CONFIGS.keys():
+            print(f"Running ingestion for config: {config}")
+            extracted = run_ingestion(config, client)
+            results[config] = {
+                "value": extracted["value"],
+                "retrieved_at": extracted["retrieved_at"],
+            }
+    finally:
+        exposition.close()
     
     # Save all results to database
     db = Database()
@@ -103,3 +109,4 @@ if __name__ == "__main__":
     
     print(f"\n✓ Saved all metrics to database")
     print(f"✓ Total configs processed: {len(results)}")
+    print(f"✓ Rate control: {client.rate_controller.summary()}")
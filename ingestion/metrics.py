@@ -0,0 +1,327 @@
+"""
+Prometheus metrics for the crawler and the metric ingestion.
+
+Counters and histograms in the Prometheus text format, standard library
+only. One scrape returns both health metrics (requests by status, retries,
+latencies, bytes) and the business metric, the total_job_offers of every
+SEARCH_CONFIGS entry.
+
+Updates are meant for hot loops: every thread increments its own shard of
+a metric without locking (a lock is only taken the first time a thread
+touches a metric) and shards are summed when the metrics are rendered.
+
+Exposition, both optional:
+- an HTTP endpoint serving /metrics (APEC_METRICS_PORT)
+- a textfile for node_exporter's textfile collector, rewritten atomically
+  every METRICS_TEXTFILE_INTERVAL seconds and on close (APEC_METRICS_TEXTFILE)
+
+Usage:
+    from ingestion import metrics
+
+    metrics.REQUESTS.labels("crawler", "200").inc()
+    metrics.REQUEST_LATENCY.labels("crawler").observe(0.25)
+
+    exposition = metrics.start_exposition(port=9108, textfile="/var/lib/node_exporter/apec.prom")
+    ...
+    exposition.close()
+"""
+
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .config import METRICS_PORT, METRICS_TEXTFILE, METRICS_TEXTFILE_INTERVAL
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COMMIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+# Every metric, in exposition order
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base of every metric: name, help, label names and per-thread shards."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _shard(self) -> dict:
+        """This thread's shard (label values -> value), created on first use."""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: dict = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def _key(self, values: Sequence[str]) -> Tuple[str, ...]:
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(values)}")
+        return tuple(str(value) for value in values)
+
+    def _snapshots(self) -> List[dict]:
+        with self._lock:
+            shards = list(self._shards)
+        # dict() copies under the GIL, so a concurrent update cannot break it
+        return [dict(shard) for shard in shards]
+
+    def render(self) -> List[str]:
+        """Exposition lines of the metric (HELP and TYPE included)."""
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic counter."""
+
+    kind = "counter"
+
+    def labels(self, *values: str) -> "_CounterChild":
+        """Counter bound to one set of label values (keep it in hot loops)."""
+        return _CounterChild(self, self._key(values))
+
+    def inc(self, amount: float = 1) -> None:
+        """Increment a counter without labels."""
+        _CounterChild(self, ()).inc(amount)
+
+    def render(self) -> List[str]:
+        totals: Dict[Tuple[str, ...], float] = {}
+        for shard in self._snapshots():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        lines = super().render()
+        for key in sorted(totals):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(totals[key])}")
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric: Counter, key: Tuple[str, ...]):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1) -> None:
+        """Add amount (>= 0) to the counter."""
+        shard = self._metric._shard()
+        shard[self._key] = shard.get(self._key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value set from time to time (last write wins, no shards)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *values: str) -> None:
+        """Set the gauge for one set of label values."""
+        self._values[self._key(values)] = value
+
+    def render(self) -> List[str]:
+        values = dict(self._values)
+        lines = super().render()
+        for key in sorted(values):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(values[key])}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def labels(self, *values: str) -> "_HistogramChild":
+        """Histogram bound to one set of label values (keep it in hot loops)."""
+        return _HistogramChild(self, self._key(values))
+
+    def observe(self, value: float) -> None:
+        """Observe a value on a histogram without labels."""
+        _HistogramChild(self, ()).observe(value)
+
+    def render(self) -> List[str]:
+        # Per key: non-cumulative counts of each bucket (+Inf last), sum
+        totals: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+        for shard in self._snapshots():
+            for key, (counts, total) in shard.items():
+                merged, merged_total = totals.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+                totals[key] = ([a + b for a, b in zip(merged, counts)], merged_total + total)
+        lines = super().render()
+        for key in sorted(totals):
+            counts, total = totals[key]
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric: Histogram, key: Tuple[str, ...]):
+        self._metric = metric
+        self._key = key
+
+    def observe(self, value: float) -> None:
+        """Count value in its bucket and add it to the sum."""
+        metric = self._metric
+        shard = metric._shard()
+        entry = shard.get(self._key)
+        if entry is None:
+            entry = shard[self._key] = [[0] * (len(metric.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(metric.buckets, value)] += 1
+        entry[1] += value
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text format."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+REQUESTS = Counter("apec_requests_total", "HTTP requests to the APEC API by status (error = no response).", ("source", "status"))
+RETRIES = Counter("apec_retries_total", "Requests retried after a 429, 5xx or transport error.", ("source",))
+ADS = Counter("apec_ads_total", "Ads stored by the crawler by outcome (new, changed, unchanged).", ("outcome",))
+BYTES_RECEIVED = Counter("apec_bytes_received_total", "Response body bytes received.", ("source",))
+REQUEST_LATENCY = Histogram(
+    "apec_request_duration_seconds", "Seconds from sending a request to its response headers.", ("source",)
+)
+COMMIT_LATENCY = Histogram(
+    "apec_commit_duration_seconds", "Seconds to commit one crawled page.", buckets=COMMIT_BUCKETS
+)
+TOTAL_JOB_OFFERS = Gauge(
+    "apec_total_job_offers", "Latest total_job_offers of each SEARCH_CONFIGS entry.", ("config",)
+)
+
+
+# ============================================================================
+# EXPOSITION
+# ============================================================================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes would flood the crawler's output
+
+
+def write_textfile(path: str) -> None:
+    """Write every metric to path atomically (node_exporter textfile collector)."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(render())
+    os.replace(tmp_path, path)
+
+
+class MetricsExposition:
+    """Running exposition: HTTP server and/or periodic textfile writer."""
+
+    def __init__(self, port: Optional[int] = None, textfile: Optional[str] = None,
+                 interval: float = METRICS_TEXTFILE_INTERVAL, host: str = "127.0.0.1"):
+        """Start the exposition.
+
+        Args:
+            port: Serve /metrics on this port (None = no HTTP endpoint)
+            textfile: Rewrite this file every interval seconds (None = no file)
+            interval: Seconds between textfile writes
+            host: Address the HTTP endpoint binds to
+        """
+        self.textfile = textfile
+        self.server: Optional[ThreadingHTTPServer] = None
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        if port is not None:
+            self.server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+        if textfile:
+            self._writer = threading.Thread(target=self._write_periodically, args=(interval,), name="metrics-textfile", daemon=True)
+            self._writer.start()
+
+    def _write_periodically(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            write_textfile(self.textfile)
+
+    def describe(self) -> str:
+        """Where the metrics are exposed, for progress output."""
+        targets = []
+        if self.server is not None:
+            host, port = self.server.server_address[:2]
+            targets.append(f"http://{host}:{port}/metrics")
+        if self.textfile:
+            targets.append(self.textfile)
+        return ", ".join(targets) or "disabled"
+
+    def close(self) -> None:
+        """Stop the endpoint and write the textfile one last time."""
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+        if self.textfile:
+            write_textfile(self.textfile)
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def start_exposition(port: Optional[int] = METRICS_PORT, textfile: Optional[str] = METRICS_TEXTFILE,
+                     interval: float = METRICS_TEXTFILE_INTERVAL) -> MetricsExposition:
+    """Expose the metrics as configured (defaults: APEC_METRICS_PORT / APEC_METRICS_TEXTFILE)."""
+    return MetricsExposition(port, textfile, interval)
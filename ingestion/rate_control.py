@@ -0,0 +1,216 @@
+"""Adaptive AIMD request rate controller shared by the crawler and ApecClient."""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from .token_bucket import SharedTokenBucket
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header into seconds to wait.
+
+    Args:
+        value: Header value, either delay-seconds or an HTTP date
+
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class AdaptiveRateController:
+    """Additive-increase / multiplicative-decrease request pacing.
+
+    Every healthy response raises the rate by ``increase_ratio`` of itself,
+    and at least ``increase_step`` requests/s, so a controller starting far
+    below the cap reaches it within a few dozen responses instead of
+    hundreds.
+    A 429, a 5xx, a transport error or a latency EWMA well above its
+    observed baseline cuts the rate by ``decrease_factor`` (at most once
+    per ``decrease_cooldown`` so a burst of in-flight failures counts once).
+    A Retry-After header pauses every caller until it has elapsed.
+
+    The controller is thread-safe and can be shared by any number of
+    workers; ``reserve`` returns the wait instead of sleeping so asyncio
+    callers can await it. With a ``shared_budget`` every request also takes
+    a token from the bucket shared with other processes.
+    """
+
+    def __init__(
+        self,
+        initial_rate: float = 1.0,
+        min_rate: float = 0.2,
+        max_rate: Optional[float] = 20.0,
+        increase_step: float = 0.05,
+        increase_ratio: float = 0.1,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 2.0,
+        latency_factor: float = 2.0,
+        latency_slack: float = 0.25,
+        latency_alpha: float = 0.2,
+        shared_budget: Optional[SharedTokenBucket] = None,
+    ):
+        """Initialize the controller.
+
+        Args:
+            initial_rate: Starting rate in requests per second
+            min_rate: Lower bound of the rate
+            max_rate: Upper bound of the rate (None = unbounded)
+            increase_step: Minimum requests/s added per healthy response
+            increase_ratio: Fraction of the current rate added per healthy response
+            decrease_factor: Multiplier applied on congestion signals
+            decrease_cooldown: Minimum seconds between two decreases
+            latency_factor: Latency EWMA / baseline ratio treated as congestion
+            latency_slack: Seconds above baseline always tolerated (ignores jitter
+                on very fast responses)
+            latency_alpha: EWMA smoothing factor for latency
+            shared_budget: Optional cross-process token bucket drawn by acquire
+        """
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = self._clamp(initial_rate)
+        self.increase_step = increase_step
+        self.increase_ratio = increase_ratio
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.latency_factor = latency_factor
+        self.latency_slack = latency_slack
+        self.latency_alpha = latency_alpha
+        self.shared_budget = shared_budget
+
+        self.latency_ewma: Optional[float] = None
+        self.latency_baseline: Optional[float] = None
+        self.error_streak = 0  # consecutive unhealthy responses, across pages
+        self.increases = 0
+        self.decreases = 0
+        self.sleep_seconds = 0.0
+
+        self._next_slot = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def _clamp(self, rate: float) -> float:
+        rate = max(rate, self.min_rate)
+        if self.max_rate:
+            rate = min(rate, self.max_rate)
+        return rate
+
+    def reserve(self) -> float:
+        """Reserve the next request slot.
+
+        Returns:
+            Seconds the caller must wait before sending
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now, self._blocked_until)
+            self._next_slot = slot + 1.0 / self.rate
+            delay = slot - now
+            self.sleep_seconds += delay
+        return delay
+
+    def acquire(self) -> None:
+        """Block until the caller is allowed to send one request."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        self.acquire_shared()
+
+    def acquire_shared(self) -> None:
+        """Block until the shared budget (if any) grants one request."""
+        if self.shared_budget is None:
+            return
+        waited = self.shared_budget.acquire()
+        with self._lock:
+            self.sleep_seconds += waited
+
+    def _decrease(self, now: float) -> None:
+        if now - self._last_decrease >= self.decrease_cooldown:
+            self.rate = self._clamp(self.rate * self.decrease_factor)
+            self._last_decrease = now
+            self.decreases += 1
+
+    def record_response(self, status: int, latency: float, retry_after: Optional[str] = None) -> None:
+        """Feed one HTTP response back into the controller.
+
+        Args:
+            status: HTTP status code
+            latency: Seconds from request start to response
+            retry_after: Raw Retry-After header, if any
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = parse_retry_after(retry_after)
+            if wait:
+                self._blocked_until = max(self._blocked_until, now + wait)
+
+            if status == 429 or status >= 500:
+                self.error_streak += 1
+                self._decrease(now)
+                return
+
+            self.error_streak = 0
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma += self.latency_alpha * (latency - self.latency_ewma)
+            if self.latency_baseline is None or self.latency_ewma < self.latency_baseline:
+                self.latency_baseline = self.latency_ewma
+
+            rising = self.latency_ewma > self.latency_baseline * self.latency_factor
+            if rising and self.latency_ewma - self.latency_baseline > self.latency_slack:
+                self._decrease(now)
+            else:
+                self.rate = self._clamp(self.rate + max(self.increase_step, self.rate * self.increase_ratio))
+                self.increases += 1
+
+    def record_error(self) -> None:
+        """Feed a transport error (timeout, connection reset) into the controller."""
+        with self._lock:
+            self.error_streak += 1
+            self._decrease(time.monotonic())
+
+    def retry_delay(self, base_delay: float = 1.0, max_delay: float = 60.0) -> float:
+        """Backoff before retrying a failed request.
+
+        Grows with the shared error streak rather than the per-request
+        attempt, so a new page does not restart the backoff from scratch,
+        and never ends before a pending Retry-After.
+
+        Args:
+            base_delay: Base delay in seconds
+            max_delay: Maximum delay in seconds
+
+        Returns:
+            Seconds to wait
+        """
+        with self._lock:
+            streak = max(self.error_streak - 1, 0)
+            delay = min(base_delay * (2 ** streak), max_delay)
+            delay += random.uniform(0, delay * 0.1)  # 10% jitter
+            return max(delay, self._blocked_until - time.monotonic())
+
+    def summary(self) -> str:
+        """One-line description of the controller state."""
+        latency = f"{self.latency_ewma * 1000:.0f}ms" if self.latency_ewma is not None else "n/a"
+        return (
+            f"rate {self.rate:.2f} req/s, latency EWMA {latency}, "
+            f"{self.increases} increases, {self.decreases} decreases, "
+            f"{self.sleep_seconds:.1f}s paced"
+        )
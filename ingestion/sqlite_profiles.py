@@ -0,0 +1,77 @@
+"""Named SQLite connection profiles applied through engine connect events.
+
+A profile is a set of PRAGMAs (SQLITE_PROFILES in config.py) run on every
+new DBAPI connection of an engine. The profile of an engine can be switched
+for a while with use_sqlite_profile: the pool is disposed so the following
+connections are opened with the new settings.
+
+journal_mode=WAL is stored in the database file: a database loaded with the
+bulk profile stays in WAL mode afterwards, where the safe profile's default
+synchronous=FULL is still durable.
+"""
+
+import weakref
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import DEFAULT_SQLITE_PROFILE, SQLITE_PROFILES
+
+# Current profile of every configured engine
+_profiles: "weakref.WeakKeyDictionary[Engine, str]" = weakref.WeakKeyDictionary()
+
+
+def _set_pragmas(cursor, profile: str) -> None:
+    """Run the PRAGMAs of a profile on a DBAPI cursor."""
+    for name, value in SQLITE_PROFILES[profile].items():
+        cursor.execute(f"PRAGMA {name}={value}")
+
+
+def apply_sqlite_profile(engine: Engine, profile: str = DEFAULT_SQLITE_PROFILE) -> None:
+    """Open every future connection of an engine with a profile's PRAGMAs.
+
+    Args:
+        engine: SQLite engine
+        profile: Name of a profile in SQLITE_PROFILES
+
+    Raises:
+        ValueError: If the profile is unknown
+    """
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile: {profile} (expected one of {', '.join(SQLITE_PROFILES)})")
+    if engine not in _profiles:
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                _set_pragmas(cursor, _profiles.get(engine, "safe"))
+            finally:
+                cursor.close()
+
+    _profiles[engine] = profile
+    # Connections already pooled were opened with the previous settings
+    engine.dispose()
+
+
+def sqlite_profile(engine: Engine) -> str:
+    """Profile currently applied to an engine."""
+    return _profiles.get(engine, "safe")
+
+
+@contextmanager
+def use_sqlite_profile(engine: Engine, profile: str) -> Iterator[None]:
+    """Switch an engine to a profile for the duration of a block.
+
+    No session of the engine should be open when entering or leaving.
+    """
+    previous = sqlite_profile(engine)
+    if previous == profile:
+        yield
+        return
+    apply_sqlite_profile(engine, profile)
+    try:
+        yield
+    finally:
+        apply_sqlite_profile(engine, previous)
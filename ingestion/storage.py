@@ -7,6 +7,9 @@ from typing import Any
 from sqlalchemy import create_engine, Integer, DateTime, select
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, Session
 
+from .config import DEFAULT_SQLITE_PROFILE
+from .sqlite_profiles import apply_sqlite_profile
+
 
 class Base(DeclarativeBase):
     pass
@@ -41,16 +44,18 @@ def create_metric_table(config_name: str) -> type[Base]:
 class Database:
     """Simple database manager for APEC metrics with separate tables per config."""
 
-    def __init__(self, db_path: Path | str = "data/apec_metrics.db"):
+    def __init__(self, db_path: Path | str = "data/apec_metrics.db", profile: str = DEFAULT_SQLITE_PROFILE):
         """Initialize database connection.
 
         Args:
             db_path: Path to SQLite database file
+            profile: SQLite connection profile (see SQLITE_PROFILES)
         """
         db_path = Path(db_path)
         db_path.parent.mkdir(parents=True, exist_ok=True)
 
         self.engine = create_engine(f"sqlite:///{db_path}")
+        apply_sqlite_profile(self.engine, profile)
         self.tables: dict[str, type[Base]] = {}
 
     def _get_or_create_table(self, config_name: str) -> type[Base]:
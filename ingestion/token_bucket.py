@@ -0,0 +1,234 @@
+"""Token bucket shared across processes through a SQLite file.
+
+The crawler and the metric ingestion run independently but hit the same
+API. Each of them draws one token per request from a bucket whose state
+(tokens left, last refill time) lives in a small SQLite database, so
+together they never exceed REQUEST_BUDGET_RATE. ``BEGIN IMMEDIATE`` takes
+SQLite's write lock, which serializes refill-and-take across processes.
+That costs a write transaction per request, so the budget is opt-in: it is
+used only when APEC_REQUEST_BUDGET names the bucket file (see
+open_shared_budget).
+
+Priority: a process that could not get a token registers itself as a
+waiter. Processes of lower priority do not take tokens while a live
+higher-priority waiter exists, so a metric snapshot jumps ahead of a bulk
+crawl. Waiters that stop polling (e.g. a killed process) expire after
+WAITER_TTL seconds.
+
+Usage (several local processes drawing from one bucket):
+    python -m ingestion.token_bucket --processes 4 --priorities 0,0,0,10
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from .config import REQUEST_BUDGET_BURST, REQUEST_BUDGET_PATH, REQUEST_BUDGET_RATE
+
+# Seconds after which a waiter that stopped polling no longer blocks others
+WAITER_TTL = 2.0
+
+# Maximum sleep between two polls of a waiting process
+POLL_INTERVAL = 0.05
+
+
+class SharedTokenBucket:
+    """Token bucket whose state is shared by every process using the same file."""
+
+    def __init__(
+        self,
+        path: Path | str = REQUEST_BUDGET_PATH,
+        rate: float = REQUEST_BUDGET_RATE,
+        capacity: float = REQUEST_BUDGET_BURST,
+        priority: int = 0,
+        name: str = "apec",
+    ):
+        """Open (and create if needed) the bucket.
+
+        Args:
+            path: SQLite file holding the bucket state
+            rate: Tokens added per second
+            capacity: Maximum tokens the bucket holds (burst size)
+            priority: Higher values are served first while waiting
+            name: Bucket name, so one file can hold several budgets
+        """
+        self.path = Path(path)
+        self.rate = rate
+        self.capacity = capacity
+        self.priority = priority
+        self.name = name
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.tokens_taken = 0
+        self.wait_seconds = 0.0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection for all threads of this process, guarded by a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bucket ("
+            "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS waiters ("
+            "name TEXT NOT NULL, owner TEXT NOT NULL, priority INTEGER NOT NULL, "
+            "seen_at REAL NOT NULL, PRIMARY KEY (name, owner))"
+        )
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available and no higher-priority process is waiting.
+
+        Args:
+            tokens: Tokens to take
+
+        Returns:
+            0.0 on success, otherwise seconds to wait before trying again
+        """
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = conn.execute(
+                    "SELECT tokens, updated_at FROM bucket WHERE name = ?", (self.name,)
+                ).fetchone()
+                available = self.capacity if row is None else row[0] + max(now - row[1], 0.0) * self.rate
+                available = min(available, self.capacity)
+
+                conn.execute("DELETE FROM waiters WHERE seen_at < ?", (now - WAITER_TTL,))
+                ahead = conn.execute(
+                    "SELECT COUNT(*) FROM waiters WHERE name = ? AND priority > ? AND owner != ?",
+                    (self.name, self.priority, self.owner),
+                ).fetchone()[0]
+
+                if not ahead and available >= tokens:
+                    available -= tokens
+                    conn.execute("DELETE FROM waiters WHERE name = ? AND owner = ?", (self.name, self.owner))
+                    wait = 0.0
+                else:
+                    conn.execute(
+                        "INSERT INTO waiters (name, owner, priority, seen_at) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (name, owner) DO UPDATE SET seen_at = excluded.seen_at",
+                        (self.name, self.owner, self.priority, now),
+                    )
+                    wait = POLL_INTERVAL if ahead else max((tokens - available) / self.rate, 0.001)
+
+                conn.execute(
+                    "INSERT INTO bucket (name, tokens, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                    (self.name, available, now),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if not wait:
+            self.tokens_taken += tokens
+        return wait
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until tokens have been taken.
+
+        Args:
+            tokens: Tokens to take
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                self.wait_seconds += waited
+                return waited
+            # Poll often enough to keep the waiter registration alive
+            wait = min(wait, POLL_INTERVAL)
+            time.sleep(wait)
+            waited += wait
+
+    def close(self) -> None:
+        """Drop this process's waiter registration and close the file."""
+        with self._lock:
+            self._conn.execute("DELETE FROM waiters WHERE name = ? AND owner = ?", (self.name, self.owner))
+            self._conn.close()
+
+
+def open_shared_budget(priority: int) -> Optional[SharedTokenBucket]:
+    """Open the request budget shared by the crawler and the ingestion.
+
+    The budget is opt-in: every request takes SQLite's write lock, so it is
+    only worth it when several processes hit the API at once. Set
+    APEC_REQUEST_BUDGET to the bucket file (the same one in every process,
+    e.g. REQUEST_BUDGET_PATH) to enable it. APEC_REQUEST_BUDGET_RATE
+    overrides the rate (REQUEST_BUDGET_RATE) and APEC_REQUEST_PRIORITY the
+    priority; processes sharing a bucket should use the same rate.
+
+    Args:
+        priority: Default priority of this process
+
+    Returns:
+        The shared bucket, or None when disabled
+    """
+    path = os.environ.get("APEC_REQUEST_BUDGET", "")
+    if not path:
+        return None
+    rate = float(os.environ.get("APEC_REQUEST_BUDGET_RATE", REQUEST_BUDGET_RATE))
+    priority = int(os.environ.get("APEC_REQUEST_PRIORITY", priority))
+    return SharedTokenBucket(path, rate=rate, priority=priority)
+
+
+def _draw(path: str, rate: float, capacity: float, priority: int, seconds: float, results) -> None:
+    """Worker process of the command line demo: draw tokens for a while."""
+    bucket = SharedTokenBucket(path, rate=rate, capacity=capacity, priority=priority)
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        bucket.acquire()
+    results.put((os.getpid(), priority, bucket.tokens_taken, bucket.wait_seconds))
+    bucket.close()
+
+
+def main() -> None:
+    """Run several processes against one bucket and report their shares."""
+    parser = argparse.ArgumentParser(description="Draw from a shared token bucket with several processes.")
+    parser.add_argument("--path", default="data/token_bucket_demo.sqlite", help="Bucket file")
+    parser.add_argument("--processes", type=int, default=4, help="Number of processes (default: 4)")
+    parser.add_argument("--priorities", default="", help="Comma-separated priority per process (default: all 0)")
+    parser.add_argument("--rate", type=float, default=20.0, help="Tokens per second (default: 20)")
+    parser.add_argument("--burst", type=float, default=5.0, help="Bucket capacity (default: 5)")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration (default: 5)")
+    args = parser.parse_args()
+
+    priorities = [int(p) for p in args.priorities.split(",") if p.strip()]
+    priorities += [0] * (args.processes - len(priorities))
+    Path(args.path).unlink(missing_ok=True)
+
+    results: multiprocessing.Queue = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=_draw, args=(args.path, args.rate, args.burst, priority, args.seconds, results)
+        )
+        for priority in priorities[:args.processes]
+    ]
+    for worker in workers:
+        worker.start()
+    rows = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    total = sum(row[2] for row in rows)
+    print(f"{'pid':>8} {'priority':>9} {'tokens':>7} {'waited s':>9}")
+    for pid, priority, taken, waited in sorted(rows, key=lambda row: -row[1]):
+        print(f"{pid:>8} {priority:>9} {taken:>7.0f} {waited:>9.2f}")
+    print(f"Total: {total:.0f} tokens in {args.seconds:.0f}s "
+          f"({total / args.seconds:.1f}/s for a budget of {args.rate}/s + burst {args.burst})")
+
+
+if __name__ == "__main__":
+    main()